@@ -0,0 +1,72 @@
+#!/usr/bin/python
+
+from optparse import OptionParser
+from pyroute2 import IPRoute
+
+import os
+import sys
+import time
+
+# Shared modules live in the root of the project
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from dataplane.batch import NetlinkBatch, format_errors
+
+# Prefix used for the generated routes
+PREFIX = "fcf0:%x:%x::/64"
+
+# Generate the paths under test
+def build_paths(device, routes, segments):
+  paths = []
+  for i in range(routes):
+    paths.append({'dst':PREFIX %(i >> 16, i & 0xffff), 'dev':device, 'encapmode':'encap',
+      'segs':["fcff:%x::%x" %(i & 0xffff, s + 1) for s in range(segments)]})
+  return paths
+
+# Program the paths one netlink round trip at a time
+def per_route(ip_route, idxs, op, paths):
+  for path in paths:
+    ip_route.route(op, dst=path['dst'], oif=idxs[path['dev']],
+      encap={'type':'seg6', 'mode':path['encapmode'], 'segs':path['segs']})
+
+# Program the paths with the batch engine
+def batched(netlink_batch, op, paths):
+  results = netlink_batch.route(op, paths)
+  errors = format_errors(paths, results)
+  if errors:
+    raise Exception(errors)
+
+# Time a run and report the rate
+def measure(name, function, *args):
+  start = time.time()
+  function(*args)
+  elapsed = time.time() - start
+  print("%-10s %8d routes %8.3f s %10.0f routes/s" %(name, len(args[-1]), elapsed,
+    len(args[-1]) / elapsed))
+
+# Parse options
+def parse_options():
+  parser = OptionParser()
+  parser.add_option("--device", dest="device", default="eth0", help="Output device")
+  parser.add_option("--routes", dest="routes", type="int", default=10000,
+    help="Number of routes")
+  parser.add_option("--segments", dest="segments", type="int", default=1,
+    help="Number of segments per route")
+  parser.add_option("--batch-size", dest="batch_size", type="int", default=64 * 1024,
+    help="Max number of bytes per netlink send")
+  (options, args) = parser.parse_args()
+  return options
+
+if __name__ == "__main__":
+  options = parse_options()
+  ip_route = IPRoute()
+  idxs = {options.device: ip_route.link_lookup(ifname=options.device)[0]}
+  netlink_batch = NetlinkBatch(idxs, options.batch_size)
+  paths = build_paths(options.device, options.routes, options.segments)
+  # Per-route programming, as the servers used to do
+  measure("add", per_route, ip_route, idxs, "add", paths)
+  measure("del", per_route, ip_route, idxs, "del", paths)
+  # Batched programming
+  measure("batch-add", batched, netlink_batch, "add", paths)
+  measure("batch-del", batched, netlink_batch, "del", paths)
+  netlink_batch.close()
+  ip_route.close()
@@ -0,0 +1,78 @@
+#!/usr/bin/python3
+
+from optparse import OptionParser
+
+import asyncio
+import os
+import sys
+import time
+import grpc
+
+# Generated gRPC modules live in the grpc folder
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "grpc"))
+import srv6_explicit_path_pb2_grpc
+import srv6_explicit_path_pb2
+
+# Prefix used for the generated routes
+PREFIX = "fcf1:%x:%x::/64"
+
+# Build the request of a controller
+def build_request(controller, request, paths, device):
+  path_request = srv6_explicit_path_pb2.SRv6EPRequest()
+  for i in range(paths):
+    path = path_request.path.add()
+    path.destination = PREFIX %(controller, request * paths + i)
+    path.device = device
+    path.encapmode = "encap"
+    srv6_segment = path.sr_path.add()
+    srv6_segment.segment = "fcff::%x" %(controller + 1)
+  return path_request
+
+# A controller creates and then removes its routes, one RPC at a time
+async def controller(index, options, latencies):
+  async with grpc.aio.insecure_channel(options.address) as channel:
+    srv6_stub = srv6_explicit_path_pb2_grpc.SRv6ExplicitPathStub(channel)
+    requests = [build_request(index, r, options.paths, options.device)
+      for r in range(options.requests)]
+    for rpc in (srv6_stub.Create, srv6_stub.Remove):
+      for request in requests:
+        start = time.time()
+        response = await rpc(request)
+        latencies.append(time.time() - start)
+        if response.message != "OK":
+          print("controller %s: %s" %(index, response.message))
+
+# Percentile of a sorted list
+def percentile(values, p):
+  return values[min(len(values) - 1, int(len(values) * p / 100.0))]
+
+async def run(options):
+  latencies = []
+  start = time.time()
+  await asyncio.gather(*[controller(i, options, latencies)
+    for i in range(options.controllers)])
+  elapsed = time.time() - start
+  latencies.sort()
+  print("controllers %d rpcs %d time %.3f s rate %.0f rpcs/s" %(options.controllers,
+    len(latencies), elapsed, len(latencies) / elapsed))
+  for p in (50, 90, 99, 99.9):
+    print("p%-5s %8.2f ms" %(p, percentile(latencies, p) * 1000))
+  print("max    %8.2f ms" %(latencies[-1] * 1000))
+
+# Parse options
+def parse_options():
+  parser = OptionParser()
+  parser.add_option("--address", dest="address", default="localhost:12345",
+    help="Address of the gRPC server")
+  parser.add_option("--controllers", dest="controllers", type="int", default=1000,
+    help="Number of concurrent controllers")
+  parser.add_option("--requests", dest="requests", type="int", default=5,
+    help="Number of Create/Remove requests per controller")
+  parser.add_option("--paths", dest="paths", type="int", default=1,
+    help="Number of paths per request")
+  parser.add_option("--device", dest="device", default="eth0", help="Output device")
+  (options, args) = parser.parse_args()
+  return options
+
+if __name__ == "__main__":
+  asyncio.run(run(parse_options()))
@@ -0,0 +1,147 @@
+#!/usr/bin/python
+
+from optparse import OptionParser
+
+import os
+import re
+import sys
+import tempfile
+import time
+
+# The parser lives in the topology folder
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "topology"))
+from lsdb import LSDB
+
+# Entry of the route database, like ospf6d prints it
+ROUTE = """Destination: %s
+Destination type: Network
+Installed Time: 00:10:00 ago
+  Changed Time: 00:10:00 ago
+Lock: 2 Flags: BA--
+Memory: prev: (nil) this: 0x55d1c2a0 next: (nil)
+Associated Area: 0.0.0.0
+Path Type: Intra-Area
+LS Origin: Intra-Prefix Id: %s Adv: %s
+Options: --|-|-|--|-|--
+Router Bits: --------
+Prefix Options: xxx
+Metric Type: 1
+Metric: 10 (0)
+Nexthop:
+  fe80::1 eth0
+
+"""
+# Entry of the network database, like ospf6d prints it
+NETWORK = """Age:  600 Type: Network
+Link State ID: %s
+Advertising Router: %s
+LS Sequence Number: 0x80000002
+CheckSum: 0x1234 Length: 32
+    Options: --|R|-|--|E|V6
+    Attached Router: %s
+    Attached Router: %s
+
+"""
+
+# Router id of the i-th router
+def router_id(i):
+  return "%d.%d.%d.%d" %(1 + (i >> 24), (i >> 16) & 0xff, (i >> 8) & 0xff, i & 0xff)
+
+# Build the databases of a router: the routers are in a ring, each of them
+# advertises a transit network towards the next and the stub prefixes
+def build_details(prefixes, routers):
+  route = []
+  network = []
+  for i in range(routers):
+    adv_router = router_id(i)
+    route.append(ROUTE %("fcf0:%x::/64" %i, "0.0.0.%d" %(i & 0xff), adv_router))
+    network.append(NETWORK %("0.0.0.%d" %(i & 0xff), adv_router, adv_router,
+      router_id((i + 1) %routers)))
+  for i in range(prefixes):
+    route.append(ROUTE %("fcf4:%x:%x::/64" %(i >> 16, i & 0xffff), "0.0.1.%d" %(i & 0xff),
+      router_id(i %routers)))
+  return "".join(route), "".join(network)
+
+# Write the databases to files, then read them line by line
+def parse_files(route_details, network_details, folder):
+  stub_networks = dict()
+  net_id_to_net_prefix = dict()
+  nodes = set()
+  with open(os.path.join(folder, "route-detail.txt"), "w") as route_file:
+    route_file.write(route_details)
+  with open(os.path.join(folder, "network-detail.txt"), "w") as network_file:
+    network_file.write(network_details)
+  with open(os.path.join(folder, "route-detail.txt"), "r") as route_file:
+    for line in route_file:
+      m = re.search('Destination: (\S+)', line)
+      if(m):
+        net = m.group(1)
+        continue
+      m = re.search('Intra-Prefix Id: (\d*.\d*.\d*.\d*) Adv: (\d*.\d*.\d*.\d*)', line)
+      if(m):
+        network_id = (m.group(1), m.group(2))
+        net_id_to_net_prefix[network_id] = net
+        if stub_networks.get(net) == None:
+          stub_networks[net] = set()
+        stub_networks[net].add(m.group(2))
+        nodes.add(m.group(2))
+  with open(os.path.join(folder, "network-detail.txt"), "r") as network_file:
+    for line in network_file:
+      m = re.search('Link State ID: (\d*.\d*.\d*.\d*)', line)
+      if(m):
+        link_state_id = m.group(1)
+        continue
+      m = re.search('Advertising Router: (\d*.\d*.\d*.\d*)', line)
+      if(m):
+        adv_router = m.group(1)
+        continue
+      m = re.search('Attached Router: (\d*.\d*.\d*.\d*)', line)
+      if(m):
+        net = net_id_to_net_prefix.get((link_state_id, adv_router))
+        if net == None:
+          continue
+        stub_networks[net].add(m.group(1))
+  return stub_networks, nodes
+
+# Parse in memory in a single pass
+def parse_memory(route_details, network_details, folder):
+  lsdb = LSDB()
+  lsdb.parse_route_details(route_details)
+  lsdb.parse_network_details(network_details)
+  return lsdb.stub_networks, lsdb.nodes
+
+# Parse the databases of all the polled routers as in a cycle of the extraction
+def measure(name, parse, details, polled, prefixes, folder):
+  start = time.time()
+  for _ in range(polled):
+    result = parse(details[0], details[1], folder)
+  elapsed = time.time() - start
+  print("%-8s %8d prefixes %4d polled %8.1f MB %8.3f s/cycle %10.0f prefixes/s" %(name,
+    prefixes, polled, polled * (len(details[0]) + len(details[1])) / (1024.0 * 1024.0), elapsed,
+    polled * prefixes / elapsed))
+  return result
+
+# Parse options
+def parse_options():
+  parser = OptionParser()
+  parser.add_option("--prefixes", dest="prefixes", default="1000,10000,50000",
+    help="Comma separated list of stub prefixes in the databases")
+  parser.add_option("--routers", dest="routers", type="int", default=20,
+    help="Routers of the topology")
+  parser.add_option("--polled", dest="polled", type="int", default=1,
+    help="Routers polled in a cycle")
+  (options, args) = parser.parse_args()
+  return options
+
+if __name__ == "__main__":
+  options = parse_options()
+  folder = tempfile.mkdtemp()
+  for prefixes in [int(p) for p in options.prefixes.split(",")]:
+    details = build_details(prefixes, options.routers)
+    files = measure("files", parse_files, details, options.polled, prefixes, folder)
+    memory = measure("memory", parse_memory, details, options.polled, prefixes, folder)
+    # Both give the same topology
+    assert files == memory
+  for name in os.listdir(folder):
+    os.remove(os.path.join(folder, name))
+  os.rmdir(folder)
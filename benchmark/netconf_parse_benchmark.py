@@ -0,0 +1,91 @@
+#!/usr/bin/python
+
+from optparse import OptionParser
+
+try:
+    from lxml import etree
+except ImportError:
+    from xml.etree import ElementTree as etree
+
+import io
+import os
+import sys
+import time
+
+# Shared modules live in the root of the project
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "netconf"))
+import netconf_server
+
+from netconf_server import SRv6NetconfMethods, NS, apply_srv6_ep
+from dataplane.rib import SRv6RIB
+from rib_benchmark import NullEngine
+
+# Prefix used for the generated routes
+PREFIX = "fcf4:%x:%x::/64"
+
+# Build an edit-config with the given number of paths
+def build_msg(routes, operation):
+  msg = ['<rpc message-id="1" xmlns="%s"><edit-config><target><running/></target><config>'
+    %NS["nc"], '<srv6-explicit-path operation="%s" xmlns="%s">' %(operation, NS["srv6"])]
+  for i in range(routes):
+    msg.append("<path><destination>%s</destination><sr-path><srv6-segment>fcff::1"
+      "</srv6-segment><srv6-segment>fcff::%x</srv6-segment></sr-path><encapmode>encap"
+      "</encapmode><device>eth0</device></path>" %(PREFIX %(i >> 16, i & 0xffff), i & 0xffff))
+  msg.append("</srv6-explicit-path></config></edit-config></rpc>")
+  return "".join(msg)
+
+# Parse building the whole tree, like the netconf library does
+def parse_tree(msg):
+  tree = etree.parse(io.BytesIO(msg.lstrip().encode('utf-8')))
+  return SRv6NetconfMethods().rpc_edit_config(None, tree.getroot())
+
+# Parse incrementally
+def parse_incremental(msg):
+  return apply_srv6_ep(msg)[1]
+
+# Read a value in kB from /proc/self/status
+def status(field):
+  with open("/proc/self/status") as f:
+    for line in f:
+      if line.startswith(field + ":"):
+        return int(line.split()[1])
+
+# Run in a child process so that every run starts from the same memory
+def measure(name, parse, msg, routes):
+  read_fd, write_fd = os.pipe()
+  pid = os.fork()
+  if pid == 0:
+    os.close(read_fd)
+    netconf_server.srv6_rib = SRv6RIB(NullEngine())
+    # Reset the peak to the current usage
+    with open("/proc/self/clear_refs", "w") as f:
+      f.write("5")
+    start_rss = status("VmRSS")
+    start = time.time()
+    reply = parse(msg)
+    elapsed = time.time() - start
+    assert reply.tag == "ok"
+    os.write(write_fd, ("%f %d" %(elapsed, status("VmHWM") - start_rss)).encode())
+    os._exit(0)
+  os.close(write_fd)
+  elapsed, peak = os.read(read_fd, 64).decode().split()
+  os.close(read_fd)
+  os.waitpid(pid, 0)
+  print("%-12s %8d paths %8.1f MB msg %8.3f s %10.0f paths/s %8.1f MB peak" %(name, routes,
+    len(msg) / (1024.0 * 1024.0), float(elapsed), routes / float(elapsed), int(peak) / 1024.0))
+
+# Parse options
+def parse_options():
+  parser = OptionParser()
+  parser.add_option("--routes", dest="routes", default="1000,10000,50000,100000",
+    help="Comma separated list of paths per edit-config")
+  (options, args) = parser.parse_args()
+  return options
+
+if __name__ == "__main__":
+  options = parse_options()
+  for routes in [int(r) for r in options.routes.split(",")]:
+    msg = build_msg(routes, "create")
+    measure("tree", parse_tree, msg, routes)
+    measure("incremental", parse_incremental, msg, routes)
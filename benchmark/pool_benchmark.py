@@ -0,0 +1,72 @@
+#!/usr/bin/python
+
+from optparse import OptionParser
+from pyroute2 import IPRoute
+
+import os
+import sys
+import threading
+import time
+
+# Shared modules live in the root of the project
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from dataplane.pool import NetlinkPool
+from dataplane.rib import SRv6RIB
+
+# Prefix used for the generated routes
+PREFIX = "fcf3:%x:%x::/64"
+
+# Generate the paths under test, one list per client
+def build_paths(routes, clients, device):
+  paths = [[] for _ in range(clients)]
+  for i in range(routes):
+    paths[i % clients].append({'dst':PREFIX %(i >> 16, i & 0xffff), 'dev':device,
+      'encapmode':'encap', 'segs':["fcff::1", "fcff::%x" %(i & 0xffff)]})
+  return paths
+
+# Each client pushes its paths in chunks
+def client(rib, op, paths, chunk_size, failures):
+  for i in range(0, len(paths), chunk_size):
+    results = rib.route(op, paths[i:i + chunk_size])
+    failures.append(len(results) - results.count(0))
+
+# Run the clients in parallel and report the rate
+def measure(name, rib, op, paths, chunk_size):
+  failures = []
+  threads = [threading.Thread(target=client, args=(rib, op, p, chunk_size, failures))
+    for p in paths]
+  start = time.time()
+  for thread in threads:
+    thread.start()
+  for thread in threads:
+    thread.join()
+  elapsed = time.time() - start
+  total = sum(len(p) for p in paths)
+  print("%-4s %3d workers %8d paths %8.3f s %10.0f paths/s %6d failed" %(name,
+    len(paths), total, elapsed, total / elapsed, sum(failures)))
+
+# Parse options
+def parse_options():
+  parser = OptionParser()
+  parser.add_option("--device", dest="device", default="eth0", help="Output device")
+  parser.add_option("--routes", dest="routes", type="int", default=5000,
+    help="Number of routes")
+  parser.add_option("--chunk", dest="chunk", type="int", default=100,
+    help="Paths per request")
+  parser.add_option("--workers", dest="workers", default="1,2,4,8",
+    help="Comma separated list of worker counts")
+  (options, args) = parser.parse_args()
+  return options
+
+if __name__ == "__main__":
+  options = parse_options()
+  ip_route = IPRoute()
+  idxs = {options.device:ip_route.link_lookup(ifname=options.device)[0]}
+  ip_route.close()
+  for workers in [int(w) for w in options.workers.split(",")]:
+    pool = NetlinkPool(idxs, workers)
+    rib = SRv6RIB(pool)
+    paths = build_paths(options.routes, workers, options.device)
+    measure("add", rib, "add", paths, options.chunk)
+    measure("del", rib, "del", paths, options.chunk)
+    pool.close()
@@ -0,0 +1,79 @@
+#!/usr/bin/python
+
+from optparse import OptionParser
+
+import gc
+import os
+import sys
+import time
+
+# Shared modules live in the root of the project
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from dataplane.rib import SRv6RIB
+
+# Prefix used for the generated routes
+PREFIX = "fcf2:%x:%x::/64"
+
+class NullEngine(object):
+  """Accepts every operation without touching the kernel"""
+
+  def __init__(self):
+    self.operations = 0
+
+  def execute(self, operations):
+    self.operations += len(operations)
+    return [0] * len(operations)
+
+# Generate the paths under test
+def build_paths(routes, segment):
+  paths = []
+  for i in range(routes):
+    paths.append({'dst':PREFIX %(i >> 16, i & 0xffff), 'dev':'eth0', 'encapmode':'encap',
+      'segs':[segment, "fcff::%x" %(i & 0xffff)]})
+  return paths
+
+# Current resident set size in MB
+def rss():
+  with open("/proc/self/statm") as f:
+    return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024.0 * 1024.0)
+
+# Time a run and report the rate and the kernel operations
+def measure(name, rib, engine, op, paths):
+  operations = engine.operations
+  start = time.time()
+  results = rib.route(op, paths)
+  elapsed = time.time() - start
+  assert results.count(0) == len(results)
+  print("%-10s %8d paths %8.3f s %10.0f paths/s %8d kernel ops %8d entries" %(name,
+    len(paths), elapsed, len(paths) / elapsed, engine.operations - operations, len(rib)))
+
+# Parse options
+def parse_options():
+  parser = OptionParser()
+  parser.add_option("--routes", dest="routes", type="int", default=1000000,
+    help="Number of routes")
+  (options, args) = parser.parse_args()
+  return options
+
+if __name__ == "__main__":
+  options = parse_options()
+  engine = NullEngine()
+  rib = SRv6RIB(engine)
+  # Nothing is installed yet
+  rib.load([])
+  paths = build_paths(options.routes, "fcff::1")
+  gc.collect()
+  start_rss = rss()
+  measure("add", rib, engine, "add", paths)
+  gc.collect()
+  table_rss = rss() - start_rss
+  print("table memory %.1f MB (%.0f bytes/entry)" %(table_rss,
+    table_rss * 1024 * 1024 / options.routes))
+  # Identical re-push is answered from memory
+  measure("re-add", rib, engine, "add", paths)
+  # Changed segments become a replace
+  changed = build_paths(options.routes, "fcff::2")
+  measure("change", rib, engine, "add", changed)
+  measure("del", rib, engine, "del", changed)
+  # Removing absent routes is answered from memory
+  measure("re-del", rib, engine, "del", changed)
@@ -0,0 +1,239 @@
+#!/usr/bin/python
+
+from optparse import OptionParser
+
+import importlib
+import json
+import logging
+import os
+import platform
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+# Shared modules live in the root of the project
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.append(ROOT)
+from southbound.transport import TRANSPORTS
+
+# Prefix used for the generated routes
+PREFIX = "fcf7:%x:%x::/64"
+# Server of each transport: folder, module and port variable
+SERVERS = {
+  "grpc":("grpc", "grpc_server", "GRPC_PORT"),
+  "rest":("rest", "rest_aio_server" if sys.version_info[0] >= 3 else "rest_server", "REST_PORT"),
+  "netconf":("netconf", "netconf_server", "NC_PORT"),
+  "ssh":("ssh", "ssh_server", "SSH_PORT")
+}
+# Seconds a server has to start listening
+START_TIMEOUT = 15
+
+# Run a server on the in-memory dataplane, it never returns
+def serve(transport, port, device):
+  folder, name, port_variable = SERVERS[transport]
+  sys.path.append(os.path.join(ROOT, folder))
+  server = importlib.import_module(name)
+  setattr(server, port_variable, port)
+  # The routes never reach the kernel
+  server.DRIVER = "memory"
+  server.INTERFACES = [device]
+  logging.basicConfig(level=logging.WARNING)
+  if transport == "rest":
+    server.start_server(False)
+  else:
+    server.start_server()
+
+# Find a free local port
+def get_free_port():
+  s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+  s.bind(("127.0.0.1", 0))
+  port = s.getsockname()[1]
+  s.close()
+  return port
+
+# Check for a listening socket on the port, without connecting to it
+def is_listening(port):
+  for table in ("/proc/net/tcp", "/proc/net/tcp6"):
+    try:
+      with open(table) as f:
+        for line in f.readlines()[1:]:
+          fields = line.split()
+          # Port in hex and state 0A (LISTEN)
+          if fields[1].rsplit(":", 1)[1] == "%04X" %port and fields[3] == "0A":
+            return True
+    except IOError:
+      pass
+  return False
+
+# Start the server of a transport in a new process and wait for it
+def start(transport, device):
+  port = get_free_port()
+  process = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--serve",
+    transport, "--port", str(port), "--device", device])
+  deadline = time.time() + START_TIMEOUT
+  while time.time() < deadline and process.poll() is None:
+    if is_listening(port):
+      return process, port
+    time.sleep(0.1)
+  if process.poll() is None:
+    process.kill()
+  return None, port
+
+# CPU seconds used by a process
+def process_cpu(pid):
+  with open("/proc/%s/stat" %pid) as f:
+    fields = f.read().rsplit(")", 1)[1].split()
+  return (int(fields[11]) + int(fields[12])) / float(os.sysconf("SC_CLK_TCK"))
+
+# CPU seconds used by this process
+def own_cpu():
+  times = os.times()
+  return times[0] + times[1]
+
+# Bytes sent on the loopback, headers included
+def loopback_bytes():
+  with open("/proc/net/dev") as f:
+    for line in f:
+      name, _, counters = line.partition(":")
+      if name.strip() == "lo":
+        return int(counters.split()[8])
+  return 0
+
+# Percentile of a sorted list
+def percentile(values, p):
+  return values[min(len(values) - 1, int(len(values) * p / 100.0))]
+
+# Generate the paths of a request
+def build_paths(client, request, batch, device):
+  paths = []
+  for i in range(batch):
+    index = request * batch + i
+    paths.append({"destination": PREFIX %(client, index), "device": device,
+      "encapmode": "encap", "segments": ["fcff::1", "fcff::%x" %(index & 0xffff)]})
+  return paths
+
+# Each client sends its requests one at a time on its own connection
+def run_client(connection, operation, requests, latencies, failures):
+  failed = 0
+  for paths in requests:
+    start = time.time()
+    errors, _ = connection.execute(operation, paths)
+    latencies.append(time.time() - start)
+    failed += len(errors)
+  failures.append(failed)
+
+# Run an operation on all the clients and measure it
+def run_phase(pid, connections, operation, requests):
+  latencies = []
+  failures = []
+  threads = [threading.Thread(target=run_client, args=(connection, operation,
+    requests[i], latencies, failures)) for i, connection in enumerate(connections)]
+  server_cpu = process_cpu(pid)
+  client_cpu = own_cpu()
+  wire = loopback_bytes()
+  start = time.time()
+  for thread in threads:
+    thread.start()
+  for thread in threads:
+    thread.join()
+  elapsed = time.time() - start
+  latencies.sort()
+  paths = sum(len(paths) for client_requests in requests for paths in client_requests)
+  wire = loopback_bytes() - wire
+  return {"operation": operation, "requests": len(latencies), "paths": paths,
+    "seconds": elapsed, "paths_per_s": paths / elapsed, "requests_per_s": len(latencies) / elapsed,
+    "p50_ms": percentile(latencies, 50) * 1000, "p99_ms": percentile(latencies, 99) * 1000,
+    "server_cpu_s": process_cpu(pid) - server_cpu, "client_cpu_s": own_cpu() - client_cpu,
+    "wire_bytes": wire, "wire_bytes_per_path": wire / float(paths),
+    "failed": sum(failures)}
+
+# Create and then remove the routes with the given batch size and concurrency
+def run_workload(transport, pid, port, batch, concurrency, options):
+  transport_class = TRANSPORTS[transport][0]
+  # The connection setup is not measured
+  connections = []
+  try:
+    for _ in range(concurrency):
+      connections.append(transport_class("127.0.0.1", port))
+  except Exception as e:
+    print("%-8s cannot connect: %s" %(transport, e))
+    for connection in connections:
+      connection.close()
+    return None
+  requests = [[build_paths(client, r, batch, options.device) for r in range(options.requests)]
+    for client in range(concurrency)]
+  results = []
+  try:
+    for operation in ("create", "remove"):
+      result = run_phase(pid, connections, operation, requests)
+      result.update(transport=transport, batch=batch, concurrency=concurrency)
+      results.append(result)
+      print("%-8s %-7s batch %5d clients %3d %8.0f paths/s %8.0f req/s p50 %8.2f ms "
+        "p99 %8.2f ms cpu %6.2f/%6.2f s %8.0f B/path %5d failed" %(transport, operation,
+        batch, concurrency, result["paths_per_s"], result["requests_per_s"], result["p50_ms"],
+        result["p99_ms"], result["server_cpu_s"], result["client_cpu_s"],
+        result["wire_bytes_per_path"], result["failed"]))
+  finally:
+    for connection in connections:
+      connection.close()
+  return results
+
+# Version of the code under test
+def get_version():
+  try:
+    return subprocess.check_output(["git", "describe", "--always", "--dirty"],
+      cwd=ROOT).decode().strip()
+  except (OSError, subprocess.CalledProcessError):
+    return None
+
+def run(options):
+  report = {"version": get_version(), "python": platform.python_version(),
+    "time": time.strftime("%Y-%m-%dT%H:%M:%S"), "requests": options.requests, "results": []}
+  workloads = [(int(batch), int(clients)) for batch in options.batches.split(",")
+    for clients in options.clients.split(",")]
+  for transport in options.transports.split(","):
+    process, port = start(transport, options.device)
+    if process is None:
+      print("%-8s server did not start" %transport)
+      continue
+    try:
+      for batch, concurrency in workloads:
+        results = run_workload(transport, process.pid, port, batch, concurrency, options)
+        # The transport cannot be used, move to the next one
+        if results is None:
+          break
+        report["results"].extend(results)
+    finally:
+      process.terminate()
+      process.wait()
+  if options.output:
+    with open(options.output, "w") as f:
+      json.dump(report, f, indent=2, sort_keys=True)
+
+# Parse options
+def parse_options():
+  parser = OptionParser()
+  parser.add_option("--transports", dest="transports", default="grpc,rest,netconf,ssh",
+    help="Transports under test")
+  parser.add_option("--batches", dest="batches", default="1,10,100",
+    help="Paths per request")
+  parser.add_option("--clients", dest="clients", default="1,4",
+    help="Concurrent clients, each with its own connection")
+  parser.add_option("--requests", dest="requests", type="int", default=200,
+    help="Requests per client and operation")
+  parser.add_option("--device", dest="device", default="lo", help="Output device")
+  parser.add_option("--output", dest="output", help="Write the results as JSON")
+  # Used to start the servers
+  parser.add_option("--serve", dest="serve", help="Run the server of a transport")
+  parser.add_option("--port", dest="port", type="int", help="Port of the server")
+  (options, args) = parser.parse_args()
+  return options
+
+if __name__ == "__main__":
+  options = parse_options()
+  if options.serve:
+    serve(options.serve, options.port, options.device)
+  else:
+    run(options)
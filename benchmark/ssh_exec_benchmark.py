@@ -0,0 +1,71 @@
+#!/usr/bin/python
+
+from optparse import OptionParser
+
+import os
+import subprocess
+import sys
+import time
+
+# Shared modules live in the root of the project
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from dataplane.batch import NetlinkBatch
+from dataplane.links import InterfaceCache
+from dataplane.rib import SRv6RIB
+from dataplane.iproute import parse_ip_route
+
+# Commands used for the generated routes
+ADD = "ip -6 route add fcf5:%x:%x::/64 encap seg6 mode encap segs fcff::1,fcff::%x dev %s"
+DEL = "ip -6 route del fcf5:%x:%x::/64 dev %s"
+
+# Generate the commands under test
+def build_commands(template, routes, device):
+  commands = []
+  for i in range(routes):
+    if template == ADD:
+      commands.append(template %(i >> 16, i & 0xffff, i & 0xffff, device))
+    else:
+      commands.append(template %(i >> 16, i & 0xffff, device))
+  return commands
+
+# A fork+exec of a shell and ip per command, like the ssh server did
+def run_shell(commands):
+  failed = 0
+  with open(os.devnull, "w") as devnull:
+    for command in commands:
+      if subprocess.call(command, shell=True, stderr=devnull) != 0:
+        failed += 1
+  return failed
+
+# Parse the commands and program them in a single batch
+def run_inprocess(rib, commands):
+  results = rib.apply([parse_ip_route(command) for command in commands], strict=True)
+  return len(results) - results.count(0)
+
+# Time a run and report the rate
+def measure(name, run, commands):
+  start = time.time()
+  failed = run(commands)
+  elapsed = time.time() - start
+  print("%-10s %8d routes %8.3f s %10.0f routes/s %6d failed" %(name, len(commands),
+    elapsed, len(commands) / elapsed, failed))
+
+# Parse options
+def parse_options():
+  parser = OptionParser()
+  parser.add_option("--device", dest="device", default="eth0", help="Output device")
+  parser.add_option("--routes", dest="routes", type="int", default=1000,
+    help="Number of routes")
+  (options, args) = parser.parse_args()
+  return options
+
+if __name__ == "__main__":
+  options = parse_options()
+  idxs = InterfaceCache()
+  rib = SRv6RIB(NetlinkBatch(idxs))
+  adds = build_commands(ADD, options.routes, options.device)
+  dels = build_commands(DEL, options.routes, options.device)
+  measure("shell add", run_shell, adds)
+  measure("shell del", run_shell, dels)
+  measure("batch add", lambda commands: run_inprocess(rib, commands), adds)
+  measure("batch del", lambda commands: run_inprocess(rib, commands), dels)
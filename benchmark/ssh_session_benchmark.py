@@ -0,0 +1,107 @@
+#!/usr/bin/python
+
+from optparse import OptionParser
+
+import threading
+import time
+import paramiko
+
+# Commands used for the generated routes
+ADD = "ip -6 route add fcf6:%x:%x::/64 encap seg6 mode encap segs fcff::1,fcff::%x dev %s"
+DEL = "ip -6 route del fcf6:%x:%x::/64 dev %s"
+
+# Generate the commands under test
+def build_commands(template, routes, device):
+  commands = []
+  for i in range(routes):
+    if template == ADD:
+      commands.append(template %(i >> 16, i & 0xffff, i & 0xffff, device))
+    else:
+      commands.append(template %(i >> 16, i & 0xffff, device))
+  return commands
+
+# Open an authenticated connection to the server
+def connect(options):
+  client = paramiko.SSHClient()
+  client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+  client.connect(options.ip, options.port, options.user, options.password,
+    look_for_keys=False, allow_agent=False)
+  return client
+
+# A new connection and an exec per command, like the ssh client does
+def run_exec(options, commands):
+  failed = 0
+  for command in commands:
+    client = connect(options)
+    _, stdout, _ = client.exec_command(command)
+    if stdout.channel.recv_exit_status() != 0:
+      failed += 1
+    client.close()
+  return failed
+
+# Stream the commands on a persistent session and collect the status lines
+def run_channel(transport, commands, window, failures):
+  channel = transport.open_session()
+  channel.invoke_subsystem("srv6")
+  replies = channel.makefile("r")
+  failed = 0
+  # Keep at most window commands in flight
+  for start in range(0, len(commands), window):
+    chunk = commands[start:start + window]
+    channel.sendall("\n".join(chunk) + "\n")
+    for _ in chunk:
+      if not replies.readline().startswith("0"):
+        failed += 1
+  channel.sendall("exit\n")
+  channel.close()
+  failures.append(failed)
+
+# Commands are spread over the channels of a single connection
+def run_session(options, commands):
+  client = connect(options)
+  transport = client.get_transport()
+  failures = []
+  threads = []
+  for i in range(options.channels):
+    thread = threading.Thread(target=run_channel, args=(transport,
+      commands[i::options.channels], options.window, failures))
+    thread.start()
+    threads.append(thread)
+  for thread in threads:
+    thread.join()
+  client.close()
+  return sum(failures)
+
+# Time a run and report the rate
+def measure(name, run, options, commands):
+  start = time.time()
+  failed = run(options, commands)
+  elapsed = time.time() - start
+  print("%-12s %8d routes %8.3f s %10.0f routes/s %6d failed" %(name, len(commands),
+    elapsed, len(commands) / elapsed, failed))
+
+# Parse options
+def parse_options():
+  parser = OptionParser()
+  parser.add_option("--ip", dest="ip", default="127.0.0.1", help="Server address")
+  parser.add_option("--port", dest="port", type="int", default=220, help="Server port")
+  parser.add_option("--user", dest="user", default="srv6", help="SSH user")
+  parser.add_option("--password", dest="password", default="srv6", help="SSH password")
+  parser.add_option("--device", dest="device", default="eth0", help="Output device")
+  parser.add_option("--routes", dest="routes", type="int", default=1000,
+    help="Number of routes")
+  parser.add_option("--channels", dest="channels", type="int", default=4,
+    help="Concurrent channels of the session")
+  parser.add_option("--window", dest="window", type="int", default=100,
+    help="Commands in flight per channel")
+  (options, args) = parser.parse_args()
+  return options
+
+if __name__ == "__main__":
+  options = parse_options()
+  adds = build_commands(ADD, options.routes, options.device)
+  dels = build_commands(DEL, options.routes, options.device)
+  measure("exec add", run_exec, options, adds)
+  measure("exec del", run_exec, options, dels)
+  measure("session add", run_session, options, adds)
+  measure("session del", run_session, options, dels)
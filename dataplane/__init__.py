@@ -0,0 +1 @@
+"""Dataplane programming utilities shared by the SRv6 southbound servers"""
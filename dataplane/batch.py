@@ -0,0 +1,229 @@
+#!/usr/bin/python
+
+import errno
+import logging
+import os
+import socket
+import struct
+import threading
+
+from dataplane.timing import timed
+
+# Global variables definition
+
+# logger reference
+logger = logging.getLogger(__name__)
+# Netlink constants
+NETLINK_ROUTE = 0
+SOL_NETLINK = 270
+NETLINK_CAP_ACK = 10
+NLMSG_ERROR = 2
+NLM_F_REQUEST = 0x1
+NLM_F_ACK = 0x4
+NLM_F_REPLACE = 0x100
+NLM_F_EXCL = 0x200
+NLM_F_CREATE = 0x400
+RTM_NEWROUTE = 24
+RTM_DELROUTE = 25
+# Route constants
+RT_TABLE_MAIN = 254
+RTPROT_STATIC = 4
+RT_SCOPE_UNIVERSE = 0
+RTN_UNICAST = 1
+RTA_DST = 1
+RTA_OIF = 4
+RTA_ENCAP_TYPE = 21
+RTA_ENCAP = 22
+LWTUNNEL_ENCAP_SEG6 = 5
+SEG6_IPTUNNEL_SRH = 1
+IPV6_SRCRT_TYPE_4 = 4
+# Seg6 encap modes
+SEG6_MODES = {
+  "inline":0,
+  "encap":1,
+  "l2encap":2
+}
+# Message type and flags of the supported operations
+OPS = {
+  "add":(RTM_NEWROUTE, NLM_F_REQUEST | NLM_F_ACK | NLM_F_CREATE | NLM_F_EXCL),
+  "replace":(RTM_NEWROUTE, NLM_F_REQUEST | NLM_F_ACK | NLM_F_CREATE | NLM_F_REPLACE),
+  "del":(RTM_DELROUTE, NLM_F_REQUEST | NLM_F_ACK)
+}
+# Netlink header: length, type, flags, sequence number, port id
+NLMSG_HDR = struct.Struct("=IHHII")
+NLMSG_ERRNO = struct.Struct("=i")
+# Route header: family, dst len, src len, tos, table, protocol, scope, type, flags
+RTMSG = struct.Struct("=BBBBBBBBI")
+# Attribute header: length, type
+NLA_HDR = struct.Struct("=HH")
+# Segment routing header: next header, length, type, segments left, first segment, flags, tag
+SRH = struct.Struct("=BBBBBBH")
+# Max number of bytes encoded in a single send
+MAX_BATCH_SIZE = 64 * 1024
+# Size of the socket buffers
+SOCKET_BUFFER_SIZE = 4 * 1024 * 1024
+# Size of a single read
+RECV_SIZE = 256 * 1024
+
+# Encode a netlink attribute
+def encode_nla(nla_type, payload):
+  length = NLA_HDR.size + len(payload)
+  # Attributes are aligned to 4 bytes
+  return NLA_HDR.pack(length, nla_type) + payload + b"\0" * (-length & 3)
+
+# Encode the seg6 lightweight tunnel of a route
+def encode_seg6(mode, segments):
+  if not segments:
+    raise ValueError("No segments")
+  # Inline mode keeps a slot for the original destination
+  slots = [socket.inet_pton(socket.AF_INET6, segment) for segment in reversed(segments)]
+  if mode == "inline":
+    slots.insert(0, b"\0" * 16)
+  srh = SRH.pack(0, len(slots) * 2, IPV6_SRCRT_TYPE_4, len(slots) - 1, len(slots) - 1, 0, 0)
+  return encode_nla(SEG6_IPTUNNEL_SRH, struct.pack("=i", SEG6_MODES[mode]) + srh + b"".join(slots))
+
+# Encode a seg6 route message
+def encode_route(op, path, oif, seq):
+  msg_type, flags = OPS[op]
+  # Split the destination in address and prefix length
+  dst, _, dst_len = path['dst'].partition("/")
+  dst_len = int(dst_len) if dst_len else 128
+  if not 0 <= dst_len <= 128:
+    raise ValueError("Invalid prefix length %s" %dst_len)
+  body = RTMSG.pack(socket.AF_INET6, dst_len, 0, 0, RT_TABLE_MAIN, RTPROT_STATIC,
+    RT_SCOPE_UNIVERSE, RTN_UNICAST, 0)
+  body += encode_nla(RTA_DST, socket.inet_pton(socket.AF_INET6, dst))
+  body += encode_nla(RTA_OIF, struct.pack("=I", oif))
+  # Removal does not need the encapsulation
+  if op != "del":
+    body += encode_nla(RTA_ENCAP_TYPE, struct.pack("=H", LWTUNNEL_ENCAP_SEG6))
+    body += encode_nla(RTA_ENCAP, encode_seg6(path['encapmode'], path['segs']))
+  return NLMSG_HDR.pack(NLMSG_HDR.size + len(body), msg_type, flags, seq, 0) + body
+
+class NetlinkBatch(object):
+  """Programs seg6 routes sending many netlink messages in a single send"""
+
+  def __init__(self, idxs, max_batch_size=MAX_BATCH_SIZE,
+      socket_buffer_size=SOCKET_BUFFER_SIZE):
+    # Cache of the resolved interfaces
+    self.idxs = idxs
+    self.max_batch_size = max_batch_size
+    # Requests sharing the engine are serialized on the socket
+    self.lock = threading.Lock()
+    self.seq = 0
+    self.socket_buffer_size = socket_buffer_size
+    self.socket = self.open()
+
+  def open(self):
+    # Open the netlink socket
+    nl = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, NETLINK_ROUTE)
+    for option in (socket.SO_SNDBUF, socket.SO_RCVBUF):
+      try:
+        nl.setsockopt(socket.SOL_SOCKET, option, self.socket_buffer_size)
+      except socket.error:
+        logger.warning("Cannot resize the netlink socket buffers")
+    # Errors do not need to echo back the whole request
+    try:
+      nl.setsockopt(SOL_NETLINK, NETLINK_CAP_ACK, 1)
+    except socket.error:
+      pass
+    nl.bind((0, 0))
+    return nl
+
+  def close(self):
+    self.socket.close()
+
+  def reopen(self):
+    # The acks still unread would answer the next requests, the socket is replaced
+    self.socket.close()
+    try:
+      self.socket = self.open()
+    except socket.error as e:
+      # The next request fails on the closed socket and tries again
+      logger.error("Cannot open a netlink socket: %s" %e)
+
+  def route(self, op, paths):
+    """Apply op to the paths and return one errno per path (0 means success)"""
+    return self.execute([(op, path) for path in paths])
+
+  def execute(self, operations):
+    """Apply a list of (op, path) and return one errno per operation"""
+    results = [0] * len(operations)
+    with self.lock:
+      with timed("lookup"):
+        oifs = [self.idxs.get(path['dev']) for _, path in operations]
+      # Chunks of messages sent together: (messages, sequence number -> index)
+      chunks = []
+      with timed("encode"):
+        batch = []
+        size = 0
+        pending = {}
+        for index, (op, path) in enumerate(operations):
+          # Unknown devices never reach the kernel
+          oif = oifs[index]
+          if oif is None:
+            results[index] = errno.ENODEV
+            continue
+          self.seq = (self.seq + 1) & 0xffffffff
+          try:
+            msg = encode_route(op, path, oif, self.seq)
+          except (socket.error, ValueError, KeyError):
+            # Malformed addresses or unknown encap mode
+            results[index] = errno.EINVAL
+            continue
+          batch.append(msg)
+          size += len(msg)
+          pending[self.seq] = index
+          # A new chunk when the buffer is full
+          if size >= self.max_batch_size:
+            chunks.append((batch, pending))
+            batch = []
+            size = 0
+            pending = {}
+        chunks.append((batch, pending))
+      with timed("kernel"):
+        for i, (batch, pending) in enumerate(chunks):
+          try:
+            self.flush(batch, pending, results)
+          except socket.error as e:
+            # The outcome of what has not been acknowledged is unknown
+            logger.error("Netlink socket failed: %s" %e)
+            for _, rest in chunks[i:]:
+              for index in rest.values():
+                results[index] = e.errno or errno.EIO
+            self.reopen()
+            break
+    return results
+
+  def flush(self, batch, pending, results):
+    # Nothing to send
+    if not pending:
+      return
+    # One send for the whole chunk
+    self.socket.send(b"".join(batch))
+    # Collect the acks, the kernel answers every message
+    while pending:
+      data = self.socket.recv(RECV_SIZE)
+      offset = 0
+      while offset + NLMSG_HDR.size <= len(data):
+        length, msg_type, _, seq, _ = NLMSG_HDR.unpack_from(data, offset)
+        if msg_type == NLMSG_ERROR and seq in pending:
+          error = NLMSG_ERRNO.unpack_from(data, offset + NLMSG_HDR.size)[0]
+          results[pending.pop(seq)] = -error
+        if length == 0:
+          break
+        # Messages are aligned to 4 bytes
+        offset += (length + 3) & ~3
+
+# Build a human readable report of the failed paths, in the order of the
+# request and identified like ip does, and of the failed removals of a sync
+# or a replace given their summary
+def format_errors(paths, results, summary=None):
+  errors = []
+  for path, result in zip(paths, results):
+    if result != 0:
+      errors.append("%s dev %s: %s" %(path['dst'], path['dev'], os.strerror(result)))
+  # The removals have no path of their own
+  if summary and summary["failed"] > len(errors):
+    errors.append("%s removals failed" %(summary["failed"] - len(errors)))
+  return "; ".join(errors)
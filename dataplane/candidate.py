@@ -0,0 +1,74 @@
+#!/usr/bin/python
+
+import logging
+import threading
+
+from dataplane.rib import get_key, get_value, get_path
+
+# Global variables definition
+
+# logger reference
+logger = logging.getLogger(__name__)
+
+class SRv6Candidate(object):
+  """Changes to the installed routes accumulated in memory until the commit"""
+
+  def __init__(self, rib):
+    # Table of the installed routes
+    self.rib = rib
+    self.lock = threading.Lock()
+    # (destination, device) -> (op, path), the last edit of a key wins
+    self.changes = {}
+    # The changes are the complete desired state
+    self.replace = False
+
+  def __len__(self):
+    return len(self.changes)
+
+  def modified(self):
+    return self.replace or bool(self.changes)
+
+  def edit(self, op, paths):
+    """Record op on the paths, nothing reaches the kernel"""
+    with self.lock:
+      # A sync starts the desired state from scratch
+      if op == "sync":
+        self.changes = {}
+        self.replace = True
+        op = "add"
+      for path in paths:
+        self.changes[get_key(path)] = (op, path)
+
+  def discard(self):
+    """Drop the uncommitted changes"""
+    with self.lock:
+      self.changes = {}
+      self.replace = False
+
+  def commit(self):
+    """Apply the net change as a single transaction, on failure nothing is applied
+    and the changes are kept. Return the paths, one errno per path and the summary"""
+    with self.lock:
+      # Additions first, the removals do not leave holes
+      operations = [(op, path) for op, path in self.changes.values() if op != "del"]
+      operations += [(op, path) for op, path in self.changes.values() if op == "del"]
+      results, summary = self.rib.transaction(operations, self.replace)
+      if summary["failed"] == 0:
+        self.changes = {}
+        self.replace = False
+      logger.info("commit: %s", summary)
+    return [path for _, path in operations], results, summary
+
+  def paths(self):
+    """Yield the paths of the candidate configuration"""
+    with self.lock:
+      changes = dict(self.changes)
+      replace = self.replace
+    # Installed routes not touched by the changes
+    if not replace:
+      for key, value in list(self.rib.routes.items()):
+        if key not in changes:
+          yield get_path(key, value)
+    for key, (op, path) in changes.items():
+      if op != "del":
+        yield get_path(key, get_value(path))
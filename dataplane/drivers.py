@@ -0,0 +1,207 @@
+#!/usr/bin/python
+
+import collections
+import errno
+import logging
+import os
+import re
+import socket
+import subprocess
+import threading
+
+try:
+  from pyroute2 import IPRoute
+  from pyroute2.netlink.exceptions import NetlinkError
+except ImportError:
+  IPRoute = None
+
+from dataplane.batch import encode_route
+from dataplane.pool import NetlinkPool
+from dataplane.rib import normalize_prefix
+
+# Global variables definition
+
+# logger reference
+logger = logging.getLogger(__name__)
+# Max number of operations remembered by the memory driver
+MAX_RECORDS = 100000
+# Errors printed by ip -> errno
+IP_ERRORS = dict((os.strerror(code), code) for code in errno.errorcode)
+# ip commands of the operations
+IP_COMMANDS = {
+  "add":"route add %s encap seg6 mode %s segs %s dev %s",
+  "replace":"route replace %s encap seg6 mode %s segs %s dev %s",
+  "del":"route del %s dev %s"
+}
+# Failed command of ip -batch
+IP_FAILED = re.compile(r"^Command failed -:(\d+)$")
+
+class Pyroute2Driver(object):
+  """Programs the routes with pyroute2, one netlink request per route"""
+
+  def __init__(self, idxs, size=None):
+    if IPRoute is None:
+      raise ImportError("pyroute2 is not available")
+    # Cache of the resolved interfaces
+    self.idxs = idxs
+    # Requests sharing the socket are serialized
+    self.lock = threading.Lock()
+    self.ip_route = IPRoute()
+
+  def close(self):
+    self.ip_route.close()
+
+  def route(self, op, paths):
+    """Apply op to the paths and return one errno per path (0 means success)"""
+    return self.execute([(op, path) for path in paths])
+
+  def execute(self, operations):
+    """Apply a list of (op, path) and return one errno per operation"""
+    results = [0] * len(operations)
+    with self.lock:
+      for index, (op, path) in enumerate(operations):
+        oif = self.idxs.get(path['dev'])
+        if oif is None:
+          results[index] = errno.ENODEV
+          continue
+        kwargs = {}
+        # Removal does not need the encapsulation
+        if op != "del":
+          kwargs['encap'] = {'type':'seg6', 'mode':path['encapmode'], 'segs':path['segs']}
+        try:
+          self.ip_route.route(op, dst=path['dst'], oif=oif, **kwargs)
+        except NetlinkError as e:
+          results[index] = e.code
+        except (socket.error, ValueError, KeyError):
+          # Malformed addresses or unknown encap mode
+          results[index] = errno.EINVAL
+    return results
+
+class IPCommandDriver(object):
+  """Programs the routes with the ip command, a single ip -batch per request"""
+
+  def __init__(self, idxs, size=None):
+    # Cache of the resolved interfaces
+    self.idxs = idxs
+
+  def close(self):
+    pass
+
+  def route(self, op, paths):
+    """Apply op to the paths and return one errno per path (0 means success)"""
+    return self.execute([(op, path) for path in paths])
+
+  def execute(self, operations):
+    """Apply a list of (op, path) and return one errno per operation"""
+    results = [0] * len(operations)
+    commands = []
+    # Line of the batch -> index of the operation
+    pending = {}
+    for index, (op, path) in enumerate(operations):
+      # Unknown devices never reach ip
+      oif = self.idxs.get(path['dev'])
+      if oif is None:
+        results[index] = errno.ENODEV
+        continue
+      # A malformed command would stop the whole batch
+      try:
+        encode_route(op, path, oif, 0)
+      except (socket.error, ValueError, KeyError):
+        results[index] = errno.EINVAL
+        continue
+      if op == "del":
+        command = IP_COMMANDS[op] %(path['dst'], path['dev'])
+      else:
+        command = IP_COMMANDS[op] %(path['dst'], path['encapmode'], ",".join(path['segs']),
+          path['dev'])
+      commands.append(command)
+      pending[len(commands)] = index
+    if not commands:
+      return results
+    # With -force ip goes on after a failure and reports the failed lines
+    process = subprocess.Popen(["ip", "-6", "-force", "-batch", "-"], stdin=subprocess.PIPE,
+      stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+    _, errors = process.communicate("\n".join(commands) + "\n")
+    error = None
+    for line in errors.splitlines():
+      failed = IP_FAILED.match(line)
+      if failed is None:
+        # The message preceding the failure
+        _, _, message = line.rpartition(": ")
+        error = IP_ERRORS.get(message.strip(), errno.EINVAL)
+        continue
+      index = pending.pop(int(failed.group(1)), None)
+      if index is not None:
+        results[index] = error or errno.EINVAL
+      error = None
+    # An error without a failed line stopped ip, the outcome of the rest is unknown
+    if error is not None:
+      logger.error("ip stopped: %s" %errors.strip().splitlines()[-1])
+      for index in pending.values():
+        results[index] = errno.EINVAL
+    return results
+
+class MemoryDriver(object):
+  """Keeps the routes in memory and answers like the kernel, for testing and
+  benchmarking without root. The last operations are recorded"""
+
+  def __init__(self, idxs, size=None, max_records=MAX_RECORDS):
+    # Cache of the resolved interfaces
+    self.idxs = idxs
+    # (destination, device) -> (encapmode, segments)
+    self.routes = {}
+    self.records = collections.deque(maxlen=max_records)
+    self.operations = 0
+    self.lock = threading.Lock()
+
+  def close(self):
+    pass
+
+  def route(self, op, paths):
+    """Apply op to the paths and return one errno per path (0 means success)"""
+    return self.execute([(op, path) for path in paths])
+
+  def execute(self, operations):
+    """Apply a list of (op, path) and return one errno per operation"""
+    results = []
+    with self.lock:
+      self.operations += len(operations)
+      self.records.extend(operations)
+      for op, path in operations:
+        oif = self.idxs.get(path['dev'])
+        if oif is None:
+          results.append(errno.ENODEV)
+          continue
+        # Malformed addresses or unknown encap mode, like the other drivers
+        try:
+          encode_route(op, path, oif, 0)
+        except (socket.error, ValueError, KeyError):
+          results.append(errno.EINVAL)
+          continue
+        # The kernel keys the routes by normalized prefix
+        key = (normalize_prefix(path['dst']), path['dev'])
+        if op == "del":
+          results.append(0 if self.routes.pop(key, None) is not None else errno.ESRCH)
+        elif op == "add" and key in self.routes:
+          results.append(errno.EEXIST)
+        else:
+          self.routes[key] = (path['encapmode'], tuple(path['segs']))
+          results.append(0)
+    return results
+
+# Drivers selectable at startup
+DRIVERS = {
+  "batch":NetlinkPool,
+  "pyroute2":Pyroute2Driver,
+  "ip":IPCommandDriver,
+  "memory":MemoryDriver
+}
+# Default driver
+DRIVER = "batch"
+
+# Build the driver programming the routes
+def get_driver(name, idxs, size):
+  if name not in DRIVERS:
+    raise ValueError("Unknown driver %s, choose one of %s" %(name, ", ".join(sorted(DRIVERS))))
+  logger.info("Programming the routes with the %s driver" %name)
+  return DRIVERS[name](idxs, size)
@@ -0,0 +1,191 @@
+#!/usr/bin/python
+
+import logging
+import socket
+import struct
+
+from dataplane.batch import (NETLINK_ROUTE, SOL_NETLINK, NLMSG_ERROR, NLM_F_REQUEST,
+  NLMSG_HDR, NLMSG_ERRNO, RTMSG, NLA_HDR, SRH, RTA_DST, RTA_OIF, RTA_ENCAP_TYPE,
+  RTA_ENCAP, LWTUNNEL_ENCAP_SEG6, SEG6_IPTUNNEL_SRH, SEG6_MODES, SOCKET_BUFFER_SIZE,
+  RECV_SIZE, encode_nla)
+
+# Global variables definition
+
+# logger reference
+logger = logging.getLogger(__name__)
+# Netlink constants
+NETLINK_GET_STRICT_CHK = 12
+NLMSG_DONE = 3
+NLM_F_DUMP = 0x300
+RTM_GETROUTE = 26
+RTM_NEWROUTE = 24
+# Seg6 encap modes by value
+SEG6_MODE_NAMES = dict((v, k) for k, v in SEG6_MODES.items())
+# Default number of paths per page
+PAGE_SIZE = 1000
+
+# Parse a chain of netlink attributes
+def parse_nlas(data, offset, end):
+  nlas = {}
+  while offset + NLA_HDR.size <= end:
+    length, nla_type = NLA_HDR.unpack_from(data, offset)
+    if length < NLA_HDR.size:
+      break
+    # Drop the nested and byte order flags
+    nlas[nla_type & 0x3fff] = (offset + NLA_HDR.size, offset + length)
+    offset += (length + 3) & ~3
+  return nlas
+
+# Parse a prefix into packed address and length
+def parse_prefix(prefix):
+  address, _, length = prefix.partition("/")
+  return socket.inet_pton(socket.AF_INET6, address), int(length) if length else 128
+
+# Check if a destination falls within a prefix
+def in_prefix(dst, dst_len, prefix):
+  address, length = prefix
+  if dst_len < length:
+    return False
+  # Compare the whole bytes and then the remaining bits
+  full, bits = divmod(length, 8)
+  if dst[:full] != address[:full]:
+    return False
+  if bits == 0:
+    return True
+  mask = (0xff << (8 - bits)) & 0xff
+  return (bytearray(dst)[full] & mask) == (bytearray(address)[full] & mask)
+
+# Decode the seg6 lightweight tunnel of a route
+def decode_seg6(data, start, end):
+  nlas = parse_nlas(data, start, end)
+  if SEG6_IPTUNNEL_SRH not in nlas:
+    return None, None
+  offset, _ = nlas[SEG6_IPTUNNEL_SRH]
+  mode = struct.unpack_from("=i", data, offset)[0]
+  first_segment = SRH.unpack_from(data, offset + 4)[4]
+  offset += 4 + SRH.size
+  slots = [socket.inet_ntop(socket.AF_INET6, data[offset + 16 * i:offset + 16 * (i + 1)])
+    for i in range(first_segment + 1)]
+  mode = SEG6_MODE_NAMES.get(mode, str(mode))
+  # Inline mode keeps a slot for the original destination
+  if mode == "inline":
+    slots = slots[1:]
+  # Segments are stored in reverse order
+  slots.reverse()
+  return mode, slots
+
+def dump_routes(idxs, device=None, prefix=None, encapmode=None):
+  """Yield the seg6 routes installed in the kernel as paths, one netlink
+  message at a time, without loading the whole table in memory"""
+  if prefix is not None:
+    prefix = parse_prefix(prefix)
+  oif = None
+  if device is not None:
+    oif = idxs.get(device)
+    # Nothing can match
+    if oif is None:
+      return
+  names = dict((v, k) for k, v in idxs.items())
+  nl = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, NETLINK_ROUTE)
+  try:
+    try:
+      nl.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, SOCKET_BUFFER_SIZE)
+    except socket.error:
+      pass
+    # With strict checking the kernel filters on the device
+    request = RTMSG.pack(socket.AF_INET6, 0, 0, 0, 0, 0, 0, 0, 0)
+    try:
+      nl.setsockopt(SOL_NETLINK, NETLINK_GET_STRICT_CHK, 1)
+      if oif is not None:
+        request += encode_nla(RTA_OIF, struct.pack("=I", oif))
+    except socket.error:
+      pass
+    nl.bind((0, 0))
+    nl.send(NLMSG_HDR.pack(NLMSG_HDR.size + len(request), RTM_GETROUTE,
+      NLM_F_REQUEST | NLM_F_DUMP, 1, 0) + request)
+    while True:
+      data = nl.recv(RECV_SIZE)
+      offset = 0
+      while offset + NLMSG_HDR.size <= len(data):
+        length, msg_type, _, _, _ = NLMSG_HDR.unpack_from(data, offset)
+        if msg_type == NLMSG_DONE:
+          return
+        if msg_type == NLMSG_ERROR:
+          error = NLMSG_ERRNO.unpack_from(data, offset + NLMSG_HDR.size)[0]
+          raise OSError(-error, "route dump failed")
+        if msg_type == RTM_NEWROUTE:
+          path = parse_route(data, offset, length, names, oif, prefix, encapmode)
+          if path is not None:
+            yield path
+        if length == 0:
+          break
+        # Messages are aligned to 4 bytes
+        offset += (length + 3) & ~3
+  finally:
+    nl.close()
+
+# Parse a route message and return the path if it matches the filters
+def parse_route(data, offset, length, names, oif, prefix, encapmode):
+  header = offset + NLMSG_HDR.size
+  family, dst_len = RTMSG.unpack_from(data, header)[:2]
+  if family != socket.AF_INET6:
+    return None
+  nlas = parse_nlas(data, header + RTMSG.size, offset + length)
+  # Only seg6 routes
+  if RTA_ENCAP_TYPE not in nlas or RTA_ENCAP not in nlas:
+    return None
+  start, _ = nlas[RTA_ENCAP_TYPE]
+  if struct.unpack_from("=H", data, start)[0] != LWTUNNEL_ENCAP_SEG6:
+    return None
+  # Filter on the device
+  route_oif = None
+  if RTA_OIF in nlas:
+    route_oif = struct.unpack_from("=I", data, nlas[RTA_OIF][0])[0]
+  if oif is not None and route_oif != oif:
+    return None
+  # Filter on the prefix
+  dst = b"\0" * 16
+  if RTA_DST in nlas:
+    start, end = nlas[RTA_DST]
+    dst = data[start:end]
+  if prefix is not None and not in_prefix(dst, dst_len, prefix):
+    return None
+  # Filter on the encap mode
+  mode, segments = decode_seg6(data, *nlas[RTA_ENCAP])
+  if mode is None or (encapmode is not None and mode != encapmode):
+    return None
+  return {'dst':"%s/%s" %(socket.inet_ntop(socket.AF_INET6, dst), dst_len),
+    'dev':names.get(route_oif, str(route_oif)), 'encapmode':mode, 'segs':segments}
+
+# Group the paths in pages
+def paginate(paths, page_size=PAGE_SIZE):
+  page = []
+  for path in paths:
+    page.append(path)
+    if len(page) == page_size:
+      yield page
+      page = []
+  if page:
+    yield page
+
+# Routes installed on the managed devices, used to seed the table at startup
+def managed_routes(idxs, interfaces):
+  interfaces = set(interfaces)
+  for path in dump_routes(idxs):
+    if path['dev'] in interfaces:
+      yield path
+
+# Filter paths read from memory, same filters of the route dump
+def filter_paths(paths, device=None, prefix=None, encapmode=None):
+  if prefix is not None:
+    prefix = parse_prefix(prefix)
+  for path in paths:
+    if device is not None and path['dev'] != device:
+      continue
+    if encapmode is not None and path['encapmode'] != encapmode:
+      continue
+    if prefix is not None:
+      dst, dst_len = parse_prefix(path['dst'])
+      if not in_prefix(dst, dst_len, prefix):
+        continue
+    yield path
@@ -0,0 +1,56 @@
+#!/usr/bin/python
+
+import logging
+import os
+
+# Global variables definition
+
+# logger reference
+logger = logging.getLogger(__name__)
+# Operations handled in-process
+ROUTE_OPS = {
+  "add":"add",
+  "replace":"replace",
+  "del":"del",
+  "delete":"del"
+}
+
+def parse_ip_route(command):
+  """Parse an ip -6 route add/replace/del command of a seg6 route into
+  (op, path), None if the command is not supported and has to run in a shell
+
+  ip -6 route add 2222:4::2/128 encap seg6 mode inline segs 2222:3::2 dev eth0
+  ip -6 route del 2222:4::2/128 dev eth0
+  """
+  words = command.split()
+  if len(words) < 5 or os.path.basename(words[0]) != "ip" or words[1:3] != ["-6", "route"]:
+    return None
+  op = ROUTE_OPS.get(words[3])
+  if op is None:
+    return None
+  # ip assumes a host route without the length
+  dst = words[4]
+  path = {'dst':dst if "/" in dst else dst + "/128"}
+  seg6 = False
+  args = iter(words[5:])
+  for word in args:
+    value = next(args, None)
+    if value is None:
+      return None
+    if word == "dev":
+      path['dev'] = value
+    elif word == "encap" and value == "seg6":
+      seg6 = True
+    elif word == "mode" and seg6:
+      path['encapmode'] = value
+    elif word == "segs" and seg6:
+      path['segs'] = value.split(",")
+    else:
+      # Everything else is left to the shell
+      return None
+  if 'dev' not in path:
+    return None
+  # Only seg6 routes are added in-process
+  if op != "del" and ('encapmode' not in path or 'segs' not in path):
+    return None
+  return op, path
@@ -0,0 +1,219 @@
+#!/usr/bin/python
+
+import errno
+import logging
+import socket
+import struct
+import threading
+
+from dataplane.batch import (NETLINK_ROUTE, NLMSG_ERROR, NLM_F_REQUEST, NLMSG_HDR,
+  NLMSG_ERRNO, SOCKET_BUFFER_SIZE, RECV_SIZE, encode_nla)
+from dataplane.dump import NLMSG_DONE, NLM_F_DUMP, parse_nlas
+
+# Global variables definition
+
+# logger reference
+logger = logging.getLogger(__name__)
+# Netlink constants
+RTM_NEWLINK = 16
+RTM_DELLINK = 17
+RTM_GETLINK = 18
+RTMGRP_LINK = 0x1
+IFLA_IFNAME = 3
+# Link header: family, pad, type, index, flags, change
+IFINFOMSG = struct.Struct("=BxHiII")
+# Max number of unknown devices remembered between two link events
+MAX_MISSING = 1024
+
+# Parse a link message into index and name
+def parse_link(data, offset, length):
+  header = offset + NLMSG_HDR.size
+  index = IFINFOMSG.unpack_from(data, header)[2]
+  nlas = parse_nlas(data, header + IFINFOMSG.size, offset + length)
+  if IFLA_IFNAME not in nlas:
+    return index, None
+  start, end = nlas[IFLA_IFNAME]
+  name = data[start:end].split(b"\0", 1)[0].decode("ascii", "replace")
+  return index, str(name)
+
+# Iterate over the netlink messages of a read
+def messages(data):
+  offset = 0
+  while offset + NLMSG_HDR.size <= len(data):
+    length, msg_type, _, seq, _ = NLMSG_HDR.unpack_from(data, offset)
+    yield offset, length, msg_type, seq
+    if length == 0:
+      return
+    # Messages are aligned to 4 bytes
+    offset += (length + 3) & ~3
+
+class InterfaceCache(object):
+  """Interface name -> index, loaded with a single link dump and kept
+  current by the netlink link events"""
+
+  def __init__(self):
+    # name -> index and index -> name
+    self.idxs = {}
+    self.names = {}
+    # Devices which do not exist, forgotten at the next link event
+    self.missing = set()
+    self.lock = threading.Lock()
+    self.seq = 0
+    self.events = None
+    self.listener = None
+
+  def __len__(self):
+    return len(self.idxs)
+
+  def __contains__(self, name):
+    return self.get(name) is not None
+
+  def __getitem__(self, name):
+    index = self.get(name)
+    if index is None:
+      raise KeyError(name)
+    return index
+
+  def items(self):
+    return list(self.idxs.items())
+
+  def name(self, index):
+    return self.names.get(index)
+
+  def get(self, name, default=None):
+    """Return the index of the device, resolving it on a miss"""
+    index = self.idxs.get(name)
+    if index is not None:
+      return index
+    if name in self.missing:
+      return default
+    index = self.resolve(name)
+    if index is None:
+      with self.lock:
+        if len(self.missing) >= MAX_MISSING:
+          self.missing.clear()
+        self.missing.add(name)
+      return default
+    return index
+
+  def start(self):
+    """Subscribe to the link events and load all the links"""
+    # Subscribe first, no change can be lost between the dump and the events
+    self.events = self.open(RTMGRP_LINK)
+    self.load()
+    self.listener = threading.Thread(target=self.listen)
+    self.listener.daemon = True
+    self.listener.start()
+
+  def open(self, groups=0):
+    nl = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, NETLINK_ROUTE)
+    try:
+      nl.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, SOCKET_BUFFER_SIZE)
+    except socket.error:
+      pass
+    nl.bind((0, groups))
+    return nl
+
+  def query(self, flags, attributes=b""):
+    # Send a link request and collect the links of the reply
+    with self.lock:
+      self.seq = (self.seq + 1) & 0xffffffff
+      seq = self.seq
+    request = IFINFOMSG.pack(socket.AF_UNSPEC, 0, 0, 0, 0) + attributes
+    links = []
+    nl = self.open()
+    try:
+      nl.send(NLMSG_HDR.pack(NLMSG_HDR.size + len(request), RTM_GETLINK, flags, seq, 0)
+        + request)
+      while True:
+        data = nl.recv(RECV_SIZE)
+        for offset, length, msg_type, msg_seq in messages(data):
+          if msg_seq != seq:
+            continue
+          if msg_type == NLMSG_DONE:
+            return links
+          if msg_type == NLMSG_ERROR:
+            error = -NLMSG_ERRNO.unpack_from(data, offset + NLMSG_HDR.size)[0]
+            if error in (0, errno.ENODEV):
+              return links
+            raise OSError(error, "link request failed")
+          if msg_type == RTM_NEWLINK:
+            links.append(parse_link(data, offset, length))
+        # A single link is answered with a single message
+        if not flags & NLM_F_DUMP and links:
+          return links
+    finally:
+      nl.close()
+
+  def load(self):
+    """Replace the content of the cache with a dump of all the links"""
+    links = self.query(NLM_F_REQUEST | NLM_F_DUMP)
+    with self.lock:
+      self.idxs = dict((name, index) for index, name in links if name is not None)
+      self.names = dict((index, name) for name, index in self.idxs.items())
+      self.missing.clear()
+    logger.info("Loaded %s interfaces" %len(self.idxs))
+
+  def resolve(self, name):
+    # Cache miss, ask the kernel for this device only
+    try:
+      links = self.query(NLM_F_REQUEST, encode_nla(IFLA_IFNAME, name.encode("ascii") + b"\0"))
+    except (OSError, UnicodeError) as e:
+      logger.debug("Cannot resolve %s: %s" %(name, e))
+      return None
+    for index, link_name in links:
+      if link_name == name:
+        self.update(index, name)
+        return index
+    return None
+
+  def update(self, index, name):
+    with self.lock:
+      # The index may have been renamed
+      old = self.names.get(index)
+      if old is not None and old != name:
+        self.idxs.pop(old, None)
+      # Or the name may have moved to a new index
+      previous = self.idxs.get(name)
+      if previous is not None and previous != index:
+        self.names.pop(previous, None)
+      self.idxs[name] = index
+      self.names[index] = name
+      self.missing.clear()
+
+  def remove(self, index):
+    with self.lock:
+      name = self.names.pop(index, None)
+      if name is not None and self.idxs.get(name) == index:
+        del self.idxs[name]
+
+  def listen(self):
+    # Apply the link events to the cache
+    reload = False
+    while True:
+      # Events have been lost, start over from a fresh dump
+      if reload:
+        try:
+          self.load()
+          reload = False
+        except (OSError, socket.error) as e:
+          logger.error("Cannot reload the interfaces, retrying at the next event: %s" %e)
+      try:
+        data = self.events.recv(RECV_SIZE)
+      except socket.error as e:
+        if e.errno == errno.ENOBUFS:
+          logger.warning("Link events overrun, reloading the interfaces")
+          reload = True
+          continue
+        logger.error("Link events stopped: %s" %e)
+        return
+      for offset, length, msg_type, _ in messages(data):
+        if msg_type == RTM_NEWLINK:
+          index, name = parse_link(data, offset, length)
+          if name is not None:
+            logger.debug("Link %s is %s" %(name, index))
+            self.update(index, name)
+        elif msg_type == RTM_DELLINK:
+          index, _ = parse_link(data, offset, length)
+          logger.debug("Link %s removed" %index)
+          self.remove(index)
@@ -0,0 +1,172 @@
+#!/usr/bin/python
+
+import atexit
+import json
+import logging
+import threading
+import time
+
+try:
+  import Queue as queue
+except ImportError:
+  import queue
+
+# Global variables definition
+
+# logger reference
+logger = logging.getLogger(__name__)
+# Max number of log records waiting to be written, the following ones are dropped
+MAX_QUEUED_RECORDS = 100000
+# Max number of batches waiting to be written to the audit log, the operations
+# of the following ones are dropped
+MAX_QUEUED_BATCHES = 10000
+# Stops the audit log
+CLOSE = object()
+
+class QueueHandler(logging.Handler):
+  """Enqueues the records as they are: formatting and writing happen on the
+  thread of the writer, the request threads never wait for them"""
+
+  def __init__(self, records):
+    logging.Handler.__init__(self)
+    self.records = records
+    self.dropped = 0
+
+  def emit(self, record):
+    try:
+      self.records.put_nowait(record)
+    except queue.Full:
+      self.dropped += 1
+
+class LogWriter(object):
+  """Formats and writes the enqueued records on a background thread"""
+
+  def __init__(self, queue_handler, handlers):
+    self.queue_handler = queue_handler
+    self.records = queue_handler.records
+    self.handlers = handlers
+    # Dropped records already reported
+    self.reported = 0
+    self.thread = threading.Thread(target=self.run)
+    self.thread.daemon = True
+    self.thread.start()
+    # The last records are written before exiting
+    atexit.register(self.flush)
+
+  def write(self, record):
+    # Report the records dropped meanwhile
+    dropped = self.queue_handler.dropped
+    if dropped != self.reported:
+      self.handle(logging.LogRecord(logger.name, logging.WARNING, __file__, 0,
+        "%s log records dropped", (dropped - self.reported,), None))
+      self.reported = dropped
+    self.handle(record)
+
+  def handle(self, record):
+    for handler in self.handlers:
+      if record.levelno >= handler.level:
+        handler.handle(record)
+
+  def run(self):
+    while True:
+      self.write(self.records.get())
+
+  def flush(self):
+    while True:
+      try:
+        self.write(self.records.get_nowait())
+      except queue.Empty:
+        return
+
+# Setup the root logger: the records are enqueued and written in background
+def setup_logging(level):
+  root = logging.getLogger()
+  root.setLevel(level)
+  # Same output of basicConfig
+  handler = logging.StreamHandler()
+  handler.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+  queue_handler = QueueHandler(queue.Queue(MAX_QUEUED_RECORDS))
+  root.addHandler(queue_handler)
+  return LogWriter(queue_handler, [handler])
+
+class AuditLog(object):
+  """Trail of the route operations applied by the driver, one JSON object
+  per line, written on a background thread. If the writer falls behind the
+  operations are dropped and their number is written in the trail"""
+
+  def __init__(self, filename):
+    self.file = open(filename, "a")
+    # Batches to write: (time, operations, results)
+    self.batches = queue.Queue(MAX_QUEUED_BATCHES)
+    self.dropped = 0
+    # Dropped operations already reported
+    self.reported = 0
+    self.thread = threading.Thread(target=self.run)
+    self.thread.daemon = True
+    self.thread.start()
+    atexit.register(self.close)
+
+  def record(self, operations, results):
+    try:
+      self.batches.put_nowait((time.time(), operations, results))
+    except queue.Full:
+      self.dropped += len(operations)
+
+  def close(self):
+    if self.thread.is_alive():
+      self.batches.put(CLOSE)
+      self.thread.join()
+
+  def run(self):
+    while True:
+      # Write what has been queued meanwhile at once
+      batches = [self.batches.get()]
+      while True:
+        try:
+          batches.append(self.batches.get_nowait())
+        except queue.Empty:
+          break
+      lines = []
+      for batch in batches:
+        if batch is CLOSE:
+          break
+        timestamp, operations, results = batch
+        for (op, path), result in zip(operations, results):
+          lines.append(json.dumps({"time": timestamp, "op": op, "dst": path['dst'],
+            "dev": path['dev'], "encapmode": path.get('encapmode'), "segs": path.get('segs'),
+            "errno": result}, sort_keys=True))
+      # Report the operations dropped meanwhile
+      dropped = self.dropped
+      if dropped != self.reported:
+        lines.append(json.dumps({"time": time.time(), "dropped": dropped - self.reported},
+          sort_keys=True))
+        logger.warning("%s audit records dropped", dropped - self.reported)
+        self.reported = dropped
+      if lines:
+        self.file.write("\n".join(lines) + "\n")
+        self.file.flush()
+      if CLOSE in batches:
+        self.file.close()
+        return
+
+class AuditedDriver(object):
+  """Records every route operation applied by a driver in the audit log"""
+
+  def __init__(self, engine, audit_log):
+    self.engine = engine
+    self.audit_log = audit_log
+
+  def close(self):
+    self.engine.close()
+    self.audit_log.close()
+
+  def route(self, op, paths):
+    """Apply op to the paths and return one errno per path (0 means success)"""
+    return self.execute([(op, path) for path in paths])
+
+  def execute(self, operations):
+    """Apply a list of (op, path) and return one errno per operation"""
+    results = self.engine.execute(operations)
+    # The caller may reuse the lists
+    self.audit_log.record(list(operations), list(results))
+    return results
@@ -0,0 +1,301 @@
+#!/usr/bin/python
+
+import bisect
+import errno
+import logging
+import threading
+import time
+
+try:
+  from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+  from SocketServer import ThreadingMixIn
+  from urlparse import parse_qs
+except ImportError:
+  from http.server import BaseHTTPRequestHandler, HTTPServer
+  from socketserver import ThreadingMixIn
+  from urllib.parse import parse_qs
+
+from dataplane.profiler import profile, PROFILE_SECONDS
+
+# Global variables definition
+
+# logger reference
+logger = logging.getLogger(__name__)
+# The metrics are served only locally by default
+METRICS_IP = "127.0.0.1"
+# Path of the metrics
+METRICS_PATH = "/metrics"
+# Path of the profiles: /profile?seconds=N returns the collapsed stacks
+PROFILE_PATH = "/profile"
+# Content type of the Prometheus text format
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# Buckets of the latencies in seconds
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+  0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# Buckets of the paths per request
+PATHS_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 100000)
+# Registered metrics, in order of exposition
+REGISTRY = []
+
+# Format a number like Prometheus does
+def format_value(value):
+  if value == float("inf"):
+    return "+Inf"
+  if isinstance(value, float) and value.is_integer():
+    return str(int(value))
+  return repr(value)
+
+# Format the labels of a sample
+def format_labels(names, values):
+  if not names:
+    return ""
+  return "{%s}" %",".join('%s="%s"' %(name, str(value).replace("\\", "\\\\")
+    .replace('"', '\\"').replace("\n", "\\n")) for name, value in zip(names, values))
+
+class Metric(object):
+  """Base of the metrics, a value per combination of the labels"""
+
+  type = None
+
+  def __init__(self, name, documentation, labels=()):
+    self.name = name
+    self.documentation = documentation
+    self.labels = tuple(labels)
+    # label values -> value
+    self.values = {}
+    self.lock = threading.Lock()
+    REGISTRY.append(self)
+
+  def samples(self):
+    with self.lock:
+      return [(self.name, self.labels, labels, value)
+        for labels, value in sorted(self.values.items())]
+
+  def render(self):
+    lines = ["# HELP %s %s" %(self.name, self.documentation),
+             "# TYPE %s %s" %(self.name, self.type)]
+    for name, names, values, value in self.samples():
+      lines.append("%s%s %s" %(name, format_labels(names, values), format_value(value)))
+    return lines
+
+class Counter(Metric):
+  """Monotonic counter"""
+
+  type = "counter"
+
+  def inc(self, labels=(), value=1):
+    with self.lock:
+      self.values[labels] = self.values.get(labels, 0) + value
+
+class Gauge(Metric):
+  """Value going up and down, or read from a function at every scrape"""
+
+  type = "gauge"
+
+  def __init__(self, name, documentation, labels=()):
+    Metric.__init__(self, name, documentation, labels)
+    # label values -> function
+    self.functions = {}
+
+  def set(self, value, labels=()):
+    with self.lock:
+      self.values[labels] = value
+
+  def inc(self, labels=(), value=1):
+    with self.lock:
+      self.values[labels] = self.values.get(labels, 0) + value
+
+  def dec(self, labels=(), value=1):
+    self.inc(labels, -value)
+
+  def set_function(self, function, labels=()):
+    with self.lock:
+      self.functions[labels] = function
+
+  def samples(self):
+    with self.lock:
+      functions = list(self.functions.items())
+    for labels, function in functions:
+      try:
+        self.set(function(), labels)
+      except Exception as e:
+        logger.debug("Cannot read %s: %s" %(self.name, e))
+    return Metric.samples(self)
+
+class Histogram(Metric):
+  """Distribution of the observed values in cumulative buckets"""
+
+  type = "histogram"
+
+  def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+    Metric.__init__(self, name, documentation, labels)
+    self.buckets = tuple(sorted(buckets))
+
+  def observe(self, value, labels=()):
+    # Counts of the buckets, the last one is +Inf, then the sum
+    index = bisect.bisect_left(self.buckets, value)
+    with self.lock:
+      counts = self.values.get(labels)
+      if counts is None:
+        counts = self.values[labels] = [0] * (len(self.buckets) + 1) + [0]
+      counts[index] += 1
+      counts[-1] += value
+
+  def samples(self):
+    samples = []
+    names = self.labels + ("le",)
+    with self.lock:
+      items = sorted((labels, list(counts)) for labels, counts in self.values.items())
+    for labels, counts in items:
+      total = 0
+      for bound, count in zip(self.buckets + (float("inf"),), counts):
+        total += count
+        samples.append((self.name + "_bucket", names, labels + (format_value(bound),), total))
+      samples.append((self.name + "_count", self.labels, labels, total))
+      samples.append((self.name + "_sum", self.labels, labels, counts[-1]))
+    return samples
+
+# Metrics of the servers
+REQUESTS = Counter("srv6_requests_total", "Requests served",
+  ("transport", "operation", "status"))
+REQUEST_SECONDS = Histogram("srv6_request_seconds", "Time to serve a request",
+  ("transport", "operation"))
+REQUEST_PATHS = Histogram("srv6_request_paths", "Paths per request",
+  ("transport", "operation"), PATHS_BUCKETS)
+DRIVER_SECONDS = Histogram("srv6_driver_seconds",
+  "Time spent by the driver programming a batch of routes", ("driver",))
+DRIVER_OPERATIONS = Counter("srv6_driver_operations_total",
+  "Route operations sent to the driver", ("driver", "operation"))
+DRIVER_ERRORS = Counter("srv6_driver_errors_total",
+  "Route operations refused by the kernel", ("driver", "errno"))
+DRIVER_IN_PROGRESS = Gauge("srv6_driver_in_progress",
+  "Batches being programmed or waiting for a netlink socket", ("driver",))
+DRIVER_WAITING = Gauge("srv6_driver_waiting", "Batches waiting for a netlink socket",
+  ("driver",))
+QUEUE_DEPTH = Gauge("srv6_queue_depth", "Work waiting for a thread of the server",
+  ("transport",))
+INSTALLED_ROUTES = Gauge("srv6_installed_routes", "Routes in the table of the installed routes")
+
+# Record a served request
+def observe_request(transport, operation, seconds, paths, failed=False):
+  labels = (transport, operation)
+  REQUESTS.inc(labels + ("error" if failed else "ok",))
+  REQUEST_SECONDS.observe(seconds, labels)
+  REQUEST_PATHS.observe(paths, labels)
+
+class RequestMetrics(object):
+  """Records a request when the block ends, operation and paths are filled
+  while it is served. Requests without operation are not recorded"""
+
+  def __init__(self, transport, operation=None, paths=0):
+    self.transport = transport
+    self.operation = operation
+    self.paths = paths
+    self.failed = False
+
+  def __enter__(self):
+    self.start = time.time()
+    return self
+
+  def __exit__(self, exc_type, exc_value, traceback):
+    if self.operation is not None:
+      observe_request(self.transport, self.operation, time.time() - self.start, self.paths,
+        self.failed or exc_type is not None)
+
+class MeteredDriver(object):
+  """Measures the batches programmed by a driver and the errors of the kernel"""
+
+  def __init__(self, engine, name):
+    self.engine = engine
+    self.name = name
+    DRIVER_WAITING.set_function(lambda: getattr(engine, "waiting", 0), (name,))
+
+  def close(self):
+    self.engine.close()
+
+  def route(self, op, paths):
+    """Apply op to the paths and return one errno per path (0 means success)"""
+    return self.execute([(op, path) for path in paths])
+
+  def execute(self, operations):
+    """Apply a list of (op, path) and return one errno per operation"""
+    labels = (self.name,)
+    DRIVER_IN_PROGRESS.inc(labels)
+    start = time.time()
+    try:
+      results = self.engine.execute(operations)
+    finally:
+      DRIVER_SECONDS.observe(time.time() - start, labels)
+      DRIVER_IN_PROGRESS.dec(labels)
+    for op, _ in operations:
+      DRIVER_OPERATIONS.inc((self.name, op))
+    for result in results:
+      if result != 0:
+        DRIVER_ERRORS.inc((self.name, errno.errorcode.get(result, str(result))))
+    return results
+
+# Follow the size of the table of the installed routes
+def watch_rib(rib):
+  INSTALLED_ROUTES.set_function(lambda: len(rib))
+
+# Follow the work waiting for the threads of a server
+def watch_queue(transport, function):
+  QUEUE_DEPTH.set_function(function, (transport,))
+
+# Build the exposition of all the metrics
+def render():
+  lines = []
+  for metric in REGISTRY:
+    lines.extend(metric.render())
+  return "\n".join(lines) + "\n"
+
+class MetricsHTTPRequestHandler(BaseHTTPRequestHandler):
+  """Serves the metrics in the Prometheus text format and the profiles"""
+
+  def send_body(self, body, content_type):
+    body = body.encode("utf-8")
+    self.send_response(200)
+    self.send_header("Content-Type", content_type)
+    self.send_header("Content-Length", str(len(body)))
+    self.end_headers()
+    self.wfile.write(body)
+
+  def do_GET(self):
+    path, _, query_string = self.path.partition("?")
+    if path == METRICS_PATH:
+      self.send_body(render(), CONTENT_TYPE)
+    elif path == PROFILE_PATH:
+      self.send_profile(parse_qs(query_string))
+    else:
+      self.send_error(404)
+
+  def send_profile(self, query):
+    try:
+      seconds = float(query.get("seconds", [PROFILE_SECONDS])[0])
+    except ValueError:
+      self.send_error(400, "Invalid seconds")
+      return
+    # The stacks are sampled while the request waits
+    stacks = profile(seconds)
+    if stacks is None:
+      self.send_error(409, "A profile is already running")
+      return
+    self.send_body(stacks, "text/plain; charset=utf-8")
+
+  def log_message(self, format, *args):
+    # Scrapes are not worth a log line
+    logger.debug(format, *args)
+
+class MetricsHTTPServer(ThreadingMixIn, HTTPServer):
+  """Metrics endpoint, each scrape on its own thread"""
+  daemon_threads = True
+  allow_reuse_address = True
+
+# Serve the metrics in background
+def start_metrics_server(port, ip=METRICS_IP):
+  metrics_server = MetricsHTTPServer((ip, port), MetricsHTTPRequestHandler)
+  thread = threading.Thread(target=metrics_server.serve_forever)
+  thread.daemon = True
+  thread.start()
+  logger.info("Serving the metrics on http://%s:%s%s" %(ip, port, METRICS_PATH))
+  return metrics_server
@@ -0,0 +1,84 @@
+#!/usr/bin/python
+
+import logging
+import threading
+
+try:
+  import Queue as queue
+except ImportError:
+  import queue
+
+from dataplane.batch import NetlinkBatch, MAX_BATCH_SIZE, SOCKET_BUFFER_SIZE
+from dataplane.timing import timed
+
+# Global variables definition
+
+# logger reference
+logger = logging.getLogger(__name__)
+# Default number of netlink sockets
+POOL_SIZE = 8
+
+class NetlinkPool(object):
+  """Pool of netlink sockets, each worker programs routes on its own socket"""
+
+  def __init__(self, idxs, size=POOL_SIZE, socket_buffer_size=SOCKET_BUFFER_SIZE,
+      max_batch_size=MAX_BATCH_SIZE):
+    # Cache of the resolved interfaces
+    self.idxs = idxs
+    self.size = size
+    self.socket_buffer_size = socket_buffer_size
+    self.max_batch_size = max_batch_size
+    # Idle sockets, they are opened on demand up to size
+    self.idle = queue.Queue()
+    self.opened = 0
+    # Requests waiting for a socket
+    self.waiting = 0
+    self.lock = threading.Lock()
+
+  def acquire(self):
+    # Take an idle socket if any
+    try:
+      return self.idle.get_nowait()
+    except queue.Empty:
+      pass
+    # Open a new one if the pool is not full
+    with self.lock:
+      if self.opened < self.size:
+        self.opened += 1
+        try:
+          return NetlinkBatch(self.idxs, self.max_batch_size, self.socket_buffer_size)
+        except:
+          # The socket could not be opened, the slot is free again
+          self.opened -= 1
+          raise
+    # Wait for a socket to be released
+    with self.lock:
+      self.waiting += 1
+    try:
+      return self.idle.get()
+    finally:
+      with self.lock:
+        self.waiting -= 1
+
+  def release(self, engine):
+    self.idle.put(engine)
+
+  def close(self):
+    while True:
+      try:
+        self.idle.get_nowait().close()
+      except queue.Empty:
+        return
+
+  def route(self, op, paths):
+    """Apply op to the paths and return one errno per path (0 means success)"""
+    return self.execute([(op, path) for path in paths])
+
+  def execute(self, operations):
+    """Apply a list of (op, path) on a socket of the pool"""
+    with timed("wait"):
+      engine = self.acquire()
+    try:
+      return engine.execute(operations)
+    finally:
+      self.release(engine)
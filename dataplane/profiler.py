@@ -0,0 +1,111 @@
+#!/usr/bin/python
+
+import collections
+import logging
+import os
+import signal
+import sys
+import tempfile
+import threading
+import time
+
+# Global variables definition
+
+# logger reference
+logger = logging.getLogger(__name__)
+# Default length of a profile in seconds
+PROFILE_SECONDS = 10
+# Max length of a profile in seconds
+MAX_PROFILE_SECONDS = 300
+# Seconds between two samples
+SAMPLE_INTERVAL = 0.005
+# Folder of the profiles requested with the signal
+PROFILE_DIR = tempfile.gettempdir()
+# Signal starting a profile
+PROFILE_SIGNAL = signal.SIGUSR2
+# A single profile at a time
+profiling = threading.Lock()
+
+class StackSampler(object):
+  """Samples the stacks of all the threads and counts them in the collapsed
+  format of the flamegraphs: thread;outer frame;...;inner frame count"""
+
+  def __init__(self, interval=SAMPLE_INTERVAL):
+    self.interval = interval
+    # Collapsed stack -> samples
+    self.stacks = collections.Counter()
+    # Code -> frame label
+    self.labels = {}
+    self.samples = 0
+
+  def get_label(self, code):
+    label = self.labels.get(code)
+    if label is None:
+      label = self.labels[code] = "%s (%s:%s)" %(code.co_name,
+        os.path.basename(code.co_filename), code.co_firstlineno)
+    return label
+
+  def sample(self):
+    own = threading.current_thread().ident
+    names = dict((thread.ident, thread.name) for thread in threading.enumerate())
+    for ident, frame in sys._current_frames().items():
+      # The sampler is not worth a flame
+      if ident == own:
+        continue
+      stack = []
+      while frame is not None:
+        stack.append(self.get_label(frame.f_code))
+        frame = frame.f_back
+      stack.append(names.get(ident, str(ident)))
+      self.stacks[";".join(reversed(stack))] += 1
+    self.samples += 1
+
+  def run(self, seconds):
+    deadline = time.time() + seconds
+    while time.time() < deadline:
+      self.sample()
+      time.sleep(self.interval)
+
+  def collapse(self):
+    return "".join("%s %s\n" %(stack, count) for stack, count in sorted(self.stacks.items()))
+
+# Sample all the threads for some seconds and return the collapsed stacks,
+# None if another profile is running
+def profile(seconds=PROFILE_SECONDS, interval=SAMPLE_INTERVAL):
+  if not profiling.acquire(False):
+    return None
+  try:
+    sampler = StackSampler(interval)
+    sampler.run(min(seconds, MAX_PROFILE_SECONDS))
+    logger.info("Profiled %s samples in %s seconds" %(sampler.samples, seconds))
+    return sampler.collapse()
+  finally:
+    profiling.release()
+
+# Profile in background and write the collapsed stacks in a new file of directory
+def profile_to_file(seconds=PROFILE_SECONDS, directory=PROFILE_DIR):
+  stacks = profile(seconds)
+  if stacks is None:
+    logger.warning("A profile is already running")
+    return None
+  filename = os.path.join(directory, "srv6-profile-%s-%s.txt" %(os.getpid(),
+    time.strftime("%Y%m%d-%H%M%S")))
+  with open(filename, "w") as f:
+    f.write(stacks)
+  logger.info("Profile written to %s" %filename)
+  return filename
+
+# Start a profile of seconds every time the process gets the signal, nothing
+# runs until then. Only the main thread can install it, return whether it did
+def enable_profiler_signal(seconds=PROFILE_SECONDS, directory=PROFILE_DIR,
+    signum=PROFILE_SIGNAL):
+  if not isinstance(threading.current_thread(), threading._MainThread):
+    logger.warning("Not in the main thread, the profile signal is not enabled")
+    return False
+  def handler(signum, frame):
+    # The signal handler returns at once
+    thread = threading.Thread(target=profile_to_file, args=(seconds, directory))
+    thread.daemon = True
+    thread.start()
+  signal.signal(signum, handler)
+  return True
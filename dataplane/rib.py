@@ -0,0 +1,324 @@
+#!/usr/bin/python
+
+import binascii
+import errno
+import logging
+import socket
+import sys
+import threading
+
+try:
+  from sys import intern
+except ImportError:
+  pass
+
+try:
+  STRING_TYPES = basestring
+except NameError:
+  STRING_TYPES = str
+
+from dataplane.timing import timed
+
+# Global variables definition
+
+# logger reference
+logger = logging.getLogger(__name__)
+# Number of locks protecting the table, requests on different stripes run in parallel
+LOCK_STRIPES = 64
+
+class MalformedPath(ValueError):
+  """Path without the fields required by its operation"""
+
+# Normalize a destination like the kernel does: compressed address, prefix
+# length and no host bits. Malformed destinations are kept, the engine rejects them
+def normalize_prefix(dst):
+  address, _, dst_len = dst.partition("/")
+  try:
+    dst_len = int(dst_len) if dst_len else 128
+    packed = socket.inet_pton(socket.AF_INET6, address)
+  except (socket.error, ValueError):
+    return dst if "/" in dst else dst + "/128"
+  # Clear the host bits, if any
+  if 0 <= dst_len < 128 and (dst_len & 7 or packed[dst_len >> 3:].strip(b"\0")):
+    value = int(binascii.hexlify(packed), 16) >> (128 - dst_len) << (128 - dst_len)
+    packed = binascii.unhexlify("%032x" %value)
+  return "%s/%s" %(socket.inet_ntop(socket.AF_INET6, packed), dst_len)
+
+# Build the key of a path: normalized destination and device
+def get_key(path):
+  try:
+    dst, dev = path['dst'], path['dev']
+  except (KeyError, TypeError):
+    raise MalformedPath("Path without destination or device")
+  if not isinstance(dst, STRING_TYPES) or not isinstance(dev, STRING_TYPES):
+    raise MalformedPath("Destination and device must be strings")
+  return (normalize_prefix(dst), intern(str(dev)))
+
+# Build the value of a path: encap mode and segments
+def get_value(path):
+  try:
+    encapmode, segs = path['encapmode'], path['segs']
+  except (KeyError, TypeError):
+    raise MalformedPath("Path without encap mode or segments")
+  if not isinstance(encapmode, STRING_TYPES) or not isinstance(segs, (list, tuple)):
+    raise MalformedPath("Encap mode must be a string and segments a list")
+  return (intern(str(encapmode)), tuple(segs))
+
+# Check that a path has the fields required by op, raise MalformedPath
+def check_path(op, path):
+  get_key(path)
+  if op != "del":
+    get_value(path)
+
+# Build a path back from key and value
+def get_path(key, value):
+  return {'dst':key[0], 'dev':key[1], 'encapmode':value[0], 'segs':list(value[1])}
+
+# Build an empty summary of the changes
+def get_summary():
+  return {"added":0, "replaced":0, "removed":0, "unchanged":0, "failed":0}
+
+class SRv6RIB(object):
+  """Table of the installed SRv6 routes keyed by (destination, device)"""
+
+  def __init__(self, engine, interfaces=None, installed=None):
+    # Engine programming the kernel
+    self.engine = engine
+    # Callable returning the routes installed in the kernel, used to seed the table
+    self.installed = installed
+    # Devices whose routes are managed, all of them if None
+    self.interfaces = None if interfaces is None else frozenset(interfaces)
+    # (destination, device) -> (encapmode, segments)
+    self.routes = {}
+    # Until the table is loaded with the routes of the kernel a route may
+    # be installed without being in the table
+    self.seeded = False
+    # Each key is protected by one of the stripes
+    self.stripes = [threading.Lock() for _ in range(LOCK_STRIPES)]
+
+  def __len__(self):
+    return len(self.routes)
+
+  def managed(self, key):
+    # Routes on the other devices are never touched
+    return self.interfaces is None or key[1] in self.interfaces
+
+  def lock(self, keys=None):
+    # Stripes are always taken in the same order, None takes them all
+    if keys is None:
+      stripes = range(LOCK_STRIPES)
+    else:
+      stripes = sorted(set(hash(key) % LOCK_STRIPES for key in keys))
+    with timed("lock"):
+      for stripe in stripes:
+        self.stripes[stripe].acquire()
+    return stripes
+
+  def unlock(self, stripes):
+    for stripe in stripes:
+      self.stripes[stripe].release()
+
+  def load(self, paths=None):
+    """Fill the table with the routes already installed in the kernel, read
+    with installed if paths is None"""
+    stripes = self.lock()
+    try:
+      self.load_locked(paths)
+    finally:
+      self.unlock(stripes)
+
+  def load_locked(self, paths=None):
+    # The whole table is held by the caller
+    if paths is None:
+      paths = self.installed()
+    for path in paths:
+      key = get_key(path)
+      if self.managed(key):
+        self.routes[key] = get_value(path)
+    self.seeded = True
+
+  def seed_locked(self):
+    # The removals of a sync or a replace need the routes installed before the start
+    if self.seeded:
+      return
+    if self.installed is not None:
+      try:
+        self.load_locked()
+        logger.info("Loaded %s installed routes" %len(self.routes))
+        return
+      except (OSError, socket.error) as e:
+        logger.error("Cannot load the installed routes: %s" %e)
+    logger.warning("Routes installed before the start are not known and are kept")
+
+  def route(self, op, paths):
+    """Apply op to the paths and return one errno per path (0 means success)"""
+    return self.apply([(op, path) for path in paths])
+
+  def apply(self, operations, summary=None, strict=False):
+    """Apply a list of (op, path), only the real changes reach the kernel.
+    With strict the results are the ones of ip: add fails with EEXIST on an
+    installed route, replace installs or changes it and del fails with ESRCH
+    on an absent route. A malformed path raises MalformedPath and nothing is
+    applied"""
+    with timed("validate"):
+      keys = [get_key(path) for _, path in operations]
+    stripes = self.lock(keys)
+    try:
+      return self.apply_locked(operations, keys, summary, strict)
+    finally:
+      self.unlock(stripes)
+
+  def apply_locked(self, operations, keys, summary=None, strict=False):
+    # The stripes of the keys are held by the caller
+    results = [0] * len(operations)
+    if summary is None:
+      summary = get_summary()
+    # Changes planned by this request shadow the table
+    planned = {}
+    # Changes for the engine with their index, key and value
+    changes = []
+    entries = []
+    with timed("validate"):
+      for index, (op, path) in enumerate(operations):
+        key = keys[index]
+        if not self.managed(key):
+          results[index] = errno.ENODEV
+          summary["failed"] += 1
+          continue
+        current = planned[key] if key in planned else self.routes.get(key)
+        if op == "del":
+          # Nothing to remove, without the routes of the kernel only the kernel knows
+          if current is None and (self.seeded or key in planned):
+            if strict:
+              results[index] = errno.ESRCH
+              summary["failed"] += 1
+            else:
+              summary["unchanged"] += 1
+            continue
+          value = None
+          changes.append(("del", path))
+        else:
+          if strict and op == "add" and current is not None:
+            results[index] = errno.EEXIST
+            summary["failed"] += 1
+            continue
+          value = get_value(path)
+          # Already installed
+          if current == value:
+            summary["unchanged"] += 1
+            continue
+          changes.append(("add" if current is None else "replace", path))
+        planned[key] = value
+        entries.append((index, key, value))
+    if not changes:
+      return results
+    with timed("driver"):
+      changes_results = self.engine.execute(changes)
+    # Routes installed behind our back are taken over with a replace,
+    # unless a strict add was asked
+    retry = [i for i, result in enumerate(changes_results)
+      if result == errno.EEXIST and changes[i][0] == "add" and
+      not (strict and operations[entries[i][0]][0] == "add")]
+    if retry:
+      with timed("driver"):
+        retry_results = self.engine.execute([("replace", changes[i][1]) for i in retry])
+      for i, result in zip(retry, retry_results):
+        changes[i] = ("replace", changes[i][1])
+        changes_results[i] = result
+    # Update the table with what the kernel accepted
+    for (index, key, value), (op, path), result in zip(entries, changes, changes_results):
+      if op == "del":
+        # Routes removed behind our back are gone anyway
+        if result == errno.ESRCH and not strict:
+          result = 0
+          # Nothing was installed
+          if key not in self.routes:
+            summary["unchanged"] += 1
+            continue
+        elif result == errno.ESRCH:
+          self.routes.pop(key, None)
+        if result == 0:
+          self.routes.pop(key, None)
+          summary["removed"] += 1
+      elif result == 0:
+        self.routes[key] = value
+        summary["added" if op == "add" else "replaced"] += 1
+      if result != 0:
+        summary["failed"] += 1
+      results[index] = result
+    return results
+
+  def transaction(self, operations, replace=False):
+    """Apply a list of (op, path) all or nothing: if any change fails the applied
+    ones are reverted. With replace the routes of the managed devices not in
+    operations are removed. A malformed path raises MalformedPath.
+    Return one errno per operation and the summary of the changes"""
+    summary = get_summary()
+    with timed("validate"):
+      keys = [get_key(path) for _, path in operations]
+    count = len(operations)
+    stripes = self.lock(None if replace else keys)
+    try:
+      if replace:
+        self.seed_locked()
+        desired = set(keys)
+        operations = list(operations)
+        for key in self.routes:
+          if key not in desired and self.managed(key):
+            operations.append(("del", {'dst':key[0], 'dev':key[1]}))
+            keys.append(key)
+      # What has to be restored on failure
+      previous = dict((key, self.routes.get(key)) for key in keys)
+      results = self.apply_locked(operations, keys, summary)
+      if summary["failed"]:
+        self.rollback(previous)
+        # Nothing has changed in the end
+        summary.update(added=0, replaced=0, removed=0)
+    finally:
+      self.unlock(stripes)
+    return results[:count], summary
+
+  def rollback(self, previous):
+    # Bring the keys back to their previous values, the stripes are held by the caller
+    operations = []
+    keys = []
+    for key, value in previous.items():
+      if self.routes.get(key) == value:
+        continue
+      if value is None:
+        operations.append(("del", {'dst':key[0], 'dev':key[1]}))
+      else:
+        operations.append(("add", get_path(key, value)))
+      keys.append(key)
+    if not operations:
+      return
+    summary = get_summary()
+    self.apply_locked(operations, keys, summary)
+    if summary["failed"]:
+      logger.error("Rollback failed for %s routes" %summary["failed"])
+    else:
+      logger.info("Rolled back %s routes" %len(operations))
+
+  def sync(self, paths):
+    """Make the installed routes of the managed devices match the paths with the
+    minimal set of changes, return one errno per path and the summary of the changes.
+    A malformed path raises MalformedPath and nothing is applied"""
+    summary = get_summary()
+    with timed("validate"):
+      keys = [get_key(path) for path in paths]
+    # The whole table is involved
+    stripes = self.lock()
+    try:
+      self.seed_locked()
+      # The paths are the complete desired state
+      desired = set(keys)
+      operations = [("add", path) for path in paths]
+      # Everything else has to go
+      for key in self.routes:
+        if key not in desired and self.managed(key):
+          operations.append(("del", {'dst':key[0], 'dev':key[1]}))
+          keys.append(key)
+      results = self.apply_locked(operations, keys, summary)
+    finally:
+      self.unlock(stripes)
+    return results[:len(paths)], summary
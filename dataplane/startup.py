@@ -0,0 +1,61 @@
+#!/usr/bin/python
+
+import logging
+import socket
+
+from dataplane.drivers import DRIVER, DRIVERS, get_driver
+from dataplane.dump import managed_routes
+from dataplane.logs import AuditLog, AuditedDriver
+from dataplane.metrics import MeteredDriver, start_metrics_server, watch_rib
+from dataplane.pool import POOL_SIZE
+from dataplane.profiler import enable_profiler_signal
+from dataplane.rib import SRv6RIB
+
+# Global variables definition
+
+# logger reference
+logger = logging.getLogger(__name__)
+# Interfaces whose routes are managed by default
+INTERFACES = ["eth0"]
+
+# Add the options of the dataplane shared by the servers, without the
+# number of workers if workers is None
+def add_dataplane_options(parser, workers=POOL_SIZE, driver=DRIVER, interfaces=INTERFACES):
+  if workers is not None:
+    parser.add_option("-w", "--workers", dest="workers", type="int", default=workers,
+                      help="Number of netlink sockets programming routes in parallel")
+  parser.add_option("-r", "--driver", dest="driver", type="choice", default=driver,
+                    choices=sorted(DRIVERS), help="Driver programming the routes: %s"
+                    %", ".join(sorted(DRIVERS)))
+  parser.add_option("-i", "--interfaces", dest="interfaces", default=",".join(interfaces),
+                    help="Comma separated list of the interfaces whose routes are managed")
+  parser.add_option("-p", "--metrics-port", dest="metrics_port", type="int",
+                    help="Serve the metrics in the Prometheus format on this local port")
+  parser.add_option("-a", "--audit", dest="audit",
+                    help="Write every applied route operation to this file as JSON lines")
+
+def start_dataplane(idxs, driver=DRIVER, workers=POOL_SIZE, metrics_port=None, audit_log=None,
+                    interfaces=INTERFACES):
+  """Load the interfaces and follow their changes, build the driver and the
+  table of the routes of the managed interfaces seeded with the routes already
+  in the kernel, serve the metrics if enabled and sample the stacks on SIGUSR2.
+  Return the driver and the table"""
+  idxs.start()
+  engine = MeteredDriver(get_driver(driver, idxs, workers), driver)
+  if audit_log is not None:
+    engine = AuditedDriver(engine, AuditLog(audit_log))
+  rib = SRv6RIB(engine, interfaces, lambda: managed_routes(idxs, interfaces))
+  # Without the routes of the kernel the removals cannot be answered from memory,
+  # a failed load is retried by the first sync
+  try:
+    rib.load()
+    logger.info("Loaded %s installed routes" %len(rib))
+  except (OSError, socket.error) as e:
+    logger.warning("Cannot load the installed routes, removals go to the kernel: %s" %e)
+  watch_rib(rib)
+  # Serve the metrics if enabled
+  if metrics_port is not None:
+    start_metrics_server(metrics_port)
+  # Sample the stacks of all the threads on SIGUSR2
+  enable_profiler_signal()
+  return engine, rib
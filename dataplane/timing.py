@@ -0,0 +1,97 @@
+#!/usr/bin/python
+
+import threading
+import time
+
+# Global variables definition
+
+# Timing of the request served by the current thread
+current = threading.local()
+
+class RequestTiming(object):
+  """Time spent by a request in each stage, the stages are reported by the
+  layers serving it on the same thread"""
+
+  def __init__(self):
+    self.start = time.time()
+    self.end = None
+    # Stages in order of appearance
+    self.stages = []
+    self.durations = {}
+
+  def add(self, stage, seconds):
+    if stage not in self.durations:
+      self.stages.append(stage)
+      self.durations[stage] = 0
+    self.durations[stage] += seconds
+
+  def extend(self, timing):
+    """Add the stages of another timing, like the one of a batch shared by
+    many requests"""
+    for stage in timing.stages:
+      self.add(stage, timing.durations[stage])
+
+  def get(self, stage):
+    return self.durations.get(stage, 0)
+
+  def total(self):
+    return (self.end or time.time()) - self.start
+
+  def format(self):
+    """Stages in milliseconds, in the syntax of the Server-Timing header"""
+    stages = ["%s;dur=%.3f" %(stage, self.durations[stage] * 1000) for stage in self.stages]
+    stages.append("total;dur=%.3f" %(self.total() * 1000))
+    return ", ".join(stages)
+
+class TimedStage(object):
+  """Adds the time spent in the block to a stage of the current request,
+  nothing is measured if the thread is not timing a request"""
+
+  def __init__(self, stage):
+    self.stage = stage
+
+  def __enter__(self):
+    self.timing = getattr(current, "timing", None)
+    if self.timing is not None:
+      self.start = time.time()
+
+  def __exit__(self, exc_type, exc_value, traceback):
+    if self.timing is not None:
+      self.timing.add(self.stage, time.time() - self.start)
+
+class TimedRequest(object):
+  """Times the request served by this thread in the block, the timing is
+  stopped even if the request fails"""
+
+  def __enter__(self):
+    return start_timing()
+
+  def __exit__(self, exc_type, exc_value, traceback):
+    stop_timing()
+
+# Start timing the request served by this thread
+def start_timing():
+  current.timing = RequestTiming()
+  return current.timing
+
+# Stop timing the request served by this thread and return its timing
+def stop_timing():
+  timing = getattr(current, "timing", None)
+  current.timing = None
+  if timing is not None:
+    timing.end = time.time()
+  return timing
+
+# Time the request served by this thread
+def timed_request():
+  return TimedRequest()
+
+# Measure a stage of the current request
+def timed(stage):
+  return TimedStage(stage)
+
+# Add the time spent in a stage measured by the caller
+def add_stage(stage, seconds):
+  timing = getattr(current, "timing", None)
+  if timing is not None:
+    timing.add(stage, seconds)
@@ -0,0 +1,276 @@
+#!/usr/bin/python3
+
+from concurrent import futures
+from optparse import OptionParser
+
+import asyncio
+import logging
+import time
+import grpc
+
+import srv6_explicit_path_pb2_grpc
+import grpc_server
+
+from grpc_server import SRv6ExplicitPathHandler, OP, idxs
+from dataplane.metrics import RequestMetrics, watch_queue
+from dataplane.logs import setup_logging
+from dataplane.startup import add_dataplane_options, start_dataplane
+from dataplane.timing import RequestTiming, timed_request
+
+# Global variables definition
+
+# Server reference
+grpc_aio_server = None
+# Netlink writer
+netlink_writer = None
+# logger reference
+logger = logging.getLogger(__name__)
+# Max number of RPCs served concurrently
+MAX_CONCURRENT_RPCS = 10000
+# Max number of paths coalesced in a single batch
+MAX_COALESCED_PATHS = 10000
+# Debug option
+SERVER_DEBUG = False
+# Secure option
+SECURE = False
+# Driver programming the routes
+DRIVER = "batch"
+# Interfaces whose routes are managed
+INTERFACES = ["eth0"]
+# Port of the metrics endpoint, disabled if None
+METRICS_PORT = None
+# Audit log of the applied route operations, disabled if None
+AUDIT_LOG = None
+
+# Run fn timing it as a request, return its result and its timing
+def run_timed(fn, *args):
+  with timed_request() as timing:
+    return fn(*args), timing
+
+class NetlinkWriter(object):
+  """Runs the netlink work of all the RPCs on a dedicated thread. Each request
+  gets the time it waited in the queue and the stages of its batch"""
+
+  def __init__(self, engine):
+    self.engine = engine
+    self.queue = asyncio.Queue()
+    # A single thread talks with the kernel
+    self.executor = futures.ThreadPoolExecutor(max_workers=1)
+
+  async def route(self, op, paths, timing=None):
+    # Enqueue the work and wait for the per-path results
+    future = asyncio.get_event_loop().create_future()
+    self.queue.put_nowait((op, paths, future, timing, time.time()))
+    return await future
+
+  async def sync(self, paths, timing=None):
+    # Enqueue the work and wait for the per-path results and the summary
+    return await self.route("sync", paths, timing)
+
+  def add_timing(self, requests, start, batch_timing):
+    # Each request waited until the start of the batch and shares its stages
+    for _, _, _, timing, enqueued in requests:
+      if timing is not None:
+        timing.add("queue", start - enqueued)
+        timing.extend(batch_timing)
+
+  async def run(self):
+    loop = asyncio.get_event_loop()
+    while True:
+      # Wait for work and drain what has been queued meanwhile
+      requests = [await self.queue.get()]
+      while not self.queue.empty():
+        requests.append(self.queue.get_nowait())
+      # Consecutive requests with the same operation share a batch
+      start = 0
+      while start < len(requests):
+        op = requests[start][0]
+        # Syncs work on the whole table, they are never merged
+        if op == "sync":
+          _, paths, future, _, _ = requests[start]
+          batch_start = time.time()
+          try:
+            result, batch_timing = await loop.run_in_executor(self.executor, run_timed,
+              self.engine.sync, paths)
+          except Exception as e:
+            logger.exception("sync failed")
+            if not future.done():
+              future.set_exception(e)
+          else:
+            self.add_timing(requests[start:start + 1], batch_start, batch_timing)
+            if not future.done():
+              future.set_result(result)
+          start = start + 1
+          continue
+        end = start
+        paths = []
+        while (end < len(requests) and requests[end][0] == op and
+            (end == start or len(paths) + len(requests[end][1]) <= MAX_COALESCED_PATHS)):
+          paths.extend(requests[end][1])
+          end = end + 1
+        batch_start = time.time()
+        try:
+          results, batch_timing = await loop.run_in_executor(self.executor, run_timed,
+            self.engine.route, op, paths)
+        except Exception as e:
+          logger.exception("%s failed", op)
+          for _, _, future, _, _ in requests[start:end]:
+            if not future.done():
+              future.set_exception(e)
+        else:
+          self.add_timing(requests[start:end], batch_start, batch_timing)
+          # Give back to each request its own results
+          offset = 0
+          for _, request_paths, future, _, _ in requests[start:end]:
+            if not future.done():
+              future.set_result(results[offset:offset + len(request_paths)])
+            offset = offset + len(request_paths)
+        start = end
+
+class SRv6ExplicitPathAioHandler(SRv6ExplicitPathHandler):
+  """asyncio gRPC request handler"""
+
+  def get_paths_timed(self, grpc_paths, timing):
+    # The timing of the requests cannot follow the coroutines, each stage is added by hand
+    start = time.time()
+    paths = self.get_paths(grpc_paths)
+    timing.add("decode", time.time() - start)
+    return paths
+
+  async def Execute(self, op, request, context):
+    timing = RequestTiming()
+    with RequestMetrics("grpc", op, len(request.path)) as request_metrics:
+      logger.debug("%s received: %s paths", op, len(request.path))
+      paths = self.get_paths_timed(request.path, timing)
+      # Let's push the routes through the writer
+      results = await netlink_writer.route(op, paths, timing)
+      # and create the response
+      reply = self.get_reply(op, paths, results)
+      request_metrics.failed = reply.message != "OK"
+    self.send_timing(context, timing)
+    return reply
+
+  async def Create(self, request, context):
+    # Handle Create operation
+    return await self.Execute("add", request, context)
+
+  async def Remove(self, request, context):
+    # Handle Remove operation
+    return await self.Execute("del", request, context)
+
+  async def Sync(self, request, context):
+    # Handle Sync operation
+    timing = RequestTiming()
+    with RequestMetrics("grpc", "sync", len(request.path)) as request_metrics:
+      logger.debug("sync received: %s paths", len(request.path))
+      paths = self.get_paths_timed(request.path, timing)
+      # Let's reconcile the installed routes through the writer
+      results, summary = await netlink_writer.sync(paths, timing)
+      logger.info("sync: %s", summary)
+      # and create the response
+      reply = self.get_sync_reply(paths, results, summary)
+      request_metrics.failed = reply.message != "OK"
+    self.send_timing(context, timing)
+    return reply
+
+  async def List(self, request, context):
+    # Handle List operation: the dump runs on the default executor
+    logger.debug("list received:\n%s", request)
+    # The whole stream is measured and timed as a request
+    timing = RequestTiming()
+    with RequestMetrics("grpc", "list") as request_metrics:
+      pages = self.get_list_pages(request, context)
+      if pages is None:
+        await context.abort(grpc.StatusCode.INVALID_ARGUMENT, "Invalid prefix %s" %request.prefix)
+      loop = asyncio.get_event_loop()
+      while True:
+        start = time.time()
+        page = await loop.run_in_executor(None, next, pages, None)
+        timing.add("dump", time.time() - start)
+        if page is None:
+          break
+        request_metrics.paths += len(page)
+        start = time.time()
+        reply = self.get_list_reply(page)
+        timing.add("encode", time.time() - start)
+        yield reply
+    self.send_timing(context, timing)
+
+  async def Push(self, request_iterator, context):
+    # Handle Push operation, the whole stream is timed as a request
+    timing = RequestTiming()
+    async for chunk in request_iterator:
+      logger.debug("chunk %s received: %s paths", chunk.sequence, len(chunk.path))
+      op = OP.get(chunk.operation)
+      if op is None:
+        yield self.get_unknown_op_reply(chunk)
+        continue
+      # Each chunk is measured as a request
+      with RequestMetrics("grpc", op, len(chunk.path)) as request_metrics:
+        paths = self.get_paths_timed(chunk.path, timing)
+        # Let's push the routes through the writer
+        results = await netlink_writer.route(op, paths, timing)
+        # and acknowledge the chunk
+        reply = self.get_chunk_reply(chunk, op, paths, results)
+        request_metrics.failed = reply.failed > 0
+      yield reply
+    self.send_timing(context, timing)
+
+# Run asyncio gRPC server
+async def serve():
+  # Configure gRPC server listener and netlink writer
+  global grpc_aio_server, netlink_writer
+  # Create the server and add the handler
+  grpc_aio_server = grpc.aio.server(maximum_concurrent_rpcs=MAX_CONCURRENT_RPCS)
+  srv6_explicit_path_pb2_grpc.add_SRv6ExplicitPathServicer_to_server(
+    SRv6ExplicitPathAioHandler(), grpc_aio_server)
+  grpc_server.add_endpoint(grpc_aio_server, SECURE)
+  # Setup the writer on top of the table of the installed routes, a single
+  # thread talks with the kernel
+  _, srv6_rib = start_dataplane(idxs, DRIVER, 1, METRICS_PORT, AUDIT_LOG, INTERFACES)
+  netlink_writer = NetlinkWriter(srv6_rib)
+  # Work waiting for the writer
+  watch_queue("grpc", netlink_writer.queue.qsize)
+  writer = asyncio.ensure_future(netlink_writer.run())
+  # Start the loop for gRPC
+  logger.info("Listening gRPC (asyncio)")
+  await grpc_aio_server.start()
+  try:
+    await grpc_aio_server.wait_for_termination()
+  finally:
+    writer.cancel()
+
+# Start asyncio gRPC server
+def start_server():
+  # Run the loop for gRPC
+  asyncio.run(serve())
+
+# Parse options
+def parse_options():
+  global SECURE, MAX_CONCURRENT_RPCS, DRIVER, INTERFACES, METRICS_PORT, AUDIT_LOG
+  parser = OptionParser()
+  parser.add_option("-d", "--debug", action="store_true", help="Activate debug logs")
+  parser.add_option("-s", "--secure", action="store_true", help="Activate secure mode")
+  parser.add_option("-m", "--max-rpcs", dest="max_rpcs", type="int",
+    default=MAX_CONCURRENT_RPCS, help="Max number of concurrent RPCs")
+  add_dataplane_options(parser, None, DRIVER, INTERFACES)
+  # Parse input parameters
+  (options, args) = parser.parse_args()
+  # Setup properly the logger
+  if options.debug:
+    setup_logging(logging.DEBUG)
+  else:
+    setup_logging(logging.INFO)
+  # Setup properly the secure mode
+  SECURE = bool(options.secure)
+  MAX_CONCURRENT_RPCS = options.max_rpcs
+  DRIVER = options.driver
+  INTERFACES = options.interfaces.split(",")
+  METRICS_PORT = options.metrics_port
+  AUDIT_LOG = options.audit
+  SERVER_DEBUG = logger.getEffectiveLevel() == logging.DEBUG
+  logger.info("SERVER_DEBUG:" + str(SERVER_DEBUG))
+
+if __name__ == "__main__":
+  parse_options()
+  start_server()
@@ -25,6 +25,35 @@ def get_grpc_session(ip_address, port, secure):
     channel = grpc.insecure_channel("%s:%s" %(ip_address, port))
   return srv6_explicit_path_pb2_grpc.SRv6ExplicitPathStub(channel), channel
 
+# Build the chunks of a bulk push, only one chunk at a time is kept in memory
+def generate_chunks(operation, json_paths, chunk_size):
+  chunk = None
+  sequence = 0
+  for jpath in json_paths:
+    if chunk is None:
+      chunk = srv6_explicit_path_pb2.SRv6EPChunk(operation=operation, sequence=sequence)
+    path = chunk.path.add()
+    path.destination = jpath['destination']
+    path.device = jpath['device']
+    path.encapmode = jpath['encapmode']
+    for segment in jpath['segments']:
+      srv6_segment = path.sr_path.add()
+      srv6_segment.segment = segment
+    # The chunk is full, let's send it
+    if len(chunk.path) == chunk_size:
+      yield chunk
+      chunk = None
+      sequence = sequence + 1
+  # Send the last chunk if any
+  if chunk is not None:
+    yield chunk
+
+# Generate a set of paths for the bulk push
+def generate_paths(count):
+  for i in range(count):
+    yield {"device": "eth0", "destination": "4444:%x::2/128" %i, "encapmode": "encap",
+      "segments": ["4444:3::2", "4444:2::2"]}
+
 # Get the reference of the stub
 srv6_stub,channel = get_grpc_session("localhost", 12345, SECURE)
 # Create message request
@@ -125,3 +154,12 @@ for data in json_data:
     response = srv6_stub.Remove(path_request)
     print response
     channel.close()
+
+# Bulk add through the streaming API
+srv6_stub,channel = get_grpc_session("localhost", 12345, SECURE)
+for response in srv6_stub.Push(generate_chunks("create", generate_paths(1000), 100)):
+  print response
+# Bulk remove through the streaming API
+for response in srv6_stub.Push(generate_chunks("remove", generate_paths(1000), 100)):
+  print response
+channel.close()
@@ -2,7 +2,6 @@
 
 from concurrent import futures
 from optparse import OptionParser
-from pyroute2 import IPRoute
 from google.protobuf import json_format
 
 
@@ -10,19 +9,33 @@ import logging
 import time
 import json
 import grpc
+import os
+import sys
+import socket
 
 import srv6_explicit_path_pb2_grpc
 import srv6_explicit_path_pb2
 
+# Shared modules live in the root of the project
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from dataplane.batch import format_errors
+from dataplane.metrics import RequestMetrics, watch_queue
+from dataplane.logs import setup_logging
+from dataplane.links import InterfaceCache
+from dataplane.startup import add_dataplane_options, start_dataplane
+from dataplane.timing import timed_request, timed
+from dataplane.dump import dump_routes, paginate, parse_prefix, PAGE_SIZE
+
 # Global variables definition
 
 # Server reference
 grpc_server = None
-# Netlink socket
-ip_route = None
+# Pool of netlink sockets
+netlink_pool = None
+# Table of the installed routes
+srv6_rib = None
 # Cache of the resolved interfaces
-interfaces = ['eth0']
-idxs = {}
+idxs = InterfaceCache()
 # logger reference
 logger = logging.getLogger(__name__)
 # Server ip and port
@@ -30,29 +43,119 @@ GRPC_IP = "::"
 GRPC_PORT = 12345
 # Debug option
 SERVER_DEBUG = False
+# Number of workers programming routes in parallel
+WORKERS = 8
+# Number of threads serving the RPCs, a Push or a List holds one for the whole stream
+THREADS = 64
+# Driver programming the routes
+DRIVER = "batch"
+# Interfaces whose routes are managed
+INTERFACES = ["eth0"]
+# Port of the metrics endpoint, disabled if None
+METRICS_PORT = None
+# Audit log of the applied route operations, disabled if None
+AUDIT_LOG = None
 # Secure option
 SECURE = False
 # Server certificate
 CERTIFICATE = "cert_server.pem"
 # Server key
 KEY = "key_server.pem"
+# Trailing metadata carrying the time spent in each stage of a request
+TIMING_METADATA = "server-timing"
+# SRv6 mapping
+OP = {
+  "create":"add",
+  "remove":"del"
+}
 
 class SRv6ExplicitPathHandler(srv6_explicit_path_pb2_grpc.SRv6ExplicitPathServicer):
   """gRPC request handler"""
 
-  def Execute(self, op, request, context):
-    logger.debug("config received:\n%s", request)
-    # Let's push the routes
-    for path in request.path:
+  def get_paths(self, request_paths):
+    # Rebuild the paths
+    paths = []
+    for path in request_paths:
       # Rebuild segments
       segments = []
       for srv6_segment in path.sr_path:
         segments.append(srv6_segment.segment)
-      ip_route.route(op, dst=path.destination, oif=idxs[path.device],
-        encap={'type':'seg6', 'mode':path.encapmode, 'segs':segments})
-    # and create the response
+      paths.append({'dst':path.destination, 'dev':path.device,
+        'encapmode':path.encapmode, 'segs':segments})
+    return paths
+
+  def get_reply(self, op, paths, results):
+    # Build the response from the per-path results
+    errors = format_errors(paths, results)
+    if errors:
+      logger.error("%s failed: %s", op, errors)
+      return srv6_explicit_path_pb2.SRv6EPReply(message=errors)
     return srv6_explicit_path_pb2.SRv6EPReply(message="OK")
 
+  def get_chunk_reply(self, chunk, op, paths, results):
+    # Build the chunk acknowledgement from the per-path results
+    errors = format_errors(paths, results)
+    if errors:
+      logger.error("%s failed: %s", op, errors)
+      return srv6_explicit_path_pb2.SRv6EPChunkReply(sequence=chunk.sequence,
+        message=errors, failed=len(results) - results.count(0))
+    return srv6_explicit_path_pb2.SRv6EPChunkReply(sequence=chunk.sequence,
+      message="OK", failed=0)
+
+  def get_sync_reply(self, paths, results, summary):
+    # Build the sync response from the per-path results and the summary
+    errors = format_errors(paths, results, summary)
+    if errors:
+      logger.error("sync failed: %s", errors)
+    return srv6_explicit_path_pb2.SRv6SyncReply(message=errors or "OK", **summary)
+
+  def send_timing(self, context, timing):
+    # The breakdown of the request goes back as trailing metadata
+    context.set_trailing_metadata(((TIMING_METADATA, timing.format()),))
+
+  def get_list_pages(self, request, context):
+    # Build the pages of the installed paths matching the filters
+    prefix = request.prefix or None
+    if prefix is not None:
+      try:
+        parse_prefix(prefix)
+      except (socket.error, ValueError):
+        return None
+    paths = dump_routes(idxs, request.device or None, prefix, request.encapmode or None)
+    return paginate(paths, request.page_size or PAGE_SIZE)
+
+  def get_list_reply(self, page):
+    # Build a page of the List response
+    reply = srv6_explicit_path_pb2.SRv6ListReply()
+    for path in page:
+      reply_path = reply.path.add()
+      reply_path.destination = path['dst']
+      reply_path.device = path['dev']
+      reply_path.encapmode = path['encapmode']
+      for segment in path['segs']:
+        srv6_segment = reply_path.sr_path.add()
+        srv6_segment.segment = segment
+    return reply
+
+  def get_unknown_op_reply(self, chunk):
+    # The whole chunk is rejected
+    return srv6_explicit_path_pb2.SRv6EPChunkReply(sequence=chunk.sequence,
+      message="Unknown operation %s" %chunk.operation, failed=len(chunk.path))
+
+  def Execute(self, op, request, context):
+    with RequestMetrics("grpc", op, len(request.path)) as request_metrics, \
+        timed_request() as timing:
+      logger.debug("%s received: %s paths", op, len(request.path))
+      with timed("decode"):
+        paths = self.get_paths(request.path)
+      # Let's push the routes in batch
+      results = srv6_rib.route(op, paths)
+      # and create the response
+      reply = self.get_reply(op, paths, results)
+      request_metrics.failed = reply.message != "OK"
+      self.send_timing(context, timing)
+    return reply
+
   def Create(self, request, context):
     # Handle Create operation 
     return self.Execute("add", request, context)
@@ -62,40 +165,103 @@ class SRv6ExplicitPathHandler(srv6_explicit_path_pb2_grpc.SRv6ExplicitPathServic
     # Handle Remove operation 
     return self.Execute("del", request, context)
 
+  def Sync(self, request, context):
+    # Handle Sync operation
+    with RequestMetrics("grpc", "sync", len(request.path)) as request_metrics, \
+        timed_request() as timing:
+      logger.debug("sync received: %s paths", len(request.path))
+      with timed("decode"):
+        paths = self.get_paths(request.path)
+      # Let's reconcile the installed routes
+      results, summary = srv6_rib.sync(paths)
+      logger.info("sync: %s", summary)
+      # and create the response
+      reply = self.get_sync_reply(paths, results, summary)
+      request_metrics.failed = reply.message != "OK"
+      self.send_timing(context, timing)
+    return reply
+
+  def List(self, request, context):
+    # Handle List operation: the routes are read from the kernel
+    # and streamed one page at a time
+    logger.debug("list received:\n%s", request)
+    # The whole stream is measured and timed as a request
+    with RequestMetrics("grpc", "list") as request_metrics, \
+        timed_request() as timing:
+      pages = self.get_list_pages(request, context)
+      if pages is None:
+        context.abort(grpc.StatusCode.INVALID_ARGUMENT, "Invalid prefix %s" %request.prefix)
+      while True:
+        with timed("dump"):
+          page = next(pages, None)
+        if page is None:
+          break
+        request_metrics.paths += len(page)
+        with timed("encode"):
+          reply = self.get_list_reply(page)
+        yield reply
+      self.send_timing(context, timing)
+
+  def Push(self, request_iterator, context):
+    # Handle Push operation: chunks are programmed one at a time while
+    # the following ones are still in flight, gRPC flow control bounds
+    # the amount of data buffered on both ends. The whole stream is timed
+    # as a request
+    with timed_request() as timing:
+      for chunk in request_iterator:
+        logger.debug("chunk %s received: %s paths", chunk.sequence, len(chunk.path))
+        op = OP.get(chunk.operation)
+        if op is None:
+          yield self.get_unknown_op_reply(chunk)
+          continue
+        # Each chunk is measured as a request
+        with RequestMetrics("grpc", op, len(chunk.path)) as request_metrics:
+          with timed("decode"):
+            paths = self.get_paths(chunk.path)
+          # Let's push the routes in batch
+          results = srv6_rib.route(op, paths)
+          # and acknowledge the chunk
+          reply = self.get_chunk_reply(chunk, op, paths, results)
+          request_metrics.failed = reply.failed > 0
+        yield reply
+      self.send_timing(context, timing)
+
+# Add the listening endpoint to the server
+def add_endpoint(server, secure):
+  # If secure we need to create a secure endpoint
+  if secure:
+    # Read key and certificate
+    with open(KEY) as f:
+      key = f.read()
+    with open(CERTIFICATE) as f:
+      certificate = f.read()
+    # Create server ssl credentials
+    grpc_server_credentials = grpc.ssl_server_credentials(((key, certificate,),))
+    # Create a secure endpoint
+    server.add_secure_port("[%s]:%s" %(GRPC_IP, GRPC_PORT), grpc_server_credentials)
+  else:
+    # Create an insecure endpoint
+    server.add_insecure_port("[%s]:%s" %(GRPC_IP, GRPC_PORT))
+
 # Start gRPC server
 def start_server():
-  # Configure gRPC server listener and ip route
-  global grpc_server, ip_route
+  # Configure gRPC server listener and netlink
+  global grpc_server, netlink_pool, srv6_rib
   # Setup gRPC server
   if grpc_server is not None:
     logger.error("gRPC Server is already up and running")
   else:
     # Create the server and add the handler
-    grpc_server = grpc.server(futures.ThreadPoolExecutor())
+    executor = futures.ThreadPoolExecutor(max_workers=THREADS)
+    grpc_server = grpc.server(executor)
+    # RPCs waiting for a thread
+    watch_queue("grpc", executor._work_queue.qsize)
     srv6_explicit_path_pb2_grpc.add_SRv6ExplicitPathServicer_to_server(SRv6ExplicitPathHandler(),
                                                                         grpc_server)
-    # If secure we need to create a secure endpoint
-    if SECURE:
-      # Read key and certificate
-      with open(KEY) as f:
-        key = f.read()
-      with open(CERTIFICATE) as f:
-        certificate = f.read()
-      # Create server ssl credentials
-      grpc_server_credentials = grpc.ssl_server_credentials(((key, certificate,),))
-      # Create a secure endpoint
-      grpc_server.add_secure_port("[%s]:%s" %(GRPC_IP, GRPC_PORT), grpc_server_credentials)
-    else:
-      # Create an insecure endpoint
-      grpc_server.add_insecure_port("[%s]:%s" %(GRPC_IP, GRPC_PORT))
-  # Setup ip route
-  if ip_route is not None:
-    logger.error("IP Route is already setup")
-  else:
-    ip_route = IPRoute()
-  # Resolve the interfaces
-  for interface in interfaces:
-    idxs[interface] = ip_route.link_lookup(ifname=interface)[0]
+    add_endpoint(grpc_server, SECURE)
+  # Setup the interfaces, the driver programming the routes and the table of the installed routes
+  netlink_pool, srv6_rib = start_dataplane(idxs, DRIVER, WORKERS, METRICS_PORT, AUDIT_LOG,
+    INTERFACES)
   # Start the loop for gRPC
   logger.info("Listening gRPC")
   grpc_server.start()
@@ -104,17 +270,27 @@ def start_server():
 
 # Parse options
 def parse_options():
-  global SECURE
+  global SECURE, WORKERS, THREADS, DRIVER, INTERFACES, METRICS_PORT, AUDIT_LOG
   parser = OptionParser()
   parser.add_option("-d", "--debug", action="store_true", help="Activate debug logs")
+  add_dataplane_options(parser, WORKERS, DRIVER, INTERFACES)
+  parser.add_option("-t", "--threads", dest="threads", type="int", default=THREADS,
+                    help="Number of threads serving the RPCs")
   parser.add_option("-s", "--secure", action="store_true", help="Activate secure mode")
   # Parse input parameters
   (options, args) = parser.parse_args()
+  # Setup the number of workers
+  WORKERS = options.workers
+  THREADS = options.threads
+  DRIVER = options.driver
+  INTERFACES = options.interfaces.split(",")
+  METRICS_PORT = options.metrics_port
+  AUDIT_LOG = options.audit
   # Setup properly the logger
   if options.debug:
-    logging.basicConfig(level=logging.DEBUG)
+    setup_logging(logging.DEBUG)
   else:
-    logging.basicConfig(level=logging.INFO)
+    setup_logging(logging.INFO)
   # Setup properly the secure mode
   if options.secure:
     SECURE = True
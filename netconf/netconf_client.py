@@ -172,3 +172,32 @@ for config in configs:
   result = session.send_rpc(config)
   print format(etree.tostring(result[0], pretty_print=True))
   close_netconf_session(session)
+
+# Many small edits on the candidate datastore cost a single kernel pass at the commit
+config = """
+<edit-config>
+<target>
+  <candidate/>
+</target>
+<config xmlns="urn:ietf:params:xml:ns:netconf:base:1.0">
+  <srv6-explicit-path operation="%s" xmlns="urn:ietf:params:xml:ns:yang:srv6-explicit-path">
+      <path>
+          <destination>4444:%x::2/128</destination>
+          <sr-path>
+              <srv6-segment>4444:3::2</srv6-segment>
+          </sr-path>
+          <encapmode>encap</encapmode>
+          <device>eth0</device>
+      </path>
+    </srv6-explicit-path>
+</config>
+</edit-config>
+"""
+session = NetconfSSHSession("127.0.0.1", 830, "srv6", "srv6")
+for operation in ["create", "remove"]:
+  for i in range(100):
+    session.send_rpc(config %(operation, i))
+  # Nothing is installed until the commit, on failure nothing is applied
+  result = session.send_rpc("<commit/>")
+  print format(etree.tostring(result[0], pretty_print=True))
+close_netconf_session(session)
@@ -1,27 +1,46 @@
 #!/usr/bin/python
 
-from netconf import server, util, nsmap_add
+from netconf import server, util, nsmap_add, error
 from optparse import OptionParser
-from pyroute2 import IPRoute
 
 try:
     from lxml import etree
+    from lxml.etree import XMLSyntaxError
 except ImportError:
     from xml.etree import ElementTree as etree
+    from xml.etree.ElementTree import ParseError as XMLSyntaxError
 
 import logging
 import time
 import json
+import io
+import os
+import sys
+import socket
+
+# Shared modules live in the root of the project
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from dataplane.batch import format_errors
+from dataplane.metrics import RequestMetrics
+from dataplane.logs import setup_logging
+from dataplane.links import InterfaceCache
+from dataplane.startup import add_dataplane_options, start_dataplane
+from dataplane.timing import timed_request, timed
+from dataplane.candidate import SRv6Candidate
+from dataplane.dump import dump_routes, parse_prefix, filter_paths
 
 # Global variables definition
 
 # Server reference
 netconf_server = None
-# Netlink socket
-ip_route = None
+# Pool of netlink sockets
+netlink_pool = None
+# Table of the installed routes
+srv6_rib = None
+# Candidate datastore
+srv6_candidate = None
 # Cache of the resolved interfaces
-interfaces = ['eth0']
-idxs = {}
+idxs = InterfaceCache()
 # logger reference
 logger = logging.getLogger(__name__)
 # Server port, user and password
@@ -30,6 +49,20 @@ NC_USER = 'srv6'
 NC_PASSWORD = 'srv6'
 # Debug option
 SERVER_DEBUG = False
+# Number of workers programming routes in parallel
+WORKERS = 8
+# Driver programming the routes
+DRIVER = "batch"
+# Interfaces whose routes are managed
+INTERFACES = ["eth0"]
+# Port of the metrics endpoint, disabled if None
+METRICS_PORT = None
+# Audit log of the applied route operations, disabled if None
+AUDIT_LOG = None
+# Parse the edit-configs incrementally instead of building the whole tree
+INCREMENTAL = True
+# Attribute of the ok carrying the time spent in each stage of a request
+TIMING_ATTRIBUTE = "timing"
 # Namespace mapping
 NS = {
   "nc":"urn:ietf:params:xml:ns:netconf:base:1.0",
@@ -39,12 +72,26 @@ NS = {
 OP = {
   "create":"add",
   "remove":"del",
+  "replace":"sync",
   "destination":"dst",
   "device":"dev",
   "encapmode":"encapmode",
   "segments":"segs"
 }
 
+# Tags from the rpc down to the srv6-explicit-path of an edit-config
+SRV6_EP_TAGS = ["{%s}rpc" %NS["nc"], "{%s}edit-config" %NS["nc"], "{%s}config" %NS["nc"],
+  "{%s}srv6-explicit-path" %NS["srv6"]]
+RPC_TAG = SRV6_EP_TAGS[0]
+PATH_TAG = "{%s}path" %NS["srv6"]
+
+# SRv6 get-config filters
+FILTERS = {
+  "device":"device",
+  "destination":"prefix",
+  "encapmode":"encapmode"
+}
+
 # Yang utilities class
 class YangUtils:
   """ Class containing utilities method for Yang processing """
@@ -66,6 +113,10 @@ class YangUtils:
         <device>eth0</device>
     </path>
   </srv6-explicit-path>
+
+  With operation="replace" the paths are the complete desired state:
+  the missing ones are installed, the changed ones replaced and all
+  the others removed
   """
 
   @staticmethod
@@ -103,12 +154,35 @@ class YangUtils:
     # Not found
     raise Exception("No operation found in netconf data")
 
+  @staticmethod
+  def get_srv6_ep_op_or_error(rpc, netconf_data):
+    # Unknown or missing operations are reported back to the client
+    try:
+      return OP[YangUtils.get_srv6_ep_op(netconf_data)]
+    except Exception as e:
+      raise error.RPCSvrException(rpc, e)
+
+  @staticmethod
+  def get_edit_config_options(edit_config):
+    # Target datastore and error option of the edit-config
+    target = "running"
+    target_elm = edit_config.find("nc:target", NS)
+    if target_elm is not None and len(target_elm) > 0:
+      target = YangUtils.remove_urn(target_elm[0].tag)
+    error_option = edit_config.findtext("nc:error-option", "stop-on-error", NS).strip()
+    return target, error_option
+
   @staticmethod
   def is_srv6_ep(rpc):
     #Locate object
     netconf_data = rpc.find("nc:edit-config/nc:config/srv6:srv6-explicit-path/", NS)
     return netconf_data is not None
 
+  @staticmethod
+  def is_srv6_ep_msg(msg):
+    # Cheap check on the raw message, before any parsing
+    return "edit-config" in msg and NS["srv6"] in msg
+
   @staticmethod
   def get_srv6_ep(rpc):
     # Init steps
@@ -126,13 +200,239 @@ class YangUtils:
     msg['paths'] = paths
     return msg
 
+  """
+  SRv6 explicit path get-config filter example, the destination is
+  used as prefix and matches all the destinations within it
+
+  <filter type="subtree">
+    <srv6-explicit-path xmlns="urn:ietf:params:xml:ns:yang:srv6-explicit-path">
+      <path>
+        <destination>2222::/16</destination>
+        <device>eth0</device>
+      </path>
+    </srv6-explicit-path>
+  </filter>
+  """
+
+  @staticmethod
+  def get_srv6_filters(filter_elm):
+    # Init steps
+    filters = {}
+    if filter_elm is None:
+      return filters
+    # Get the leaves of the path used as filters
+    netconf_path = filter_elm.find("srv6:srv6-explicit-path/srv6:path", NS)
+    if netconf_path is None:
+      return filters
+    for elem in netconf_path:
+      tag = YangUtils.remove_urn(elem.tag)
+      if tag in FILTERS and elem.text and elem.text.strip():
+        filters[FILTERS[tag]] = elem.text.strip()
+    return filters
+
+  @staticmethod
+  def get_netconf_p(parent, path):
+    # Translate a path back into the Yang model
+    netconf_path = etree.SubElement(parent, "{%s}path" %NS["srv6"])
+    etree.SubElement(netconf_path, "{%s}destination" %NS["srv6"]).text = path['dst']
+    sr_path = etree.SubElement(netconf_path, "{%s}sr-path" %NS["srv6"])
+    for segment in path['segs']:
+      etree.SubElement(sr_path, "{%s}srv6-segment" %NS["srv6"]).text = segment
+    etree.SubElement(netconf_path, "{%s}encapmode" %NS["srv6"]).text = path['encapmode']
+    etree.SubElement(netconf_path, "{%s}device" %NS["srv6"]).text = path['dev']
+    return netconf_path
+
+# Build the reply of an edit-config, the failures become an rpc-error
+def get_edit_config_reply(rpc, operation, errors, summary):
+  if errors:
+    logger.error("%s failed: %s", operation, errors)
+    raise error.RPCServerError(rpc, error.RPCERR_TYPE_APPLICATION,
+      error.RPCERR_TAG_OPERATION_FAILED, message=errors)
+  # The summary of a sync is reported as attributes of the reply
+  reply = etree.Element("ok")
+  for k, v in summary.items():
+    reply.set(k, str(v))
+  return reply
+
+# Edits are refused if another session holds the lock of the target
+def check_lock(session, rpc, target):
+  if session is None:
+    return
+  locksid = session.server.is_target_locked(target)
+  if locksid and locksid != session.session_id:
+    raise error.LockDeniedProtoError(rpc, locksid)
+
+# Paths missing a leaf are refused before any of them is applied
+def check_srv6_p(rpc, operation, paths):
+  leaves = ("destination", "device") if operation == "del" else \
+    ("destination", "device", "encapmode", "segments")
+  for index, path in enumerate(paths):
+    for leaf in leaves:
+      if path.get(OP[leaf]) is None:
+        raise error.RPCServerError(rpc, error.RPCERR_TYPE_APPLICATION,
+          error.RPCERR_TAG_MISSING_ELEMENT, message="Path %s has no %s" %(index, leaf))
+
+# Apply the paths of an edit-config to its target datastore and build the reply
+def edit_srv6_ep(rpc, target, error_option, operation, paths):
+  summary = {}
+  check_srv6_p(rpc, operation, paths)
+  if target == "candidate":
+    # Nothing reaches the kernel before the commit
+    srv6_candidate.edit(operation, paths)
+    return get_edit_config_reply(rpc, operation, None, summary)
+  if target != "running":
+    raise error.RPCServerError(rpc, error.RPCERR_TYPE_PROTOCOL,
+      error.RPCERR_TAG_INVALID_VALUE, message="Unsupported target %s" %target)
+  if error_option == "rollback-on-error":
+    # All or nothing
+    if operation == "sync":
+      results, summary = srv6_rib.transaction([("add", path) for path in paths], True)
+    else:
+      results, summary = srv6_rib.transaction([(operation, path) for path in paths])
+    errors = format_errors(paths, results, summary)
+    if errors:
+      errors += " (rolled back)"
+  else:
+    if operation == "sync":
+      # Let's reconcile the installed routes
+      results, summary = srv6_rib.sync(paths)
+      logger.info("sync: %s", summary)
+    else:
+      # Let's push the routes in batch
+      results = srv6_rib.route(operation, paths)
+    errors = format_errors(paths, results, summary)
+  return get_edit_config_reply(rpc, operation, errors, summary)
+
+class SRv6EPParser(object):
+  """Incremental parser of a srv6-explicit-path edit-config, each <path> is
+  turned into a route operation and freed as soon as it is parsed"""
+
+  def __init__(self):
+    self.rpc = None
+    self.srv6_ep = None
+    self.paths = []
+
+  def parse(self, msg):
+    data = io.BytesIO(msg.lstrip().encode('utf-8'))
+    if hasattr(etree, "LXML_VERSION"):
+      self.parse_lxml(data)
+    else:
+      self.parse_etree(data)
+
+  def parse_lxml(self, data):
+    # Only the rpc and the paths reach python, the rest is filtered by lxml
+    for event, elem in etree.iterparse(data, events=("start", "end"), tag=(RPC_TAG, PATH_TAG)):
+      if event == "start":
+        if self.rpc is None:
+          self.rpc = elem
+        continue
+      if elem.tag != PATH_TAG:
+        continue
+      parent = elem.getparent()
+      if self.srv6_ep is None and self.is_srv6_ep(parent):
+        self.srv6_ep = parent
+      if parent is not None and parent is self.srv6_ep:
+        self.add_path(elem)
+
+  def parse_etree(self, data):
+    # Every element reaches python, the open ones are tracked
+    parents = []
+    for event, elem in etree.iterparse(data, events=("start", "end")):
+      if event == "start":
+        parents.append(elem)
+        if self.rpc is None:
+          self.rpc = elem
+        elif self.srv6_ep is None and len(parents) == 4 and \
+            [e.tag for e in parents] == SRV6_EP_TAGS:
+          self.srv6_ep = elem
+        continue
+      parents.pop()
+      if parents and parents[-1] is self.srv6_ep and elem.tag == PATH_TAG:
+        self.add_path(elem)
+
+  def is_srv6_ep(self, elem):
+    # srv6-explicit-path in rpc/edit-config/config
+    tags = []
+    while elem is not None:
+      tags.append(elem.tag)
+      elem = elem.getparent()
+    tags.reverse()
+    return tags == SRV6_EP_TAGS
+
+  def add_path(self, elem):
+    self.paths.append(YangUtils.get_srv6_p(elem))
+    # Free the path as soon as it is converted
+    elem.clear()
+    self.srv6_ep.remove(elem)
+
+# Parse a srv6-explicit-path edit-config incrementally and apply it. Nothing
+# reaches the dataplane before the whole message is parsed and every path
+# is checked. Return the rpc and the reply, the reply is None if the message
+# turns out not to be a single srv6-explicit-path edit-config, which is then
+# handled by the library with all its checks. Operation and paths are
+# reported to request_metrics
+def apply_srv6_ep(msg, session=None, request_metrics=None):
+  if request_metrics is None:
+    request_metrics = RequestMetrics("netconf")
+  parser = SRv6EPParser()
+  try:
+    with timed("decode"):
+      parser.parse(msg)
+  except XMLSyntaxError as e:
+    # Without the rpc there is nothing to reply to
+    if parser.rpc is None:
+      logger.warning("Closing session due to malformed message")
+      raise error.SessionError(msg, "Invalid XML from client.")
+    raise error.RPCServerError(parser.rpc, error.RPCERR_TYPE_RPC,
+      error.RPCERR_TAG_MALFORMED_MESSAGE, message="Invalid XML: %s" %e)
+  rpc = parser.rpc
+  # A single edit-config of the srv6-explicit-path
+  if parser.srv6_ep is None or len(rpc) != 1:
+    return rpc, None
+  try:
+    operation = YangUtils.get_srv6_ep_op_or_error(rpc, parser.srv6_ep)
+    request_metrics.operation = operation
+    request_metrics.paths = len(parser.paths)
+    target, error_option = YangUtils.get_edit_config_options(rpc[0])
+    check_lock(session, rpc, target)
+    return rpc, edit_srv6_ep(rpc, target, error_option, operation, parser.paths)
+  except error.RPCServerError:
+    raise
+  except Exception as e:
+    # Like the library does for the other rpcs
+    logger.exception("edit-config failed")
+    raise error.RPCSvrException(rpc, e)
+
+class SRv6NetconfServerSession(server.NetconfServerSession):
+  """Netconf session parsing the srv6-explicit-path edit-configs incrementally"""
+
+  def _reader_handle_message(self, msg):
+    # Everything else builds the whole tree
+    if not INCREMENTAL or not self.session_open or not YangUtils.is_srv6_ep_msg(msg):
+      return server.NetconfServerSession._reader_handle_message(self, msg)
+    logger.debug("rpc_edit_config (incremental)")
+    with RequestMetrics("netconf") as request_metrics, timed_request() as timing:
+      try:
+        rpc, reply = apply_srv6_ep(msg, self, request_metrics)
+      except error.RPCServerError as e:
+        request_metrics.failed = True
+        self._send_rpc_reply_error(e)
+        return
+    # Not for us after all
+    if reply is None:
+      return server.NetconfServerSession._reader_handle_message(self, msg)
+    reply.set(TIMING_ATTRIBUTE, timing.format())
+    self._send_rpc_reply(reply, rpc)
+
 # Netconf methods definition
 class SRv6NetconfMethods(server.NetconfMethods):
   """ Class containing the methods that will be called upon reception of SRv6 Netconf external calls"""
 
   def nc_append_capabilities(self, capabilities_answered):
 
-    capability_list = ["urn:ietf:params:xml:ns:yang:srv6-explicit-path"]
+    capability_list = ["urn:ietf:params:xml:ns:yang:srv6-explicit-path",
+                       "urn:ietf:params:netconf:capability:candidate:1.0",
+                       "urn:ietf:params:netconf:capability:rollback-on-error:1.0"]
 
     for cap in capability_list:
       elem = etree.Element("capability")
@@ -140,50 +440,102 @@ class SRv6NetconfMethods(server.NetconfMethods):
       capabilities_answered.append(elem)
     return
 
-  def rpc_edit_config(self, unused_session, rpc, *unused_params):
+  def rpc_get_config(self, unused_session, rpc, source_elm, filter_or_none):
+        logger.debug("rpc_get_config")
+        filters = YangUtils.get_srv6_filters(filter_or_none)
+        if "prefix" in filters:
+          try:
+            parse_prefix(filters["prefix"])
+          except (socket.error, ValueError):
+            raise error.RPCServerError(rpc, error.RPCERR_TYPE_APPLICATION,
+              error.RPCERR_TAG_INVALID_VALUE, message="Invalid prefix %s" %filters["prefix"])
+        # The routes are read from the kernel and added to the reply as they come
+        if source_elm is not None and len(source_elm) > 0 and \
+            YangUtils.remove_urn(source_elm[0].tag) == "candidate":
+          # The candidate lives in memory
+          paths = filter_paths(srv6_candidate.paths(), **filters)
+        else:
+          paths = dump_routes(idxs, **filters)
+        data = etree.Element("{%s}data" %NS["nc"])
+        srv6_ep = etree.SubElement(data, "{%s}srv6-explicit-path" %NS["srv6"])
+        for path in paths:
+          YangUtils.get_netconf_p(srv6_ep, path)
+        return data
+
+  def rpc_commit(self, session, rpc, *unused_params):
+        logger.debug("rpc_commit")
+        check_lock(session, rpc, "running")
+        # The net change of the candidate in a single transaction
+        with RequestMetrics("netconf", "commit") as request_metrics, \
+            timed_request() as timing:
+          paths, results, summary = srv6_candidate.commit()
+          request_metrics.paths = len(paths)
+          errors = format_errors(paths, results, summary)
+          if errors:
+            errors += " (rolled back)"
+          reply = get_edit_config_reply(rpc, "commit", errors, summary)
+          reply.set(TIMING_ATTRIBUTE, timing.format())
+          return reply
+
+  def rpc_discard_changes(self, session, rpc, *unused_params):
+        logger.debug("rpc_discard_changes")
+        check_lock(session, rpc, "candidate")
+        srv6_candidate.discard()
+        return etree.Element("ok")
+
+  def rpc_unlock(self, session, rpc, target):
+        # Uncommitted changes are dropped when the session holding the lock goes away
+        if rpc is None and target == "candidate":
+          srv6_candidate.discard()
+
+  def rpc_edit_config(self, session, rpc, *unused_params):
         logger.debug("rpc_edit_config")
-        logger.debug("RPC received:%s", format(etree.tostring(rpc, pretty_print=True)))
         # srv6-explicit-path Yang model
         if YangUtils.is_srv6_ep(rpc):
-          srv6_config = YangUtils.get_srv6_ep(rpc)
-          """
-          {
-            "operation": "add",
-            "paths": [
-              {
-                "dev": "eth0",
-                "dst": "2222:4::2/128",
-                "encapmode": "inline",
-                "segs": [
-                  "2222:3::2"
-                ]
-              },
-              {
-                "dev": "eth0",
-                "dst": "3333:4::2/128",
-                "encapmode": "encap",
-                "segs": [
-                  "3333:3::2",
-                  "3333:2::2",
-                  "3333:1::2"
-                ]
-              }
-            ]
-          }
-          """
-          logger.debug("config received:\n%s", json.dumps(srv6_config, indent=2, sort_keys=True))
-          # Let's push the routes
-          for path in srv6_config["paths"]:
-            ip_route.route(srv6_config["operation"], dst=path['dst'], oif=idxs[path['dev']],
-              encap={'type':'seg6', 'mode':path['encapmode'], 'segs':path['segs']})
-          return etree.Element("ok")
+          with timed_request() as timing:
+            with timed("decode"):
+              srv6_config = YangUtils.get_srv6_ep(rpc)
+            """
+            {
+              "operation": "add",
+              "paths": [
+                {
+                  "dev": "eth0",
+                  "dst": "2222:4::2/128",
+                  "encapmode": "inline",
+                  "segs": [
+                    "2222:3::2"
+                  ]
+                },
+                {
+                  "dev": "eth0",
+                  "dst": "3333:4::2/128",
+                  "encapmode": "encap",
+                  "segs": [
+                    "3333:3::2",
+                    "3333:2::2",
+                    "3333:1::2"
+                  ]
+                }
+              ]
+            }
+            """
+            logger.debug("%s received: %s paths", srv6_config["operation"],
+                         len(srv6_config["paths"]))
+            target, error_option = YangUtils.get_edit_config_options(rpc.find("nc:edit-config", NS))
+            check_lock(session, rpc, target)
+            with RequestMetrics("netconf", srv6_config["operation"], len(srv6_config["paths"])):
+              reply = edit_srv6_ep(rpc, target, error_option, srv6_config["operation"],
+                                   srv6_config["paths"])
+          reply.set(TIMING_ATTRIBUTE, timing.format())
+          return reply
         logger.info("not supported yet")
         return etree.Element("not-supported")
 
 # Start Netconf server
 def start_server():
-  # Configure Netconf server listener and ip route
-  global netconf_server, ip_route
+  # Configure Netconf server listener and netlink
+  global netconf_server, netlink_pool, srv6_rib, srv6_candidate
   # Setup Netconf
   if netconf_server is not None:
     logger.error("Netconf Server is already up and running")
@@ -194,14 +546,12 @@ def start_server():
                          server_methods=SRv6NetconfMethods(),
                          port=NC_PORT,
                          debug=SERVER_DEBUG)
-  # Setup ip route
-  if ip_route is not None:
-    logger.error("IP Route is already setup")
-  else:
-    ip_route = IPRoute()
-  # Resolve the interfaces
-  for interface in interfaces:
-    idxs[interface] = ip_route.link_lookup(ifname=interface)[0]
+    # The sessions are created by the server for each client
+    netconf_server.server_session_class = SRv6NetconfServerSession
+  # Setup the interfaces, the driver programming the routes and the table of the installed routes
+  netlink_pool, srv6_rib = start_dataplane(idxs, DRIVER, WORKERS, METRICS_PORT, AUDIT_LOG,
+    INTERFACES)
+  srv6_candidate = SRv6Candidate(srv6_rib)
   # Start the loop for Netconf
   logger.info("Listening Netconf")
   while True:
@@ -209,15 +559,27 @@ def start_server():
 
 # Parse options
 def parse_options():
+  global WORKERS, DRIVER, INTERFACES, METRICS_PORT, AUDIT_LOG, INCREMENTAL
   parser = OptionParser()
   parser.add_option("-d", "--debug", action="store_true", help="Activate debug logs")
+  parser.add_option("-t", "--tree", action="store_true",
+                    help="Parse the edit-configs building the whole tree")
+  add_dataplane_options(parser, WORKERS, DRIVER, INTERFACES)
   # Parse input parameters
   (options, args) = parser.parse_args()
+  # Setup the number of workers
+  WORKERS = options.workers
+  DRIVER = options.driver
+  INTERFACES = options.interfaces.split(",")
+  METRICS_PORT = options.metrics_port
+  AUDIT_LOG = options.audit
+  # Setup the parsing of the edit-configs
+  INCREMENTAL = not options.tree
   # Setup properly the logger
   if options.debug:
-    logging.basicConfig(level=logging.DEBUG)
+    setup_logging(logging.DEBUG)
   else:
-    logging.basicConfig(level=logging.INFO)
+    setup_logging(logging.INFO)
   SERVER_DEBUG = logger.getEffectiveLevel() == logging.DEBUG
   logger.info("SERVER_DEBUG:" + str(SERVER_DEBUG))
 
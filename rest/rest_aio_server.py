@@ -0,0 +1,461 @@
+#!/usr/bin/python3
+
+from concurrent import futures
+from optparse import OptionParser
+from urllib.parse import parse_qs
+
+import asyncio
+import json
+import logging
+import os
+import socket
+import ssl
+import time
+
+import rest_server
+
+from rest_server import (HTTPUtils, OP, HTTP_STATUS, SRV6_BASE_PATH, ResponseData,
+  CERTIFICATE, idxs)
+from dataplane.metrics import RequestMetrics, watch_queue
+from dataplane.logs import setup_logging
+from dataplane.startup import add_dataplane_options, start_dataplane
+from dataplane.timing import timed_request
+from dataplane.rib import check_path
+from dataplane.dump import dump_routes, paginate, parse_prefix
+
+# Global variables definition
+
+# Server reference
+rest_aio_server = None
+# Executor running the netlink work
+executor = None
+# logger reference
+logger = logging.getLogger(__name__)
+# Server ip/ports
+REST_IP = "::"
+REST_PORT = 8080
+# Number of workers programming routes in parallel
+WORKERS = 8
+# Driver programming the routes
+DRIVER = "batch"
+# Interfaces whose routes are managed
+INTERFACES = ["eth0"]
+# Port of the metrics endpoint, disabled if None
+METRICS_PORT = None
+# Audit log of the applied route operations, disabled if None
+AUDIT_LOG = None
+# Path of the streaming endpoint
+SRV6_STREAM_PATH = SRV6_BASE_PATH + "/stream"
+# Max size of the request line, of a header and of a NDJSON line
+MAX_LINE_SIZE = 64 * 1024
+# Max number of headers of a request
+MAX_HEADERS = 100
+# Max size of a chunk of a chunked body
+MAX_CHUNK_SIZE = 1024 * 1024
+# Max size of a body read in memory, the streamed ones are not limited
+MAX_BODY_SIZE = 64 * 1024 * 1024
+# Max number of paths programmed in a single batch of the stream
+MAX_STREAM_BATCH = 1000
+# Size of a single read of the body
+READ_SIZE = 64 * 1024
+# Idle keep-alive connections are closed after this many seconds
+KEEPALIVE_TIMEOUT = 60
+
+class HTTPError(Exception):
+  """Malformed request, the connection is closed after the response"""
+
+  def __init__(self, status, message=None):
+    Exception.__init__(self, message)
+    self.status = status
+    self.message = message
+
+class HTTPRequest(object):
+  """Request line and headers of an HTTP/1.1 request"""
+
+  def __init__(self, method, target, version, headers):
+    self.method = method
+    self.path, _, query_string = target.partition("?")
+    self.query = parse_qs(query_string)
+    self.version = version
+    self.headers = headers
+
+  @property
+  def keep_alive(self):
+    connection = self.headers.get("connection", "").lower()
+    if self.version == "HTTP/1.0":
+      return connection == "keep-alive"
+    return connection != "close"
+
+  @property
+  def chunked(self):
+    return "chunked" in self.headers.get("transfer-encoding", "").lower()
+
+class HTTPConnection(object):
+  """Serves the requests of a keep-alive connection one after the other"""
+
+  def __init__(self, reader, writer):
+    self.reader = reader
+    self.writer = writer
+    # Set when the connection cannot be reused
+    self.closing = False
+    # Set when the response of the current request has started
+    self.responding = False
+
+  async def read_line(self):
+    try:
+      line = await self.reader.readuntil(b"\n")
+    except asyncio.LimitOverrunError:
+      raise HTTPError(HTTP_STATUS["BAD_REQUEST"], "Line too long")
+    return line.rstrip(b"\r\n").decode("latin-1")
+
+  async def read_request(self):
+    # Wait for the next request, None when the client is gone
+    try:
+      line = await asyncio.wait_for(self.read_line(), KEEPALIVE_TIMEOUT)
+    except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+      return None
+    try:
+      method, target, version = line.split(" ")
+    except ValueError:
+      raise HTTPError(HTTP_STATUS["BAD_REQUEST"], "Malformed request line")
+    headers = {}
+    while True:
+      line = await self.read_line()
+      if not line:
+        break
+      if len(headers) >= MAX_HEADERS:
+        raise HTTPError(HTTP_STATUS["HEADERS_TOO_LARGE"], "Too many headers")
+      name, _, value = line.partition(":")
+      headers[name.strip().lower()] = value.strip()
+    return HTTPRequest(method, target, version, headers)
+
+  async def read_body(self, request, max_size=None):
+    """Yield the body as it arrives, either chunked or with a Content-Length,
+    a body larger than max_size is refused"""
+    if request.chunked:
+      received = 0
+      while True:
+        size = (await self.read_line()).split(";")[0]
+        try:
+          size = int(size, 16)
+        except ValueError:
+          raise HTTPError(HTTP_STATUS["BAD_REQUEST"], "Malformed chunk size")
+        if size == 0:
+          # Skip the trailers
+          while await self.read_line():
+            pass
+          return
+        if size > MAX_CHUNK_SIZE:
+          raise HTTPError(HTTP_STATUS["TOO_LARGE"], "Chunk too large")
+        received += size
+        if max_size is not None and received > max_size:
+          raise HTTPError(HTTP_STATUS["TOO_LARGE"], "Body too large")
+        data = await self.reader.readexactly(size)
+        await self.reader.readexactly(2)
+        yield data
+    else:
+      try:
+        remaining = int(request.headers.get("content-length", 0))
+      except ValueError:
+        raise HTTPError(HTTP_STATUS["BAD_REQUEST"], "Malformed Content-Length")
+      if max_size is not None and remaining > max_size:
+        raise HTTPError(HTTP_STATUS["TOO_LARGE"], "Body too large")
+      while remaining > 0:
+        data = await self.reader.read(min(remaining, READ_SIZE))
+        if not data:
+          raise asyncio.IncompleteReadError(b"", remaining)
+        remaining -= len(data)
+        yield data
+
+  async def read_all(self, request):
+    body = []
+    async for data in self.read_body(request, MAX_BODY_SIZE):
+      body.append(data)
+    return b"".join(body)
+
+  def send_headers(self, status, headers):
+    self.responding = True
+    lines = ["HTTP/1.1 %s %s" %(status.code, status.message)]
+    lines.extend("%s: %s" %(name, value) for name, value in headers)
+    self.writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+
+  async def send_response(self, response, keep_alive=True, extra_headers=()):
+    # Send a response with a Content-Length
+    body = response.body.encode() if response.body is not None else b""
+    headers = list(extra_headers)
+    if response.body is not None:
+      headers.append(("Content-Type", "application/json"))
+    headers.append(("Content-Length", len(body)))
+    if not keep_alive:
+      headers.append(("Connection", "close"))
+    self.send_headers(response.status, headers)
+    self.writer.write(body)
+    await self.writer.drain()
+
+  def start_chunked(self, content_type):
+    self.send_headers(HTTP_STATUS["OK_CONTENT"], [("Content-Type", content_type),
+      ("Transfer-Encoding", "chunked")])
+
+  async def send_chunk(self, data):
+    # Send a chunk of a chunked response
+    data = data.encode()
+    self.writer.write(b"%x\r\n%s\r\n" %(len(data), data))
+    await self.writer.drain()
+
+  async def serve(self):
+    # Loop over the requests of the connection
+    try:
+      while True:
+        self.responding = False
+        try:
+          request = await self.read_request()
+          if request is None:
+            return
+          await self.handle(request)
+          if self.closing or not request.keep_alive:
+            return
+        except HTTPError as e:
+          if not self.responding:
+            await self.send_response(ResponseData(status=e.status,
+              body=json.dumps({"message": e.message})), keep_alive=False)
+          return
+    except (asyncio.IncompleteReadError, ConnectionError):
+      logger.debug("connection closed by the client")
+    except Exception as e:
+      logger.exception("request failed")
+      # A started response cannot be turned into an error
+      if not self.responding:
+        try:
+          await self.send_response(ResponseData(status=HTTP_STATUS["ERROR"],
+            body=json.dumps({"message": str(e)})), keep_alive=False)
+        except ConnectionError:
+          pass
+    finally:
+      self.writer.close()
+
+  async def handle(self, request):
+    if request.method == "GET" and request.path == SRV6_BASE_PATH:
+      await self.do_list(request)
+    elif request.method == "POST" and request.path == SRV6_BASE_PATH:
+      await self.do_post(request)
+    elif request.method == "POST" and request.path == SRV6_STREAM_PATH:
+      await self.do_stream(request)
+    else:
+      # Unexpected paths, drop the body to keep the connection usable
+      logger.info("not supported yet")
+      await self.read_all(request)
+      await self.send_response(ResponseData(status=HTTP_STATUS["NOT_FOUND"], body=None))
+
+  def get_operation(self, request, operations):
+    operation = request.query.get("operation", [None])[0]
+    if operation not in operations:
+      raise HTTPError(HTTP_STATUS["BAD_REQUEST"], "Invalid operation %s" %operation)
+    return OP[operation]
+
+  async def do_post(self, request):
+    # Same data-model of the threaded server
+    operation = self.get_operation(request, ("create", "remove", "sync"))
+    with RequestMetrics("rest", operation) as request_metrics:
+      start = time.time()
+      try:
+        paths = HTTPUtils.get_srv6_paths(await self.read_all(request))
+        # Every path has the fields of the operation, MalformedPath is a ValueError
+        for path in paths:
+          check_path(operation, path)
+      except (ValueError, KeyError, TypeError, AttributeError):
+        raise HTTPError(HTTP_STATUS["BAD_REQUEST"], "Malformed paths")
+      request_metrics.paths = len(paths)
+      logger.debug("%s received: %s paths", operation, len(paths))
+      loop = asyncio.get_event_loop()
+      response, timing = await loop.run_in_executor(executor, program_paths_timed, operation,
+        paths, start, time.time())
+      request_metrics.failed = response.status.code >= 400
+    # The time spent in each stage of the request
+    await self.send_response(response, extra_headers=[("Server-Timing", timing.format())])
+
+  async def do_list(self, request):
+    filters = HTTPUtils.get_srv6_filters(request.query)
+    logger.debug("list received: %s", filters)
+    # The whole stream is measured as a request
+    with RequestMetrics("rest", "list") as request_metrics:
+      if "prefix" in filters:
+        try:
+          parse_prefix(filters["prefix"])
+        except (socket.error, ValueError):
+          raise HTTPError(HTTP_STATUS["BAD_REQUEST"], "Invalid prefix %s" %filters["prefix"])
+      await self.read_all(request)
+      # Stream the installed paths one page at a time
+      self.start_chunked("application/json")
+      await self.send_chunk('{"paths": [')
+      loop = asyncio.get_event_loop()
+      pages = paginate(dump_routes(idxs, **filters))
+      separator = ""
+      while True:
+        page = await loop.run_in_executor(executor, next, pages, None)
+        if page is None:
+          break
+        request_metrics.paths += len(page)
+        await self.send_chunk(separator + ", ".join(json.dumps(HTTPUtils.get_http_p(p))
+          for p in page))
+        separator = ", "
+      await self.send_chunk("]}")
+      # Last chunk
+      await self.send_chunk("")
+
+  async def do_stream(self, request):
+    """
+    SRv6 explicit path streaming example
+
+    POST /srv6-explicit-path/stream?operation={create|remove}
+    Transfer-Encoding: chunked
+
+    {"device": "eth0", "destination": "2222:4::2/128", "encapmode": "inline", "segments": ["2222:3::2"]}
+    {"device": "eth0", "destination": "3333:4::2/128", "encapmode": "encap", "segments": ["3333:3::2"]}
+
+    The paths are programmed as the lines arrive and one result per line
+    is streamed back, in the same order:
+
+    {"destination": "2222:4::2/128", "device": "eth0", "status": "OK"}
+    {"line": 2, "status": "Malformed path"}
+    """
+    operation = self.get_operation(request, ("create", "remove"))
+    loop = asyncio.get_event_loop()
+    self.start_chunked("application/x-ndjson")
+    buffered = b""
+    number = 0
+    try:
+      async for data in self.read_body(request):
+        lines = (buffered + data).split(b"\n")
+        # The last one may be incomplete
+        buffered = lines.pop()
+        if len(buffered) > MAX_LINE_SIZE:
+          raise HTTPError(HTTP_STATUS["BAD_REQUEST"], "Line too long")
+        # Program whatever has arrived so far
+        for i in range(0, len(lines), MAX_STREAM_BATCH):
+          number = await self.program_lines(loop, operation, lines[i:i + MAX_STREAM_BATCH],
+            number)
+      # Last line without a newline
+      number = await self.program_lines(loop, operation, [buffered], number)
+    except HTTPError as e:
+      # The response is already started, report the error as the last result
+      await self.send_chunk(json.dumps({"line": number + 1, "status": e.message}) + "\n")
+      self.closing = True
+    logger.debug("%s streamed: %s lines", operation, number)
+    # Last chunk
+    await self.send_chunk("")
+
+  async def program_lines(self, loop, operation, lines, number):
+    # Parse the lines, the malformed ones are reported without reaching the kernel
+    results = []
+    paths = []
+    for line in lines:
+      if not line.strip():
+        continue
+      number += 1
+      try:
+        path = HTTPUtils.get_srv6_p(json.loads(line))
+        # The path has the fields of the operation, MalformedPath is a ValueError
+        check_path(operation, path)
+        results.append(path)
+        paths.append(path)
+      except (ValueError, KeyError, TypeError, AttributeError):
+        results.append({"line": number, "status": "Malformed path"})
+    if not results:
+      return number
+    errnos = []
+    if paths:
+      # Each batch of the stream is measured as a request
+      with RequestMetrics("rest", operation, len(paths)) as request_metrics:
+        errnos = await loop.run_in_executor(executor, rest_server.srv6_rib.route, operation,
+          paths)
+        request_metrics.failed = any(errnos)
+    errnos = iter(errnos)
+    # Stream back one result per line
+    replies = []
+    for result in results:
+      if "line" not in result:
+        error = next(errnos)
+        result = {"destination": result['dst'], "device": result['dev'],
+                  "status": os.strerror(error) if error else "OK"}
+      replies.append(json.dumps(result) + "\n")
+    await self.send_chunk("".join(replies))
+    return number
+
+# Program the paths on a thread of the executor and return the response with
+# the timing of the request, decoded between start and decoded
+def program_paths_timed(operation, paths, start, decoded):
+  with timed_request() as timing:
+    timing.start = start
+    timing.add("decode", decoded - start)
+    # Waiting for a thread of the executor
+    timing.add("queue", time.time() - decoded)
+    response = rest_server.program_paths(operation, paths)
+  return response, timing
+
+# Handle a new connection
+async def handle_connection(reader, writer):
+  await HTTPConnection(reader, writer).serve()
+
+# Run asyncio HTTP/HTTPS server
+async def serve(secure):
+  global rest_aio_server
+  context = None
+  # If secure let's protect the socket with ssl
+  if secure:
+    context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    context.load_cert_chain(CERTIFICATE)
+  # Dual stack socket, like the threaded server
+  sock = socket.socket(socket.AF_INET6, socket.SOCK_STREAM)
+  sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+  sock.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_V6ONLY, 0)
+  sock.bind((REST_IP, REST_PORT))
+  rest_aio_server = await asyncio.start_server(handle_connection, sock=sock, ssl=context,
+    limit=MAX_LINE_SIZE)
+  # Start the loop for REST
+  logger.info("Listening %s (asyncio)" %("HTTPS" if secure else "HTTP"))
+  async with rest_aio_server:
+    await rest_aio_server.serve_forever()
+
+# Start asyncio HTTP/HTTPS server
+def start_server(secure):
+  global executor
+  executor = futures.ThreadPoolExecutor(max_workers=WORKERS)
+  # Work waiting for a thread
+  watch_queue("rest", executor._work_queue.qsize)
+  # Setup the interfaces, the driver programming the routes and the table of the installed routes
+  rest_server.netlink_pool, rest_server.srv6_rib = start_dataplane(idxs, DRIVER, WORKERS,
+    METRICS_PORT, AUDIT_LOG, INTERFACES)
+  # Run the loop for REST
+  asyncio.run(serve(secure))
+
+# Parse options
+def parse_options():
+  global REST_PORT, WORKERS, DRIVER, INTERFACES, METRICS_PORT, AUDIT_LOG
+  parser = OptionParser()
+  parser.add_option("-d", "--debug", action="store_true", help="Activate debug logs")
+  add_dataplane_options(parser, WORKERS, DRIVER, INTERFACES)
+  parser.add_option("-s", "--secure", action="store_true", help="Activate secure mode")
+  # Parse input parameters
+  (options, args) = parser.parse_args()
+  # Setup the number of workers
+  WORKERS = options.workers
+  DRIVER = options.driver
+  INTERFACES = options.interfaces.split(",")
+  METRICS_PORT = options.metrics_port
+  AUDIT_LOG = options.audit
+  # Setup properly the logger
+  if options.debug:
+    setup_logging(logging.DEBUG)
+  else:
+    setup_logging(logging.INFO)
+  SERVER_DEBUG = logger.getEffectiveLevel() == logging.DEBUG
+  logger.info("SERVER_DEBUG:" + str(SERVER_DEBUG))
+  # Return secure/insecure mode
+  if options.secure:
+    REST_PORT = 443
+    return True
+  return False
+
+if __name__ == "__main__":
+  secure = parse_options()
+  start_server(secure)
@@ -7,6 +7,8 @@ import json
 
 # Base path for the url
 SRV6_BASE_PATH = "srv6-explicit-path"
+# Streaming endpoint of the asyncio server
+SRV6_STREAM_PATH = "srv6-explicit-path/stream"
 # HTTP definitions
 ACCEPT = "application/json"
 CONTENT_TYPE = "application/json"
@@ -17,14 +19,20 @@ SECURE = False
 CERTIFICATE = 'cert_client.pem'
 
 # Build an http requests object
-def get_http_requests(ip_address, port, secure, params, data):
+def get_http_requests(ip_address, port, secure, params, data, base_path=SRV6_BASE_PATH):
   # Create a request, build the url and headers
   url = '{scheme}://{ip}:{port}/{basePath}'.format(scheme=('https' if secure else 'http'),
-                                                  ip=ip_address, port=port, basePath=SRV6_BASE_PATH)
+                                                  ip=ip_address, port=port, basePath=base_path)
   headers = {'Accept': ACCEPT, 'Content-Type': CONTENT_TYPE}
   request = requests.Request(POST, url, data=data, headers=headers, params=params)
   return request.prepare()
 
+# Generate NDJSON paths, one per line
+def generate_lines(count):
+  for i in range(count):
+    yield json.dumps({"device": "eth0", "destination": "4444:%x::2/128" %i,
+                      "encapmode": "encap", "segments": ["4444:3::2"]}) + "\n"
+
 # Let's create a http session
 session = requests.Session()
 # Define body content and query params
@@ -133,4 +141,15 @@ for data in json_data:
   request = get_http_requests("localhost", 443 if SECURE else 8080, SECURE, params, json.dumps(data))
   response = session.send(request, verify=(CERTIFICATE if SECURE else None))
   print response.status_code
-  session.close()
\ No newline at end of file
+  session.close()
+# Stream 10000 paths to the asyncio server, the body is sent chunked
+# and the results come back one per line while the paths are programmed
+session = requests.Session()
+for operation in ["create", "remove"]:
+  params = {"operation": operation}
+  request = get_http_requests("localhost", 443 if SECURE else 8080, SECURE, params,
+                              generate_lines(10000), SRV6_STREAM_PATH)
+  response = session.send(request, verify=(CERTIFICATE if SECURE else None), stream=True)
+  failed = [line for line in response.iter_lines() if line and '"OK"' not in line]
+  print response.status_code, len(failed)
+session.close()
@@ -1,27 +1,47 @@
 #!/usr/bin/python
 
 from optparse import OptionParser
-from pyroute2 import IPRoute
-from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
-from SocketServer import ThreadingMixIn
 from collections import namedtuple
-from urlparse import parse_qs
+
+try:
+  from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+  from SocketServer import ThreadingMixIn
+  from urlparse import parse_qs
+except ImportError:
+  # Python 3, used by the asyncio server
+  from http.server import BaseHTTPRequestHandler, HTTPServer
+  from socketserver import ThreadingMixIn
+  from urllib.parse import parse_qs
 
 import logging
 import time
 import json
 import socket
 import ssl
+import os
+import sys
+
+# Shared modules live in the root of the project
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from dataplane.batch import format_errors
+from dataplane.metrics import RequestMetrics, observe_request
+from dataplane.logs import setup_logging
+from dataplane.links import InterfaceCache
+from dataplane.startup import add_dataplane_options, start_dataplane
+from dataplane.timing import timed_request, timed
+from dataplane.rib import MalformedPath
+from dataplane.dump import dump_routes, paginate, parse_prefix
 
 # Global variables definition
 
 # Server reference
 rest_server = None
-# Netlink socket
-ip_route = None
+# Pool of netlink sockets
+netlink_pool = None
+# Table of the installed routes
+srv6_rib = None
 # Cache of the resolved interfaces
-interfaces = ['eth0']
-idxs = {}
+idxs = InterfaceCache()
 # logger reference
 logger = logging.getLogger(__name__)
 # Server ip/ports
@@ -29,24 +49,47 @@ REST_IP = "::"
 REST_PORT = 8080
 # Debug option
 SERVER_DEBUG = False
+# Number of workers programming routes in parallel
+WORKERS = 8
+# Driver programming the routes
+DRIVER = "batch"
+# Interfaces whose routes are managed
+INTERFACES = ["eth0"]
+# Port of the metrics endpoint, disabled if None
+METRICS_PORT = None
+# Audit log of the applied route operations, disabled if None
+AUDIT_LOG = None
 # SRv6 base path
 SRV6_BASE_PATH = "/srv6-explicit-path"
 # HTTP utilities
 ResponseStatus = namedtuple("HTTPStatus", ["code", "message"])
-ResponseData = namedtuple("ResponseData", ["status"])
+ResponseData = namedtuple("ResponseData", ["status", "body"])
 HTTP_STATUS = {"OK": ResponseStatus(code=204, message="OK"),
-               "NOT_FOUND": ResponseStatus(code=404, message="Not found")}
+               "OK_CONTENT": ResponseStatus(code=200, message="OK"),
+               "BAD_REQUEST": ResponseStatus(code=400, message="Bad request"),
+               "NOT_FOUND": ResponseStatus(code=404, message="Not found"),
+               "TOO_LARGE": ResponseStatus(code=413, message="Payload too large"),
+               "HEADERS_TOO_LARGE": ResponseStatus(code=431,
+                                                   message="Request header fields too large"),
+               "ERROR": ResponseStatus(code=500, message="Internal Server Error")}
 PUT = "PUT"
 DELETE = "DELETE"
 # SRv6 mapping
 OP = {
   "create":"add",
   "remove":"del",
+  "sync":"sync",
   "destination":"dst",
   "device":"dev",
   "encapmode":"encapmode",
   "segments":"segs"
 }
+# SRv6 list filters
+FILTERS = {
+  "device":"device",
+  "prefix":"prefix",
+  "encapmode":"encapmode"
+}
 # SSL certificate
 CERTIFICATE = 'cert_server.pem'
 
@@ -57,7 +100,10 @@ class HTTPUtils:
   """
   SRv6 explicit path configuration example
 
-  POST /srv6-explicit-path?operation={create|remove}
+  POST /srv6-explicit-path?operation={create|remove|sync}
+
+  With sync the paths are the complete desired state: the missing ones
+  are installed, the changed ones replaced and all the others removed
 
   {
     "paths": [
@@ -88,11 +134,20 @@ class HTTPUtils:
     # Init steps
     path = {}
     # Get srv6 path
-    for k,v in http_path.iteritems():
+    for k,v in http_path.items():
       # Translating key and saving values
       path[OP[k]] = v
     return path
 
+  @staticmethod
+  def get_srv6_paths(http_data):
+    # Get paths
+    paths = []
+    http_paths = json.loads(http_data)['paths']
+    for http_path in http_paths:
+      paths.append(HTTPUtils.get_srv6_p(http_path))
+    return paths
+
   @staticmethod
   def get_srv6_ep(request, query):
     # Init steps
@@ -102,17 +157,66 @@ class HTTPUtils:
     # Let's parse paths
     length = int(request.headers['Content-Length'])
     http_data = request.rfile.read(length)
-    http_data = json.loads(http_data)
-    # Get paths
-    paths = []
-    http_paths = http_data['paths']
-    for http_path in http_paths:
-      paths.append(HTTPUtils.get_srv6_p(http_path))
+    paths = HTTPUtils.get_srv6_paths(http_data)
     # Finally let's fill the python dict
     msg['operation'] = op_type
     msg['paths'] = paths
     return msg
 
+  """
+  SRv6 explicit path listing example
+
+  GET /srv6-explicit-path?device=eth0&prefix=2222::/16&encapmode=inline
+
+  The installed paths are streamed back with a chunked response
+  using the same data-model of the POST requests
+  """
+
+  @staticmethod
+  def get_srv6_filters(query):
+    # Init steps
+    filters = {}
+    # Get the filters of the listing
+    for k,v in query.items():
+      if k in FILTERS:
+        filters[FILTERS[k]] = v[0]
+    return filters
+
+  @staticmethod
+  def get_http_p(path):
+    # Translate a path back into the HTTP data-model
+    return {"destination": path['dst'], "device": path['dev'],
+            "encapmode": path['encapmode'], "segments": path['segs']}
+
+# Program the paths and build the response
+def program_paths(operation, paths):
+  summary = None
+  try:
+    if operation == "sync":
+      # Let's reconcile the installed routes
+      results, summary = srv6_rib.sync(paths)
+      logger.info("sync: %s", summary)
+    else:
+      # Let's push the routes in batch
+      results = srv6_rib.route(operation, paths)
+  except MalformedPath as e:
+    # Nothing has been applied
+    logger.error("%s failed: %s", operation, e)
+    return ResponseData(status=HTTP_STATUS["BAD_REQUEST"],
+      body=json.dumps({"message": "Malformed paths"}))
+  # and create the response
+  errors = format_errors(paths, results, summary)
+  if errors:
+    logger.error("%s failed: %s", operation, errors)
+    body = {"message": errors}
+    if summary is not None:
+      body.update(summary)
+    return ResponseData(status=HTTP_STATUS["ERROR"], body=json.dumps(body))
+  if summary is not None:
+    # Sync returns the summary of the changes
+    return ResponseData(status=HTTP_STATUS["OK_CONTENT"], body=json.dumps(summary))
+  return ResponseData(status=HTTP_STATUS["OK"], body=None)
+
 class HTTPv6Server(HTTPServer):
   address_family = socket.AF_INET6
 
@@ -129,60 +233,114 @@ class SRv6HTTPRequestHandler(BaseHTTPRequestHandler):
     self.disable_nagle_algorithm = True
     BaseHTTPRequestHandler.setup(self)
 
-  def send_headers(self, status):
+  def send_headers(self, status, body=None, headers=()):
     # Send proper HTTP headers
     self.send_response(status.code, status.message)
+    for name, value in headers:
+      self.send_header(name, value)
+    if body is not None:
+      self.send_header("Content-Type", "application/json")
+      self.send_header("Content-Length", str(len(body)))
     self.end_headers()
+    # and the body if any
+    if body is not None:
+      self.wfile.write(body)
+
+  def send_chunk(self, data):
+    # Send a chunk of a chunked response
+    self.wfile.write("%x\r\n%s\r\n" %(len(data), data))
+    self.wfile.flush()
+
+  def do_GET(self):
+    # Extract values from the query string
+    path, _, query_string = self.path.partition('?')
+    query = parse_qs(query_string)
+    # Handle get requests
+    if path != SRV6_BASE_PATH:
+      # Unexpected paths
+      logger.info("not supported yet")
+      self.send_headers(HTTP_STATUS["NOT_FOUND"])
+      return
+    filters = HTTPUtils.get_srv6_filters(query)
+    logger.debug("list received: %s", filters)
+    # The whole stream is measured as a request
+    with RequestMetrics("rest", "list") as request_metrics:
+      if "prefix" in filters:
+        try:
+          parse_prefix(filters["prefix"])
+        except (socket.error, ValueError):
+          request_metrics.failed = True
+          self.send_headers(HTTP_STATUS["BAD_REQUEST"],
+            json.dumps({"message": "Invalid prefix %s" %filters["prefix"]}))
+          return
+      # Stream the installed paths one page at a time
+      self.send_response(HTTP_STATUS["OK_CONTENT"].code, HTTP_STATUS["OK_CONTENT"].message)
+      self.send_header("Content-Type", "application/json")
+      self.send_header("Transfer-Encoding", "chunked")
+      self.end_headers()
+      self.send_chunk('{"paths": [')
+      separator = ""
+      for page in paginate(dump_routes(idxs, **filters)):
+        request_metrics.paths += len(page)
+        self.send_chunk(separator + ", ".join(json.dumps(HTTPUtils.get_http_p(p)) for p in page))
+        separator = ", "
+      self.send_chunk("]}")
+      # Last chunk
+      self.send_chunk("")
 
   def do_POST(self):
     # Extract values from the query string
     path, _, query_string = self.path.partition('?')
     query = parse_qs(query_string)
+    headers = ()
     # Handle post requests
     if path == SRV6_BASE_PATH:
-      srv6_config = HTTPUtils.get_srv6_ep(self, query)
-      """
-      {
-        "paths": [
-          {
-            "dev": "eth0",
-            "dst": "2222:4::2/128",
-            "encapmode": "inline",
-            "segs": [
-              "2222:3::2"
-            ]
-          },
-          {
-            "dev": "eth0",
-            "dst": "3333:4::2/128",
-            "encapmode": "encap",
-            "segs": [
-              "3333:3::2",
-              "3333:2::2",
-              "3333:1::2"
-            ]
-          }
-        ]
-      }
-      """
-      logger.debug("config received:\n%s", json.dumps(srv6_config, indent=2, sort_keys=True))
-      # Let's push the routes
-      for path in srv6_config["paths"]:
-        ip_route.route(srv6_config["operation"], dst=path['dst'], oif=idxs[path['dev']],
-          encap={'type':'seg6', 'mode':path['encapmode'], 'segs':path['segs']})
-      # and create the response
-      response = ResponseData(status=HTTP_STATUS["OK"])
+      start = time.time()
+      with timed_request() as timing:
+        with timed("decode"):
+          srv6_config = HTTPUtils.get_srv6_ep(self, query)
+        """
+        {
+          "paths": [
+            {
+              "dev": "eth0",
+              "dst": "2222:4::2/128",
+              "encapmode": "inline",
+              "segs": [
+                "2222:3::2"
+              ]
+            },
+            {
+              "dev": "eth0",
+              "dst": "3333:4::2/128",
+              "encapmode": "encap",
+              "segs": [
+                "3333:3::2",
+                "3333:2::2",
+                "3333:1::2"
+              ]
+            }
+          ]
+        }
+        """
+        logger.debug("%s received: %s paths", srv6_config["operation"],
+          len(srv6_config["paths"]))
+        response = program_paths(srv6_config["operation"], srv6_config["paths"])
+        observe_request("rest", srv6_config["operation"], time.time() - start,
+          len(srv6_config["paths"]), response.status.code >= 400)
+      # The time spent in each stage of the request
+      headers = (("Server-Timing", timing.format()),)
     else:
       # Unexpected paths
       logger.info("not supported yet")
-      response = ResponseData(status=HTTP_STATUS["NOT_FOUND"])
+      response = ResponseData(status=HTTP_STATUS["NOT_FOUND"], body=None)
     # Done, send back the respons
-    self.send_headers(response.status)
+    self.send_headers(response.status, response.body, headers)
 
 # Start HTTP/HTTPS server
 def start_server(secure):
-  # Configure Server listener and ip route
-  global rest_server, ip_route
+  # Configure Server listener and netlink
+  global rest_server, netlink_pool, srv6_rib
   # Setup server
   if rest_server is not None:
     logger.error("HTTP/HTTPS Server is already up and running")
@@ -193,31 +351,33 @@ def start_server(secure):
     if secure:
       rest_server.socket = ssl.wrap_socket(rest_server.socket, certfile=CERTIFICATE,
                                           server_side=True)
-  # Setup ip route
-  if ip_route is not None:
-    logger.error("IP Route is already setup")
-  else:
-    ip_route = IPRoute()
-  # Resolve the interfaces
-  for interface in interfaces:
-    idxs[interface] = ip_route.link_lookup(ifname=interface)[0]
+  # Setup the interfaces, the driver programming the routes and the table of the installed routes
+  netlink_pool, srv6_rib = start_dataplane(idxs, DRIVER, WORKERS, METRICS_PORT, AUDIT_LOG,
+    INTERFACES)
   # Start the loop for REST
   logger.info("Listening %s" %("HTTPS" if secure else "HTTP"))
   rest_server.serve_forever()
 
 # Parse options
 def parse_options():
-  global REST_PORT
+  global REST_PORT, WORKERS, DRIVER, INTERFACES, METRICS_PORT, AUDIT_LOG
   parser = OptionParser()
   parser.add_option("-d", "--debug", action="store_true", help="Activate debug logs")
+  add_dataplane_options(parser, WORKERS, DRIVER, INTERFACES)
   parser.add_option("-s", "--secure", action="store_true", help="Activate secure mode")
   # Parse input parameters
   (options, args) = parser.parse_args()
+  # Setup the number of workers
+  WORKERS = options.workers
+  DRIVER = options.driver
+  INTERFACES = options.interfaces.split(",")
+  METRICS_PORT = options.metrics_port
+  AUDIT_LOG = options.audit
   # Setup properly the logger
   if options.debug:
-    logging.basicConfig(level=logging.DEBUG)
+    setup_logging(logging.DEBUG)
   else:
-    logging.basicConfig(level=logging.INFO)
+    setup_logging(logging.INFO)
   SERVER_DEBUG = logger.getEffectiveLevel() == logging.DEBUG
   logger.info("SERVER_DEBUG:" + str(SERVER_DEBUG))
   # Return secure/insecure mode
@@ -0,0 +1 @@
+"""Client library of the SRv6 southbound API shared by the controller modules"""
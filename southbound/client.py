@@ -0,0 +1,256 @@
+#!/usr/bin/python
+
+import logging
+import threading
+import time
+
+from concurrent import futures
+
+try:
+  import Queue as queue
+except ImportError:
+  import queue
+
+from southbound.transport import TRANSPORTS, SouthboundError
+
+# Global variables definition
+
+# logger reference
+logger = logging.getLogger(__name__)
+# Default number of connections per router
+POOL_SIZE = 4
+# Max number of paths merged in a single request
+BATCH_SIZE = 1000
+# Seconds a call waits for the following ones to be merged with it
+BATCH_DELAY = 0.005
+# Stops the batcher of a router
+CLOSE = object()
+
+# Route of a path
+def get_key(path):
+  return (path['destination'], path['device'])
+
+class ConnectionPool(object):
+  """Pool of connections to a router, they are opened on demand up to size"""
+
+  def __init__(self, connect, size=POOL_SIZE):
+    # Opens a new connection
+    self.connect = connect
+    self.size = size
+    # Idle connections
+    self.idle = queue.Queue()
+    self.opened = 0
+    self.lock = threading.Lock()
+
+  def acquire(self):
+    # Take an idle connection if any
+    try:
+      return self.idle.get_nowait()
+    except queue.Empty:
+      pass
+    # Open a new one if the pool is not full
+    with self.lock:
+      if self.opened < self.size:
+        self.opened += 1
+        try:
+          return self.connect()
+        except:
+          self.opened -= 1
+          raise
+    # Wait for a connection to be released
+    return self.idle.get()
+
+  def release(self, connection):
+    self.idle.put(connection)
+
+  def discard(self, connection):
+    # Broken connection, the next acquire opens a new one
+    with self.lock:
+      self.opened -= 1
+    try:
+      connection.close()
+    except Exception as e:
+      logger.debug("Cannot close the connection: %s" %e)
+
+  def close(self):
+    while True:
+      try:
+        connection = self.idle.get_nowait()
+      except queue.Empty:
+        return
+      self.discard(connection)
+
+class RouterBatcher(object):
+  """Merges the consecutive calls of the same operation to a router and sends
+  them on the pooled connections, the operations are applied in order: a batch
+  waits for the ones in flight with a different operation or the same routes"""
+
+  def __init__(self, connect, pool_size=POOL_SIZE, batch_size=BATCH_SIZE,
+      batch_delay=BATCH_DELAY):
+    self.pool = ConnectionPool(connect, pool_size)
+    self.batch_size = batch_size
+    self.batch_delay = batch_delay
+    # Calls waiting to be sent: (operation, paths, future)
+    self.calls = queue.Queue()
+    # Batches being sent with their routes, they all have the same operation
+    self.executor = futures.ThreadPoolExecutor(max_workers=pool_size)
+    self.inflight = []
+    self.operation = None
+    self.thread = threading.Thread(target=self.run)
+    self.thread.daemon = True
+    self.thread.start()
+
+  def submit(self, operation, paths):
+    future = futures.Future()
+    self.calls.put((operation, list(paths), future))
+    return future
+
+  def close(self):
+    self.calls.put(CLOSE)
+    self.thread.join()
+    self.executor.shutdown(wait=True)
+    self.pool.close()
+
+  def run(self):
+    # The call read while merging which did not fit in the batch
+    pending = None
+    while True:
+      call = pending if pending is not None else self.calls.get()
+      pending = None
+      if call is CLOSE:
+        return
+      operation, paths, future = call
+      batch = [(paths, future)]
+      count = len(paths)
+      # A sync carries the whole state and is never merged
+      deadline = time.time() + self.batch_delay
+      while operation != "sync" and count < self.batch_size:
+        try:
+          call = self.calls.get(timeout=max(deadline - time.time(), 0))
+        except queue.Empty:
+          break
+        if call is CLOSE or call[0] != operation:
+          pending = call
+          break
+        batch.append((call[1], call[2]))
+        count += len(call[1])
+      self.dispatch(operation, batch)
+      if pending is CLOSE:
+        return
+
+  def dispatch(self, operation, batch):
+    keys = set(get_key(path) for paths, _ in batch for path in paths)
+    # A different operation waits for the batches in flight, the order is kept
+    if operation != self.operation or operation == "sync":
+      futures.wait([future for future, _ in self.inflight])
+      self.inflight = []
+      self.operation = operation
+    else:
+      # The same routes are changed in the order of the calls
+      futures.wait([future for future, inflight_keys in self.inflight
+        if not keys.isdisjoint(inflight_keys)])
+    self.inflight = [(future, inflight_keys) for future, inflight_keys in self.inflight
+      if not future.done()]
+    self.inflight.append((self.executor.submit(self.send, operation, batch), keys))
+
+  def send(self, operation, batch):
+    # Cancelled calls are dropped
+    batch = [(paths, future) for paths, future in batch
+      if future.set_running_or_notify_cancel()]
+    if not batch:
+      return
+    paths = [path for call_paths, _ in batch for path in call_paths]
+    try:
+      connection = self.pool.acquire()
+    except Exception as e:
+      logger.error("Cannot connect: %s" %e)
+      for _, future in batch:
+        future.set_exception(e)
+      return
+    try:
+      errors, summary = connection.execute(operation, paths)
+    except SouthboundError as e:
+      # The request has been refused, the connection is still good
+      self.pool.release(connection)
+      for _, future in batch:
+        future.set_exception(e)
+      return
+    except Exception as e:
+      logger.error("%s failed: %s" %(operation, e))
+      self.pool.discard(connection)
+      for _, future in batch:
+        future.set_exception(e)
+      return
+    self.pool.release(connection)
+    # Each call gets the errors of its own paths, found by their position in
+    # the request
+    offset = 0
+    for call_paths, future in batch:
+      call_errors = dict((get_key(path), errors[offset + i])
+        for i, path in enumerate(call_paths) if offset + i in errors)
+      offset += len(call_paths)
+      if None in errors:
+        call_errors[None] = errors[None]
+      if call_errors:
+        future.set_exception(SouthboundError(call_errors))
+      else:
+        future.set_result(summary)
+
+class SouthboundClient(object):
+  """Client of the SRv6 southbound API of many routers over a single transport.
+  The calls return a future: None or the summary of a sync, a SouthboundError
+  with the failed paths of the call"""
+
+  def __init__(self, transport="grpc", port=None, username=None, password=None,
+      secure=False, pool_size=POOL_SIZE, batch_size=BATCH_SIZE, batch_delay=BATCH_DELAY):
+    if transport not in TRANSPORTS:
+      raise ValueError("Unknown transport %s" %transport)
+    self.transport, default_port = TRANSPORTS[transport]
+    self.port = port or default_port
+    self.username = username
+    self.password = password
+    self.secure = secure
+    self.pool_size = pool_size
+    self.batch_size = batch_size
+    self.batch_delay = batch_delay
+    # router -> batcher
+    self.routers = {}
+    self.lock = threading.Lock()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *args):
+    self.close()
+
+  def get_batcher(self, router):
+    with self.lock:
+      batcher = self.routers.get(router)
+      if batcher is None:
+        kwargs = {"secure":self.secure}
+        if self.username is not None:
+          kwargs.update(username=self.username, password=self.password)
+        connect = lambda: self.transport(router, self.port, **kwargs)
+        batcher = RouterBatcher(connect, self.pool_size, self.batch_size, self.batch_delay)
+        self.routers[router] = batcher
+      return batcher
+
+  def create(self, router, paths):
+    """Install the paths on the router"""
+    return self.get_batcher(router).submit("create", paths)
+
+  def remove(self, router, paths):
+    """Remove the paths from the router"""
+    return self.get_batcher(router).submit("remove", paths)
+
+  def sync(self, router, paths):
+    """Make the paths the complete state of the router"""
+    return self.get_batcher(router).submit("sync", paths)
+
+  def close(self):
+    """Send the pending calls and close all the connections"""
+    with self.lock:
+      routers = list(self.routers.values())
+      self.routers = {}
+    for batcher in routers:
+      batcher.close()
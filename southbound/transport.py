@@ -0,0 +1,269 @@
+#!/usr/bin/python
+
+import json
+import logging
+import os
+import sys
+
+from xml.sax.saxutils import escape
+
+# The generated gRPC modules live in the folder of the gRPC implementation
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "grpc"))
+
+try:
+  import grpc
+  import srv6_explicit_path_pb2_grpc
+  import srv6_explicit_path_pb2
+except ImportError:
+  grpc = None
+
+try:
+  import requests
+except ImportError:
+  requests = None
+
+try:
+  from netconf import NSMAP
+  from netconf.client import NetconfSSHSession
+  from netconf.error import RPCError
+except ImportError:
+  NetconfSSHSession = None
+
+try:
+  import paramiko
+except ImportError:
+  paramiko = None
+
+# Global variables definition
+
+# logger reference
+logger = logging.getLogger(__name__)
+# Default user and password of NETCONF and SSH
+USER = 'srv6'
+PASSWORD = 'srv6'
+# SSL cerificate for server validation
+CERTIFICATE = 'cert_client.pem'
+# Counters of the summary of a sync
+SUMMARY = ["added", "replaced", "removed", "unchanged", "failed"]
+# gRPC methods
+GRPC_METHODS = {
+  "create":"Create",
+  "remove":"Remove",
+  "sync":"Sync"
+}
+# Base path for the url
+SRV6_BASE_PATH = "srv6-explicit-path"
+# NETCONF operations, sync replaces the whole content
+NETCONF_OPS = {
+  "create":"create",
+  "remove":"remove",
+  "sync":"replace"
+}
+# NETCONF edit-config
+EDIT_CONFIG = """<edit-config xmlns="urn:ietf:params:xml:ns:netconf:base:1.0">
+<target><running/></target>
+<config>
+<srv6-explicit-path operation="%s" xmlns="urn:ietf:params:xml:ns:yang:srv6-explicit-path">
+%s
+</srv6-explicit-path>
+</config>
+</edit-config>"""
+NETCONF_PATH = """<path><destination>%s</destination><sr-path>%s</sr-path>\
+<encapmode>%s</encapmode><device>%s</device></path>"""
+# Subsystem of the persistent SSH sessions
+SSH_SUBSYSTEM = 'srv6'
+# ip commands of the SSH sessions
+SSH_COMMANDS = {
+  "create":"ip -6 route add %(destination)s encap seg6 mode %(encapmode)s segs %(segments)s dev %(device)s",
+  "remove":"ip -6 route del %(destination)s dev %(device)s"
+}
+
+class SouthboundError(Exception):
+  """Failed request, errors maps the (destination, device) of the failed paths
+  to their error (None for the errors of the whole request)"""
+
+  def __init__(self, errors):
+    Exception.__init__(self, format_errors(errors))
+    self.errors = errors
+
+# Build a report of the errors like the servers do
+def format_errors(errors):
+  return "; ".join(error if key is None else "%s dev %s: %s" %(key[0], key[1], error)
+    for key, error in errors.items())
+
+# Parse the report of the servers into position of the path -> error (None for
+# the errors of the whole request). The failed paths are reported in the order
+# of the request as "destination dev device: error", each error goes to the
+# next path with its destination and device
+def parse_errors(message, paths):
+  errors = {}
+  if not message or message == "OK":
+    return errors
+  position = 0
+  for entry in message.split("; "):
+    path, sep, error = entry.partition(": ")
+    dst, _, dev = path.partition(" dev ")
+    match = None
+    if sep:
+      match = next((i for i in range(position, len(paths))
+        if paths[i]['destination'] == dst and dev in ("", paths[i]['device'])), None)
+    if match is not None:
+      errors[match] = error
+      position = match + 1
+    elif None in errors:
+      errors[None] += "; " + entry
+    else:
+      errors[None] = entry
+  return errors
+
+class GRPCTransport(object):
+  """Southbound over gRPC, a channel per connection"""
+
+  def __init__(self, host, port, username=None, password=None, secure=False):
+    if grpc is None:
+      raise SouthboundError({None:"gRPC is not available"})
+    # If secure we need to establish a channel with the secure endpoint
+    if secure:
+      with open(CERTIFICATE) as f:
+        certificate = f.read()
+      credentials = grpc.ssl_channel_credentials(certificate)
+      self.channel = grpc.secure_channel("%s:%s" %(host, port), credentials)
+    else:
+      self.channel = grpc.insecure_channel("%s:%s" %(host, port))
+    self.stub = srv6_explicit_path_pb2_grpc.SRv6ExplicitPathStub(self.channel)
+
+  def close(self):
+    self.channel.close()
+
+  def get_request(self, paths):
+    request = srv6_explicit_path_pb2.SRv6EPRequest()
+    for jpath in paths:
+      path = request.path.add()
+      path.destination = jpath['destination']
+      path.device = jpath['device']
+      path.encapmode = jpath['encapmode']
+      for segment in jpath['segments']:
+        srv6_segment = path.sr_path.add()
+        srv6_segment.segment = segment
+    return request
+
+  def execute(self, operation, paths):
+    """Apply operation to the paths, return the errors by position and the summary
+    of a sync"""
+    reply = getattr(self.stub, GRPC_METHODS[operation])(self.get_request(paths))
+    summary = None
+    if operation == "sync":
+      summary = dict((k, getattr(reply, k)) for k in SUMMARY)
+    return parse_errors(reply.message, paths), summary
+
+class RESTTransport(object):
+  """Southbound over REST, a keep-alive HTTP session per connection"""
+
+  def __init__(self, host, port, username=None, password=None, secure=False):
+    if requests is None:
+      raise SouthboundError({None:"requests is not available"})
+    # IPv6 addresses are enclosed in brackets
+    if ":" in host:
+      host = "[%s]" %host
+    self.url = '{scheme}://{ip}:{port}/{basePath}'.format(scheme=('https' if secure else 'http'),
+      ip=host, port=port, basePath=SRV6_BASE_PATH)
+    self.verify = CERTIFICATE if secure else None
+    self.session = requests.Session()
+
+  def close(self):
+    self.session.close()
+
+  def execute(self, operation, paths):
+    """Apply operation to the paths, return the errors by position and the summary
+    of a sync"""
+    response = self.session.post(self.url, params={"operation": operation},
+      data=json.dumps({"paths": paths}), verify=self.verify,
+      headers={'Accept': "application/json", 'Content-Type': "application/json"})
+    body = response.json() if response.content else {}
+    # The failed paths are reported in the body of an error
+    if response.status_code >= 400 and "message" not in body:
+      raise SouthboundError({None:"%s %s" %(response.status_code, response.reason)})
+    summary = None
+    if operation == "sync":
+      summary = dict((k, body.get(k, 0)) for k in SUMMARY)
+    return parse_errors(body.get("message"), paths), summary
+
+class NetconfTransport(object):
+  """Southbound over NETCONF, a session per connection"""
+
+  def __init__(self, host, port, username=USER, password=PASSWORD, secure=True):
+    if NetconfSSHSession is None:
+      raise SouthboundError({None:"netconf is not available"})
+    self.session = NetconfSSHSession(host, port, username, password)
+
+  def close(self):
+    self.session.close()
+
+  def get_config(self, operation, paths):
+    netconf_paths = []
+    for path in paths:
+      segments = "".join("<srv6-segment>%s</srv6-segment>" %escape(segment)
+        for segment in path['segments'])
+      netconf_paths.append(NETCONF_PATH %(escape(path['destination']), segments,
+        escape(path['encapmode']), escape(path['device'])))
+    return EDIT_CONFIG %(NETCONF_OPS[operation], "\n".join(netconf_paths))
+
+  def execute(self, operation, paths):
+    """Apply operation to the paths, return the errors by position and the summary
+    of a sync"""
+    try:
+      _, reply, _ = self.session.send_rpc(self.get_config(operation, paths))
+    except RPCError as e:
+      messages = e.error.xpath("nc:error-message", namespaces=NSMAP)
+      return parse_errors(messages[0].text if messages else str(e), paths), None
+    summary = None
+    if operation == "sync":
+      # The summary is reported as attributes of the ok
+      ok = reply.xpath("*[local-name()='ok']")
+      attributes = ok[0].attrib if ok else {}
+      summary = dict((k, int(attributes.get(k, 0))) for k in SUMMARY)
+    return {}, summary
+
+class SSHTransport(object):
+  """Southbound over SSH, a persistent session per connection"""
+
+  def __init__(self, host, port, username=USER, password=PASSWORD, secure=True):
+    if paramiko is None:
+      raise SouthboundError({None:"paramiko is not available"})
+    self.client = paramiko.SSHClient()
+    self.client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+    self.client.connect(host, port, username, password, look_for_keys=False,
+      allow_agent=False)
+    # Commands are streamed one per line, each one gets back a status line
+    self.channel = self.client.get_transport().open_session()
+    self.channel.invoke_subsystem(SSH_SUBSYSTEM)
+    self.replies = self.channel.makefile("r")
+
+  def close(self):
+    self.client.close()
+
+  def execute(self, operation, paths):
+    """Apply operation to the paths, return the errors by position"""
+    if operation not in SSH_COMMANDS:
+      raise SouthboundError({None:"%s is not supported over SSH" %operation})
+    commands = []
+    for path in paths:
+      commands.append(SSH_COMMANDS[operation] %dict(path, segments=",".join(path['segments'])))
+    self.channel.sendall("\n".join(commands) + "\n")
+    errors = {}
+    for position in range(len(paths)):
+      reply = self.replies.readline()
+      if not reply:
+        raise EOFError("SSH session closed")
+      status, _, error = reply.strip().partition(" ")
+      if status != "0":
+        errors[position] = error or "exit status %s" %status
+    return errors, None
+
+# Transports and their default port
+TRANSPORTS = {
+  "grpc":(GRPCTransport, 12345),
+  "rest":(RESTTransport, 8080),
+  "netconf":(NetconfTransport, 830),
+  "ssh":(SSHTransport, 220)
+}
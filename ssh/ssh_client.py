@@ -3,6 +3,7 @@
 import sshutil
 
 from sshutil.cmd import SSHCommand
+from sshutil.conn import SSHClientSession
 
 # Utility to close a ssh session
 def close_ssh_session(session):
@@ -32,3 +33,29 @@ for cmd in cmds:
   remoteCmd = SSHCommand(cmd, "127.0.0.1", 220, "srv6", "srv6")
   remoteCmd.run()
   close_ssh_session(remoteCmd)
+
+# Utility to read the status lines of a persistent session
+def read_replies(session, count):
+  data = b""
+  while data.count(b"\n") < count:
+    chunk = session.recv()
+    if not chunk:
+      break
+    data = data + chunk
+  return data.decode().splitlines()
+
+# Let's open a persistent session, the handshake is done only once
+session = SSHClientSession("127.0.0.1", 220, "srv6", "srv6", "srv6")
+# Stream many commands, one per line
+cmds = ["ip -6 route add 4444:%s::2/128 encap seg6 mode inline segs 4444:3::2 dev eth0" %i
+  for i in range(100)]
+session.sendall("\n".join(cmds) + "\n")
+# Each command gets back a status line
+print(read_replies(session, len(cmds)))
+# Now delete them on the same session
+cmds = ["ip -6 route del 4444:%s::2/128 dev eth0" %i for i in range(100)]
+session.sendall("\n".join(cmds) + "\n")
+print(read_replies(session, len(cmds)))
+# Close the session
+session.sendall("exit\n")
+session.close()
@@ -1,22 +1,41 @@
 #!/usr/bin/python
 
 from optparse import OptionParser
-from pyroute2 import IPRoute
 
 import logging
-import time
-import json
 import paramiko
-import SocketServer
 import traceback
 import threading
 import subprocess
 import os
+import socket
+import sys
+
+try:
+  import SocketServer
+except ImportError:
+  import socketserver as SocketServer
+
+# Shared modules live in the root of the project
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from dataplane.metrics import RequestMetrics
+from dataplane.logs import setup_logging
+from dataplane.links import InterfaceCache
+from dataplane.startup import add_dataplane_options, start_dataplane
+from dataplane.iproute import parse_ip_route
+from dataplane.rib import get_key
+from dataplane.batch import RECV_SIZE
 
 # Global variables definition
 
 # Server reference
 ssh_server = None
+# Pool of netlink sockets
+netlink_pool = None
+# Table of the installed routes
+srv6_rib = None
+# Cache of the resolved interfaces
+idxs = InterfaceCache()
 # logger reference
 logger = logging.getLogger(__name__)
 # Server port, user and password
@@ -26,6 +45,24 @@ SSH_PASSWORD = 'srv6'
 SSH_IP = '0.0.0.0'
 # Debug option
 SERVER_DEBUG = False
+# Number of workers programming routes in parallel
+WORKERS = 8
+# Driver programming the routes
+DRIVER = "batch"
+# Interfaces whose routes are managed
+INTERFACES = ["eth0"]
+# Port of the metrics endpoint, disabled if None
+METRICS_PORT = None
+# Audit log of the applied route operations, disabled if None
+AUDIT_LOG = None
+# Run every command in a shell instead of programming the routes in-process
+SHELL = False
+# Subsystem of the persistent sessions
+SESSION_SUBSYSTEM = 'srv6'
+# Seconds a transport without channels is kept open
+IDLE_TIMEOUT = 20
+# Seconds the client has to close an exec channel
+CLOSE_TIMEOUT = 5
 # Closing message
 CLOSING_MESSAGE = "\r\nbye\r\n"
 
@@ -55,6 +92,9 @@ class SSHRequestHandler(paramiko.ServerInterface):
   def __init__(self, key_handler):
     self.event = threading.Event()
     self.key_handler = key_handler
+    # Open channels, the transport keeps only weak references to them
+    self.channels = {}
+    self.lock = threading.Lock()
 
   def check_channel_request(self, kind, chanid):
     # We support only session
@@ -72,19 +112,167 @@ class SSHRequestHandler(paramiko.ServerInterface):
     return 'password'
 
   def check_channel_exec_request(self, channel, command):
+    # The command is received as bytes
+    if not isinstance(command, str):
+      command = command.decode("utf-8", "replace")
     logger.debug("Cmd received:%s", command)
+    # Channels of the same transport run in parallel
+    self.start_channel(channel, self.run_exec, command)
+    return True
+
+  def check_channel_subsystem_request(self, channel, name):
+    # Persistent session, one command per line
+    if name != SESSION_SUBSYSTEM:
+      return False
+    logger.debug("Session opened")
+    self.start_channel(channel, self.run_session)
+    return True
+
+  def check_channel_shell_request(self, channel):
+    # An interactive shell is served as a persistent session
+    logger.debug("Shell opened")
+    self.start_channel(channel, self.run_session)
+    return True
+
+  def check_channel_pty_request(self, channel, term, width, height,
+      pixelwidth, pixelheight, modes):
+    return True
+
+  def add_channel(self, channel):
+    with self.lock:
+      self.channels[channel.get_id()] = channel
+
+  def start_channel(self, channel, target, *args):
+    # Registered before its thread starts, which may end at any time
+    self.add_channel(channel)
+    thread = threading.Thread(target=self.serve_channel, args=(channel, target, args))
+    thread.daemon = True
+    thread.start()
+
+  def serve_channel(self, channel, target, args):
+    try:
+      target(channel, *args)
+    except EOFError:
+      logger.debug("Transport closed by the client")
+    except Exception as e:
+      traceback.print_exc()
+    finally:
+      try:
+        channel.close()
+      except EOFError:
+        pass
+      finally:
+        with self.lock:
+          self.channels.pop(channel.get_id(), None)
+
+  def run_exec(self, channel, command):
     exit_status = 0
-    # Let's parse the command and then executes it
-    commands = command.split(";")
     # It could be a sequence of commands chained with ';'
-    for command in commands:
-      exit_status =  exit_status + subprocess.call(command, shell=True)
+    for status, error in self.run_commands(command.split(";")):
+      if error:
+        channel.send_stderr("RTNETLINK answers: %s\n" %error)
+      exit_status = exit_status + status
     # Let's send the sum of the status
     channel.send_exit_status(exit_status)
-    # Let's set the event and return true for the happy ending
-    self.event.set()
+    # The reply to the request may still be on its way, the client closes first
+    channel.shutdown_write()
+    channel.settimeout(CLOSE_TIMEOUT)
+    try:
+      while channel.recv(RECV_SIZE):
+        pass
+    except socket.timeout:
+      logger.debug("Channel not closed by the client")
+
+  def run_session(self, channel):
+    # Commands of the same read are programmed together, each line gets
+    # back a "status [error]" line
+    data = b""
+    while True:
+      received = channel.recv(RECV_SIZE)
+      if not received:
+        break
+      data = data + received
+      lines = data.split(b"\n")
+      data = lines.pop()
+      commands = []
+      closing = False
+      for line in lines:
+        command = line.decode("utf-8", "replace").strip()
+        if command in ("exit", "quit"):
+          closing = True
+          break
+        # Empty lines are ignored
+        if command:
+          commands.append(command)
+      replies = ["%s %s" %(status, error) if error else str(status)
+        for status, error in self.run_commands(commands)]
+      if replies:
+        channel.sendall("\n".join(replies) + "\n")
+      if closing:
+        break
+    logger.debug("Session closed")
+    channel.send_exit_status(0)
+
+  def run_commands(self, commands):
+    # Return one (status, error) per command
+    replies = []
+    # Consecutive ip route commands are programmed in a single batch
+    batch = []
+    # Routes added by the batch
+    added = set()
+    for command in commands:
+      route = None if SHELL else parse_ip_route(command)
+      if route is not None and self.is_managed(route, added):
+        batch.append(route)
+        continue
+      # Keep the order with the commands running in the shell
+      replies.extend(self.program_routes(batch))
+      batch = []
+      added.clear()
+      with RequestMetrics("ssh", "shell", 0) as request_metrics:
+        status = subprocess.call(command, shell=True)
+        request_metrics.failed = status != 0
+      replies.append((status, ""))
+    replies.extend(self.program_routes(batch))
+    return replies
+
+  def is_managed(self, route, added):
+    # Only the seg6 routes of the managed devices are programmed in-process,
+    # removals only if the route is in the table: ip handles the rest
+    op, path = route
+    key = get_key(path)
+    if not srv6_rib.managed(key):
+      return False
+    if op == "del":
+      return key in srv6_rib.routes or key in added
+    added.add(key)
     return True
 
+  def program_routes(self, batch):
+    # Nothing to program
+    if not batch:
+      return []
+    replies = []
+    # Batches mixing additions and removals are measured apart
+    ops = set(op for op, _ in batch)
+    with RequestMetrics("ssh", ops.pop() if len(ops) == 1 else "mixed",
+        len(batch)) as request_metrics:
+      # Same errors of ip
+      results = srv6_rib.apply(batch, strict=True)
+      request_metrics.failed = any(results)
+    # Report the failures like ip does
+    for (op, path), result in zip(batch, results):
+      if result != 0:
+        logger.error("%s %s failed: %s", op, path['dst'], os.strerror(result))
+        replies.append((2, os.strerror(result)))
+      else:
+        replies.append((0, ""))
+    return replies
+
+  def is_idle(self):
+    with self.lock:
+      return not self.channels
+
 class TransportRequestHandler(SocketServer.StreamRequestHandler):
   """ Implements transport request handler """
 
@@ -102,21 +290,13 @@ class TransportRequestHandler(SocketServer.StreamRequestHandler):
       except paramiko.SSHException:
           logger.info("SSH negotiation failed")
           return
-      # Wait for auth with user and pswd
-      while True:
-        chan = t.accept(20)
-        if chan is None:
-            t.close()
-            logger.info("SSH connection timeout")
-            return
-        # Waiting for commands
-        server.event.wait(10)
-        if not server.event.is_set():
-          t.close()
-          logger.info("SSH command timeout")
+      # The transport stays up as long as it opens channels, they are
+      # registered when their request starts
+      while t.is_active():
+        chan = t.accept(IDLE_TIMEOUT)
+        if chan is None and server.is_idle():
+          logger.info("SSH connection timeout")
           return
-        server.event.clear()
-        chan.close()
     except Exception as e:
       traceback.print_exc()
     finally:
@@ -127,8 +307,8 @@ class TransportRequestHandler(SocketServer.StreamRequestHandler):
 
 # Start netconf server
 def start_server():
-  # Configure SSH server listener
-  global ssh_server
+  # Configure SSH server listener and netlink
+  global ssh_server, netlink_pool, srv6_rib
   # Setup SSH
   if ssh_server is not None:
     logger.error("SSH Server is already up and running")
@@ -136,21 +316,35 @@ def start_server():
     ssh_server = SocketServer.ThreadingTCPServer((SSH_IP, SSH_PORT),
       TransportRequestHandler)
     ssh_server.key_handler = SSHKeyHandler()
+  # Setup the interfaces, the driver programming the routes and the table of the installed routes
+  netlink_pool, srv6_rib = start_dataplane(idxs, DRIVER, WORKERS, METRICS_PORT, AUDIT_LOG,
+    INTERFACES)
   # Start the loop for SSH
   logger.info("Listening Server")
   ssh_server.serve_forever()
 
 # Parse options
 def parse_options():
+  global WORKERS, DRIVER, INTERFACES, METRICS_PORT, AUDIT_LOG, SHELL
   parser = OptionParser()
   parser.add_option("-d", "--debug", action="store_true", help="Activate debug logs")
+  add_dataplane_options(parser, WORKERS, DRIVER, INTERFACES)
+  parser.add_option("-x", "--shell", action="store_true",
+                    help="Run every command in a shell")
   # Parse input parameters
   (options, args) = parser.parse_args()
+  # Setup the number of workers and the execution of the commands
+  WORKERS = options.workers
+  DRIVER = options.driver
+  INTERFACES = options.interfaces.split(",")
+  METRICS_PORT = options.metrics_port
+  AUDIT_LOG = options.audit
+  SHELL = options.shell
   # Setup properly the logger
   if options.debug:
-    logging.basicConfig(level=logging.DEBUG)
+    setup_logging(logging.DEBUG)
   else:
-    logging.basicConfig(level=logging.INFO)
+    setup_logging(logging.INFO)
   SERVER_DEBUG = logger.getEffectiveLevel() == logging.DEBUG
   logger.info("SERVER_DEBUG:" + str(SERVER_DEBUG))
 
@@ -0,0 +1,184 @@
+#!/usr/bin/python
+
+import errno
+import os
+import socket
+import struct
+import sys
+import unittest
+
+# Shared modules live in the root of the project
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from dataplane import batch
+from dataplane.batch import NetlinkBatch, encode_route, encode_seg6, format_errors
+
+# Build a path
+def get_path(dst, segs=("fcff::1",), dev="eth0", encapmode="encap"):
+  return {'dst':dst, 'dev':dev, 'encapmode':encapmode, 'segs':list(segs)}
+
+# Split attributes into type -> payload
+def parse_nlas(data):
+  nlas = {}
+  offset = 0
+  while offset < len(data):
+    length, nla_type = batch.NLA_HDR.unpack_from(data, offset)
+    nlas[nla_type] = data[offset + batch.NLA_HDR.size:offset + length]
+    offset += (length + 3) & ~3
+  return nlas
+
+# Split a batch into its messages
+def parse_msgs(data):
+  msgs = []
+  offset = 0
+  while offset < len(data):
+    length = batch.NLMSG_HDR.unpack_from(data, offset)[0]
+    msgs.append(data[offset:offset + length])
+    offset += (length + 3) & ~3
+  return msgs
+
+class EncodeTest(unittest.TestCase):
+
+  def test_seg6_encap(self):
+    nlas = parse_nlas(encode_seg6("encap", ["fcff::1", "fcff::2"]))
+    data = nlas[batch.SEG6_IPTUNNEL_SRH]
+    self.assertEqual(struct.unpack_from("=i", data)[0], batch.SEG6_MODES["encap"])
+    # Length in units of 8 bytes, the last segment first
+    self.assertEqual(batch.SRH.unpack_from(data, 4), (0, 4, 4, 1, 1, 0, 0))
+    self.assertEqual(data[4 + batch.SRH.size:], socket.inet_pton(socket.AF_INET6, "fcff::2") +
+      socket.inet_pton(socket.AF_INET6, "fcff::1"))
+
+  def test_seg6_inline(self):
+    data = parse_nlas(encode_seg6("inline", ["fcff::1"]))[batch.SEG6_IPTUNNEL_SRH]
+    self.assertEqual(struct.unpack_from("=i", data)[0], batch.SEG6_MODES["inline"])
+    # A slot is kept for the original destination
+    self.assertEqual(batch.SRH.unpack_from(data, 4), (0, 4, 4, 1, 1, 0, 0))
+    self.assertEqual(data[4 + batch.SRH.size:], b"\0" * 16 +
+      socket.inet_pton(socket.AF_INET6, "fcff::1"))
+
+  def test_seg6_invalid(self):
+    self.assertRaises(ValueError, encode_seg6, "encap", [])
+    self.assertRaises(KeyError, encode_seg6, "bogus", ["fcff::1"])
+    self.assertRaises((socket.error, ValueError), encode_seg6, "encap", ["fcff::zz"])
+
+  def test_route_add(self):
+    msg = encode_route("add", get_path("fcf0::/64", ["fcff::1", "fcff::2"]), 2, 7)
+    length, msg_type, flags, seq, pid = batch.NLMSG_HDR.unpack_from(msg)
+    self.assertEqual((length, msg_type, flags, seq, pid),
+      (len(msg), batch.RTM_NEWROUTE, batch.OPS["add"][1], 7, 0))
+    rtmsg = batch.RTMSG.unpack_from(msg, batch.NLMSG_HDR.size)
+    self.assertEqual(rtmsg, (socket.AF_INET6, 64, 0, 0, batch.RT_TABLE_MAIN,
+      batch.RTPROT_STATIC, batch.RT_SCOPE_UNIVERSE, batch.RTN_UNICAST, 0))
+    nlas = parse_nlas(msg[batch.NLMSG_HDR.size + batch.RTMSG.size:])
+    self.assertEqual(nlas[batch.RTA_DST], socket.inet_pton(socket.AF_INET6, "fcf0::"))
+    self.assertEqual(nlas[batch.RTA_OIF], struct.pack("=I", 2))
+    self.assertEqual(nlas[batch.RTA_ENCAP_TYPE], struct.pack("=H", batch.LWTUNNEL_ENCAP_SEG6))
+    self.assertEqual(nlas[batch.RTA_ENCAP], encode_seg6("encap", ["fcff::1", "fcff::2"]))
+
+  def test_route_del(self):
+    msg = encode_route("del", {'dst':"fcf0::1", 'dev':"eth0"}, 2, 8)
+    self.assertEqual(batch.NLMSG_HDR.unpack_from(msg)[1:3],
+      (batch.RTM_DELROUTE, batch.OPS["del"][1]))
+    # Host route without the length
+    self.assertEqual(batch.RTMSG.unpack_from(msg, batch.NLMSG_HDR.size)[1], 128)
+    nlas = parse_nlas(msg[batch.NLMSG_HDR.size + batch.RTMSG.size:])
+    self.assertEqual(sorted(nlas), [batch.RTA_DST, batch.RTA_OIF])
+
+  def test_route_invalid(self):
+    self.assertRaises(ValueError, encode_route, "add", get_path("fcf0::/129"), 2, 1)
+    self.assertRaises(ValueError, encode_route, "add", get_path("fcf0::/-1"), 2, 1)
+    self.assertRaises(ValueError, encode_route, "add", get_path("fcf0::/abc"), 2, 1)
+    self.assertRaises((socket.error, ValueError), encode_route, "add", get_path("fcf0::zz/64"), 2, 1)
+    self.assertRaises(KeyError, encode_route, "add", {'dst':"fcf0::/64", 'dev':"eth0"}, 2, 1)
+
+class FormatErrorsTest(unittest.TestCase):
+
+  def test_errors(self):
+    paths = [get_path("fcf0::/64"), get_path("fcf1::/64", dev="eth9")]
+    self.assertEqual(format_errors(paths, [0, 0]), "")
+    self.assertEqual(format_errors(paths, [errno.EEXIST, errno.ENODEV]),
+      "fcf0::/64 dev eth0: %s; fcf1::/64 dev eth9: %s" %(os.strerror(errno.EEXIST),
+      os.strerror(errno.ENODEV)))
+
+  def test_removals(self):
+    summary = {"added":0, "replaced":0, "removed":0, "unchanged":0, "failed":3}
+    self.assertEqual(format_errors([get_path("fcf0::/64")], [errno.ENODEV], summary),
+      "fcf0::/64 dev eth0: %s; 2 removals failed" %os.strerror(errno.ENODEV))
+
+class FakeSocket(object):
+  """Netlink socket answering every message with the errno of its destination,
+  the send of the chunk number fail raises ENOBUFS"""
+
+  def __init__(self, errors, fail=None):
+    self.errors = errors
+    self.fail = fail
+    self.sent = []
+    self.acks = []
+    self.closed = False
+
+  def send(self, data):
+    if len(self.sent) == self.fail:
+      raise socket.error(errno.ENOBUFS, os.strerror(errno.ENOBUFS))
+    self.sent.append(data)
+    for msg in parse_msgs(data):
+      seq = batch.NLMSG_HDR.unpack_from(msg)[3]
+      dst = parse_nlas(msg[batch.NLMSG_HDR.size + batch.RTMSG.size:])[batch.RTA_DST]
+      error = self.errors.get(socket.inet_ntop(socket.AF_INET6, dst), 0)
+      # Acks carry the header of the request
+      ack = batch.NLMSG_ERRNO.pack(-error) + msg[:batch.NLMSG_HDR.size]
+      self.acks.append(batch.NLMSG_HDR.pack(batch.NLMSG_HDR.size + len(ack),
+        batch.NLMSG_ERROR, 0, seq, 0) + ack)
+    return len(data)
+
+  def recv(self, size):
+    acks = b"".join(self.acks)
+    self.acks = []
+    return acks
+
+  def close(self):
+    self.closed = True
+
+class FakeNetlinkBatch(NetlinkBatch):
+  """Batch sending on fake sockets, the new ones are taken from sockets"""
+
+  def __init__(self, idxs, sockets, max_batch_size=batch.MAX_BATCH_SIZE):
+    self.sockets = list(sockets)
+    NetlinkBatch.__init__(self, idxs, max_batch_size)
+
+  def open(self):
+    return self.sockets.pop(0)
+
+class NetlinkBatchTest(unittest.TestCase):
+
+  def test_execute(self):
+    nl = FakeSocket({"fcf1::":errno.EEXIST})
+    engine = FakeNetlinkBatch({"eth0":2}, [nl])
+    results = engine.execute([("add", get_path("fcf0::/64")), ("add", get_path("fcf1::/64")),
+      ("add", get_path("fcf2::/64", dev="eth9")), ("add", get_path("fcf3::zz/64")),
+      ("del", {'dst':"fcf4::/64", 'dev':"eth0"})])
+    self.assertEqual(results, [0, errno.EEXIST, errno.ENODEV, errno.EINVAL, 0])
+    # A single send for the valid paths
+    self.assertEqual(len(nl.sent), 1)
+    self.assertEqual(len(parse_msgs(nl.sent[0])), 3)
+
+  def test_chunks(self):
+    nl = FakeSocket({})
+    engine = FakeNetlinkBatch({"eth0":2}, [nl], max_batch_size=1)
+    paths = [get_path("fcf%x::/64" %i) for i in range(3)]
+    self.assertEqual(engine.route("add", paths), [0] * 3)
+    self.assertEqual(len(nl.sent), 3)
+
+  def test_socket_error(self):
+    # The second chunk cannot be sent
+    nl = FakeSocket({}, fail=1)
+    new = FakeSocket({})
+    engine = FakeNetlinkBatch({"eth0":2}, [nl, new], max_batch_size=1)
+    paths = [get_path("fcf%x::/64" %i) for i in range(3)]
+    self.assertEqual(engine.route("add", paths), [0, errno.ENOBUFS, errno.ENOBUFS])
+    # The socket is replaced, the next requests use the new one
+    self.assertTrue(nl.closed)
+    self.assertEqual(engine.route("add", paths[1:]), [0, 0])
+    self.assertEqual(len(new.sent), 2)
+
+if __name__ == "__main__":
+  unittest.main()
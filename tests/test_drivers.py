@@ -0,0 +1,46 @@
+#!/usr/bin/python
+
+import errno
+import os
+import sys
+import unittest
+
+# Shared modules live in the root of the project
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from dataplane.drivers import MemoryDriver
+
+# Build a path
+def get_path(dst, segs=("fcff::1",), dev="eth0", encapmode="encap"):
+  return {'dst':dst, 'dev':dev, 'encapmode':encapmode, 'segs':list(segs)}
+
+class MemoryDriverTest(unittest.TestCase):
+
+  def setUp(self):
+    self.driver = MemoryDriver({"eth0":2})
+
+  def test_route(self):
+    self.assertEqual(self.driver.route("add", [get_path("fcf0::/64")]), [0])
+    self.assertEqual(self.driver.route("add", [get_path("fcf0::/64")]), [errno.EEXIST])
+    self.assertEqual(self.driver.route("replace", [get_path("fcf0::/64", ["fcff::2"])]), [0])
+    self.assertEqual(self.driver.routes, {("fcf0::/64", "eth0"):("encap", ("fcff::2",))})
+    self.assertEqual(self.driver.route("del", [{'dst':"fcf0::/64", 'dev':"eth0"}]), [0])
+    self.assertEqual(self.driver.route("del", [{'dst':"fcf0::/64", 'dev':"eth0"}]), [errno.ESRCH])
+
+  def test_normalized(self):
+    # Keyed like the kernel
+    self.driver.route("add", [get_path("fcf0::1/64")])
+    self.assertEqual(self.driver.route("add", [get_path("FCF0::/64")]), [errno.EEXIST])
+
+  def test_unknown_device(self):
+    self.assertEqual(self.driver.route("add", [get_path("fcf0::/64", dev="eth9")]), [errno.ENODEV])
+
+  def test_invalid(self):
+    paths = [get_path("fcf0::zz/64"), get_path("fcf0::/129"), get_path("fcf0::/64", []),
+      get_path("fcf0::/64", ["fcff::zz"]), get_path("fcf0::/64", encapmode="bogus")]
+    self.assertEqual(self.driver.route("add", paths), [errno.EINVAL] * len(paths))
+    self.assertEqual(self.driver.routes, {})
+    self.assertEqual(self.driver.operations, len(paths))
+
+if __name__ == "__main__":
+  unittest.main()
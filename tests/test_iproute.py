@@ -0,0 +1,46 @@
+#!/usr/bin/python
+
+import os
+import sys
+import unittest
+
+# Shared modules live in the root of the project
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from dataplane.iproute import parse_ip_route
+
+class ParseIPRouteTest(unittest.TestCase):
+
+  def test_add(self):
+    self.assertEqual(parse_ip_route("ip -6 route add 2222:4::2/128 encap seg6 mode inline "
+      "segs 2222:3::2 dev eth0"), ("add", {'dst':"2222:4::2/128", 'dev':"eth0",
+      'encapmode':"inline", 'segs':["2222:3::2"]}))
+
+  def test_replace(self):
+    self.assertEqual(parse_ip_route("/sbin/ip -6 route replace 2222:4::/64 dev eth1 encap "
+      "seg6 mode encap segs 2222:3::2,2222:2::2"), ("replace", {'dst':"2222:4::/64",
+      'dev':"eth1", 'encapmode':"encap", 'segs':["2222:3::2", "2222:2::2"]}))
+
+  def test_del(self):
+    self.assertEqual(parse_ip_route("ip -6 route del 2222:4::2/128 dev eth0"),
+      ("del", {'dst':"2222:4::2/128", 'dev':"eth0"}))
+    self.assertEqual(parse_ip_route("ip -6 route delete 2222:4::2/128 dev eth0")[0], "del")
+
+  def test_host_route(self):
+    # ip assumes a host route without the length
+    self.assertEqual(parse_ip_route("ip -6 route del 2222:4::2 dev eth0"),
+      ("del", {'dst':"2222:4::2/128", 'dev':"eth0"}))
+
+  def test_unsupported(self):
+    for command in ("ip -6 route show", "ip route add 10.0.0.0/8 dev eth0",
+        "ip -6 addr add 2222:4::2/64 dev eth0", "ip -6 route add 2222:4::/64 via fe80::1 dev eth0",
+        "ip -6 route add 2222:4::/64 dev eth0", "ip -6 route del 2222:4::/64",
+        "ip -6 route add 2222:4::/64 encap seg6 mode encap dev eth0",
+        "ip -6 route add 2222:4::/64 encap seg6 mode encap segs 2222:3::2 dev",
+        "ip -6 route add 2222:4::/64 encap seg6local action End dev eth0",
+        "ip -6 route add 2222:4::/64 encap seg6 mode encap segs 2222:3::2 dev eth0 metric 10",
+        "sysctl -w net.ipv6.conf.all.forwarding=1", ""):
+      self.assertEqual(parse_ip_route(command), None, command)
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,74 @@
+#!/usr/bin/python
+
+import os
+import sys
+import unittest
+
+# The parser lives in the topology folder
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "topology"))
+
+from lsdb import LSDB
+
+# Entry of the route database, like ospf6d prints it
+ROUTE = """Destination: %s
+Destination type: Network
+Installed Time: 00:10:00 ago
+Associated Area: 0.0.0.0
+Path Type: Intra-Area
+LS Origin: Intra-Prefix Id: %s Adv: %s
+Metric: 10 (0)
+Nexthop:
+  fe80::1 eth0
+
+"""
+# Entry of the network database, like ospf6d prints it
+NETWORK = """Age:  600 Type: Network
+Link State ID: %s
+Advertising Router: %s
+LS Sequence Number: 0x80000002
+    Options: --|R|-|--|E|V6
+%s
+"""
+
+# Build the network entry of the attached routers
+def network(link_state_id, adv_router, *routers):
+  return NETWORK %(link_state_id, adv_router,
+    "".join("    Attached Router: %s\n" %router for router in routers))
+
+class LSDBTest(unittest.TestCase):
+
+  def setUp(self):
+    self.lsdb = LSDB()
+    # A transit network between the two routers and a stub network each
+    self.lsdb.parse_route_details(ROUTE %("fcf0::/64", "0.0.0.1", "1.0.0.1") +
+      ROUTE %("fcf4:1::/64", "0.0.1.1", "1.0.0.1") +
+      ROUTE %("fcf4:2::/64", "0.0.1.2", "1.0.0.2"))
+
+  def test_route_details(self):
+    self.assertEqual(self.lsdb.nodes, set(["1.0.0.1", "1.0.0.2"]))
+    self.assertEqual(self.lsdb.net_id_to_net_prefix, {("0.0.0.1", "1.0.0.1"):"fcf0::/64",
+      ("0.0.1.1", "1.0.0.1"):"fcf4:1::/64", ("0.0.1.2", "1.0.0.2"):"fcf4:2::/64"})
+    self.assertEqual(self.lsdb.stub_networks, {"fcf0::/64":set(["1.0.0.1"]),
+      "fcf4:1::/64":set(["1.0.0.1"]), "fcf4:2::/64":set(["1.0.0.2"])})
+
+  def test_network_details(self):
+    self.lsdb.parse_network_details(network("0.0.0.1", "1.0.0.1", "1.0.0.1", "1.0.0.2") +
+      # Not in the route database, no longer reachable
+      network("0.0.0.9", "1.0.0.9", "1.0.0.9", "1.0.0.2"))
+    self.assertEqual(self.lsdb.stub_networks, {"fcf0::/64":set(["1.0.0.1", "1.0.0.2"]),
+      "fcf4:1::/64":set(["1.0.0.1"]), "fcf4:2::/64":set(["1.0.0.2"])})
+    self.assertEqual(self.lsdb.nodes, set(["1.0.0.1", "1.0.0.2"]))
+
+  def test_crlf(self):
+    lsdb = LSDB()
+    lsdb.parse_route_details((ROUTE %("fcf0::/64", "0.0.0.1", "1.0.0.1")).replace("\n", "\r\n"))
+    self.assertEqual(lsdb.stub_networks, {"fcf0::/64":set(["1.0.0.1"])})
+
+  def test_empty(self):
+    lsdb = LSDB()
+    lsdb.parse_route_details("")
+    lsdb.parse_network_details("")
+    self.assertEqual((lsdb.stub_networks, lsdb.nodes), ({}, set()))
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,131 @@
+#!/usr/bin/python
+
+import errno
+import io
+import os
+import sys
+import unittest
+
+# Shared modules live in the root of the project, the server in the netconf folder
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "netconf"))
+
+from dataplane.drivers import MemoryDriver
+from dataplane.rib import SRv6RIB
+
+try:
+  import netconf_server
+  from netconf import error
+  from netconf_server import NS, SRv6EPParser, apply_srv6_ep
+except ImportError:
+  # The netconf library is not installed
+  netconf_server = None
+
+# Build a path of the edit-config
+def get_path(destination, segments=("fcff::1",), device="eth0", encapmode="encap"):
+  return "".join(["<path><destination>%s</destination><sr-path>" %destination] +
+    ["<srv6-segment>%s</srv6-segment>" %segment for segment in segments] +
+    ["</sr-path><encapmode>%s</encapmode><device>%s</device></path>" %(encapmode, device)])
+
+# Build an edit-config of the srv6-explicit-path with the given paths
+def get_msg(operation, *paths):
+  return ('<rpc message-id="1" xmlns="%s"><edit-config><target><running/></target><config>'
+    '<srv6-explicit-path operation="%s" xmlns="%s">%s</srv6-explicit-path></config>'
+    '</edit-config></rpc>' %(NS["nc"], operation, NS["srv6"], "".join(paths)))
+
+@unittest.skipIf(netconf_server is None, "netconf is not available")
+class SRv6EPParserTest(unittest.TestCase):
+
+  def setUp(self):
+    self.msg = get_msg("create", get_path("fcf0::/64", ["fcff::1", "fcff::2"]),
+      get_path("fcf1::/64", device="eth1", encapmode="inline"))
+    self.paths = [{'dst':"fcf0::/64", 'dev':"eth0", 'encapmode':"encap",
+      'segs':["fcff::1", "fcff::2"]}, {'dst':"fcf1::/64", 'dev':"eth1", 'encapmode':"inline",
+      'segs':["fcff::1"]}]
+
+  def test_parse(self):
+    parser = SRv6EPParser()
+    parser.parse(self.msg)
+    self.assertEqual(parser.rpc.tag, "{%s}rpc" %NS["nc"])
+    self.assertEqual(parser.srv6_ep.get("operation"), "create")
+    self.assertEqual(parser.paths, self.paths)
+    # The paths are freed once parsed
+    self.assertEqual(len(parser.srv6_ep), 0)
+
+  def test_parse_etree(self):
+    parser = SRv6EPParser()
+    parser.parse_etree(io.BytesIO(self.msg.encode('utf-8')))
+    self.assertEqual(parser.paths, self.paths)
+
+  def test_other_rpc(self):
+    # Paths outside of an edit-config are not taken
+    msg = ('<rpc message-id="1" xmlns="%s"><get-config><source><running/></source>'
+      '<filter><srv6-explicit-path xmlns="%s">%s</srv6-explicit-path></filter></get-config>'
+      '</rpc>' %(NS["nc"], NS["srv6"], get_path("fcf0::/64")))
+    parser = SRv6EPParser()
+    parser.parse(msg)
+    self.assertEqual(parser.srv6_ep, None)
+    self.assertEqual(parser.paths, [])
+
+@unittest.skipIf(netconf_server is None, "netconf is not available")
+class ApplySRv6EPTest(unittest.TestCase):
+
+  def setUp(self):
+    self.driver = MemoryDriver({"eth0":2})
+    netconf_server.srv6_rib = SRv6RIB(self.driver)
+
+  def tearDown(self):
+    netconf_server.srv6_rib = None
+
+  def test_create(self):
+    rpc, reply = apply_srv6_ep(get_msg("create", get_path("fcf0::/64")))
+    self.assertEqual(reply.tag, "ok")
+    self.assertEqual(self.driver.routes, {("fcf0::/64", "eth0"):("encap", ("fcff::1",))})
+
+  def test_remove(self):
+    apply_srv6_ep(get_msg("create", get_path("fcf0::/64")))
+    # Removals need destination and device only
+    apply_srv6_ep(get_msg("remove", "<path><destination>fcf0::/64</destination>"
+      "<device>eth0</device></path>"))
+    self.assertEqual(self.driver.routes, {})
+
+  def test_replace(self):
+    apply_srv6_ep(get_msg("create", get_path("fcf0::/64"), get_path("fcf1::/64")))
+    rpc, reply = apply_srv6_ep(get_msg("replace", get_path("fcf0::/64"), get_path("fcf2::/64")))
+    self.assertEqual(dict(reply.attrib), {"added":"1", "replaced":"0", "removed":"1",
+      "unchanged":"1", "failed":"0"})
+    self.assertEqual(sorted(self.driver.routes), [("fcf0::/64", "eth0"), ("fcf2::/64", "eth0")])
+
+  def test_failed(self):
+    try:
+      apply_srv6_ep(get_msg("create", get_path("fcf0::/64"), get_path("fcf1::/64", device="eth9")))
+      self.fail("RPCServerError not raised")
+    except error.RPCServerError as e:
+      message = "fcf1::/64 dev eth9: %s" %os.strerror(errno.ENODEV)
+      self.assertTrue(message in str(e.get_reply_msg()))
+    self.assertEqual(list(self.driver.routes), [("fcf0::/64", "eth0")])
+
+  def test_missing_leaf(self):
+    msg = get_msg("create", get_path("fcf0::/64"), "<path><destination>fcf1::/64"
+      "</destination><device>eth0</device></path>")
+    self.assertRaises(error.RPCServerError, apply_srv6_ep, msg)
+    # Nothing is applied
+    self.assertEqual(self.driver.operations, 0)
+
+  def test_malformed(self):
+    self.assertRaises(error.RPCServerError, apply_srv6_ep,
+      get_msg("create", get_path("fcf0::/64"))[:-20])
+    self.assertEqual(self.driver.operations, 0)
+
+  def test_unknown_operation(self):
+    self.assertRaises(error.RPCServerError, apply_srv6_ep, get_msg("merge", get_path("fcf0::/64")))
+    self.assertEqual(self.driver.operations, 0)
+
+  def test_other_rpc(self):
+    msg = '<rpc message-id="1" xmlns="%s"><get-config><source><running/></source></get-config>' \
+      '</rpc>' %NS["nc"]
+    rpc, reply = apply_srv6_ep(msg)
+    self.assertEqual(reply, None)
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,189 @@
+#!/usr/bin/python
+
+import errno
+import os
+import sys
+import unittest
+
+# Shared modules live in the root of the project
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from dataplane.drivers import MemoryDriver
+from dataplane.rib import SRv6RIB, MalformedPath, get_summary, normalize_prefix
+
+# Interfaces known to the driver
+IDXS = {"eth0":2, "eth1":3}
+
+# Build a path
+def get_path(dst, segs=("fcff::1",), dev="eth0", encapmode="encap"):
+  return {'dst':dst, 'dev':dev, 'encapmode':encapmode, 'segs':list(segs)}
+
+# Build a summary with the given counters
+def summary(**counters):
+  result = get_summary()
+  result.update(counters)
+  return result
+
+class NormalizePrefixTest(unittest.TestCase):
+
+  def test_compressed(self):
+    self.assertEqual(normalize_prefix("FCF0:0:0:0::/64"), "fcf0::/64")
+
+  def test_host_route(self):
+    self.assertEqual(normalize_prefix("fcf0::1"), "fcf0::1/128")
+    self.assertEqual(normalize_prefix("fcf0::1/128"), "fcf0::1/128")
+
+  def test_host_bits(self):
+    self.assertEqual(normalize_prefix("fcf0::1/64"), "fcf0::/64")
+    self.assertEqual(normalize_prefix("fcf0::c000/113"), "fcf0::8000/113")
+    self.assertEqual(normalize_prefix("fcf0::8000/113"), "fcf0::8000/113")
+    self.assertEqual(normalize_prefix("fcf0::1/0"), "::/0")
+
+  def test_malformed(self):
+    # Kept for the engine to reject
+    self.assertEqual(normalize_prefix("fcf0::zz/64"), "fcf0::zz/64")
+    self.assertEqual(normalize_prefix("fcf0::zz"), "fcf0::zz/128")
+    self.assertEqual(normalize_prefix("fcf0::/abc"), "fcf0::/abc")
+
+class SRv6RIBTest(unittest.TestCase):
+
+  def setUp(self):
+    self.driver = MemoryDriver(IDXS)
+    self.rib = SRv6RIB(self.driver)
+
+  def test_add(self):
+    self.assertEqual(self.rib.route("add", [get_path("fcf0::/64")]), [0])
+    self.assertEqual(self.rib.routes, {("fcf0::/64", "eth0"):("encap", ("fcff::1",))})
+    self.assertEqual(list(self.driver.records), [("add", get_path("fcf0::/64"))])
+
+  def test_add_unchanged(self):
+    self.rib.route("add", [get_path("fcf0::/64")])
+    # The same route, written differently, does not reach the kernel
+    self.assertEqual(self.rib.route("add", [get_path("fcf0:0::1/64")]), [0])
+    self.assertEqual(self.driver.operations, 1)
+
+  def test_change(self):
+    self.rib.route("add", [get_path("fcf0::/64")])
+    self.assertEqual(self.rib.route("add", [get_path("fcf0::/64", ["fcff::2"])]), [0])
+    self.assertEqual(self.driver.records[-1], ("replace", get_path("fcf0::/64", ["fcff::2"])))
+    self.assertEqual(self.rib.routes[("fcf0::/64", "eth0")], ("encap", ("fcff::2",)))
+
+  def test_del(self):
+    self.rib.route("add", [get_path("fcf0::/64")])
+    self.assertEqual(self.rib.route("del", [{'dst':"fcf0::/64", 'dev':"eth0"}]), [0])
+    self.assertEqual(len(self.rib), 0)
+    self.assertEqual(self.driver.routes, {})
+
+  def test_del_absent(self):
+    # Not seeded, only the kernel knows and the missing route is not an error
+    self.assertEqual(self.rib.route("del", [{'dst':"fcf0::/64", 'dev':"eth0"}]), [0])
+    self.assertEqual(self.driver.operations, 1)
+    # Seeded, the kernel is not asked
+    self.rib.load([])
+    self.assertEqual(self.rib.route("del", [{'dst':"fcf0::/64", 'dev':"eth0"}]), [0])
+    self.assertEqual(self.driver.operations, 1)
+
+  def test_unknown_device(self):
+    self.assertEqual(self.rib.route("add", [get_path("fcf0::/64", dev="eth9")]), [errno.ENODEV])
+    self.assertEqual(len(self.rib), 0)
+
+  def test_unmanaged_device(self):
+    rib = SRv6RIB(self.driver, interfaces=["eth0"])
+    results = rib.route("add", [get_path("fcf0::/64", dev="eth1"), get_path("fcf1::/64")])
+    self.assertEqual(results, [errno.ENODEV, 0])
+    self.assertEqual(self.driver.operations, 1)
+
+  def test_installed_behind(self):
+    # Taken over with a replace
+    self.driver.route("add", [get_path("fcf0::/64")])
+    result = summary()
+    self.assertEqual(self.rib.apply([("add", get_path("fcf0::/64", ["fcff::2"]))], result), [0])
+    self.assertEqual(result, summary(replaced=1))
+    self.assertEqual(self.driver.routes[("fcf0::/64", "eth0")], ("encap", ("fcff::2",)))
+
+  def test_strict(self):
+    path = get_path("fcf0::/64")
+    self.assertEqual(self.rib.apply([("add", path)], strict=True), [0])
+    self.assertEqual(self.rib.apply([("add", path)], strict=True), [errno.EEXIST])
+    self.assertEqual(self.rib.apply([("replace", path)], strict=True), [0])
+    self.assertEqual(self.rib.apply([("del", path)], strict=True), [0])
+    self.assertEqual(self.rib.apply([("del", path)], strict=True), [errno.ESRCH])
+
+  def test_strict_installed_behind(self):
+    self.driver.route("add", [get_path("fcf0::/64")])
+    self.assertEqual(self.rib.apply([("add", get_path("fcf0::/64"))], strict=True),
+      [errno.EEXIST])
+    self.assertEqual(len(self.rib), 0)
+
+  def test_planned(self):
+    # The operations of a request see the ones before them
+    path = get_path("fcf0::/64")
+    result = summary()
+    results = self.rib.apply([("add", path), ("del", path), ("add", path)], result)
+    self.assertEqual(results, [0, 0, 0])
+    self.assertEqual(self.driver.routes, {("fcf0::/64", "eth0"):("encap", ("fcff::1",))})
+
+  def test_malformed(self):
+    for path in ({'dst':"fcf0::/64"}, {'dev':"eth0"}, {'dst':1, 'dev':"eth0"},
+        {'dst':"fcf0::/64", 'dev':"eth0"}, None,
+        {'dst':"fcf0::/64", 'dev':"eth0", 'encapmode':"encap", 'segs':"fcff::1"}):
+      self.assertRaises(MalformedPath, self.rib.route, "add", [get_path("fcf1::/64"), path])
+    # Nothing is applied
+    self.assertEqual(self.driver.operations, 0)
+    # Removals need destination and device only
+    self.assertEqual(self.rib.route("del", [{'dst':"fcf0::/64", 'dev':"eth0"}]), [0])
+
+  def test_load(self):
+    rib = SRv6RIB(self.driver, interfaces=["eth0"])
+    rib.load([get_path("fcf0::1/64"), get_path("fcf1::/64", dev="eth1")])
+    self.assertTrue(rib.seeded)
+    self.assertEqual(list(rib.routes), [("fcf0::/64", "eth0")])
+
+  def test_sync(self):
+    installed = [get_path("fcf0::/64"), get_path("fcf1::/64"), get_path("fcf2::/64"),
+      get_path("fcf3::/64", dev="eth1")]
+    self.driver.route("add", installed)
+    rib = SRv6RIB(self.driver, interfaces=["eth0"], installed=lambda: installed)
+    results, result = rib.sync([get_path("fcf0::/64"), get_path("fcf1::/64", ["fcff::2"]),
+      get_path("fcf4::/64")])
+    self.assertEqual(results, [0, 0, 0])
+    self.assertEqual(result, summary(added=1, replaced=1, removed=1, unchanged=1))
+    # The routes of the other devices are kept
+    self.assertEqual(sorted(self.driver.routes), [("fcf0::/64", "eth0"),
+      ("fcf1::/64", "eth0"), ("fcf3::/64", "eth1"), ("fcf4::/64", "eth0")])
+    self.assertEqual(sorted(rib.routes), [("fcf0::/64", "eth0"), ("fcf1::/64", "eth0"),
+      ("fcf4::/64", "eth0")])
+
+  def test_sync_failed(self):
+    results, result = self.rib.sync([get_path("fcf0::/64"), get_path("fcf1::/64", dev="eth9")])
+    self.assertEqual(results, [0, errno.ENODEV])
+    self.assertEqual(result, summary(added=1, failed=1))
+
+  def test_transaction(self):
+    results, result = self.rib.transaction([("add", get_path("fcf0::/64")),
+      ("add", get_path("fcf1::/64"))])
+    self.assertEqual(results, [0, 0])
+    self.assertEqual(result, summary(added=2))
+    self.assertEqual(len(self.driver.routes), 2)
+
+  def test_transaction_rollback(self):
+    self.rib.route("add", [get_path("fcf0::/64")])
+    results, result = self.rib.transaction([("add", get_path("fcf0::/64", ["fcff::2"])),
+      ("add", get_path("fcf1::/64")), ("add", get_path("fcf2::/64", dev="eth9"))])
+    self.assertEqual(results, [0, 0, errno.ENODEV])
+    self.assertEqual(result, summary(failed=1))
+    # Back to the routes before the transaction
+    self.assertEqual(self.driver.routes, {("fcf0::/64", "eth0"):("encap", ("fcff::1",))})
+    self.assertEqual(self.rib.routes, self.driver.routes)
+
+  def test_transaction_replace(self):
+    self.rib.load([])
+    self.rib.route("add", [get_path("fcf0::/64"), get_path("fcf1::/64")])
+    results, result = self.rib.transaction([("add", get_path("fcf0::/64")),
+      ("add", get_path("fcf2::/64"))], replace=True)
+    self.assertEqual(results, [0, 0])
+    self.assertEqual(result, summary(added=1, removed=1, unchanged=1))
+    self.assertEqual(sorted(self.driver.routes), [("fcf0::/64", "eth0"), ("fcf2::/64", "eth0")])
+
+if __name__ == "__main__":
+  unittest.main()
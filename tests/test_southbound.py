@@ -0,0 +1,172 @@
+#!/usr/bin/python
+
+import os
+import sys
+import time
+import unittest
+
+# Shared modules live in the root of the project
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from southbound.transport import SouthboundError, format_errors, parse_errors
+
+try:
+  from southbound.client import ConnectionPool, RouterBatcher
+except ImportError:
+  # Python 2 without the futures backport
+  RouterBatcher = None
+
+# Build a path of the southbound API
+def get_path(destination, device="eth0"):
+  return {'destination':destination, 'device':device, 'encapmode':"encap",
+    'segments':["fcff::1"]}
+
+class ErrorsTest(unittest.TestCase):
+
+  def test_format(self):
+    self.assertEqual(format_errors({("fcf0::/64", "eth0"):"File exists"}),
+      "fcf0::/64 dev eth0: File exists")
+    self.assertEqual(format_errors({None:"Malformed paths"}), "Malformed paths")
+    self.assertEqual(str(SouthboundError({("fcf0::/64", "eth0"):"File exists"})),
+      "fcf0::/64 dev eth0: File exists")
+
+  def test_parse_ok(self):
+    self.assertEqual(parse_errors("OK", [get_path("fcf0::/64")]), {})
+    self.assertEqual(parse_errors("", [get_path("fcf0::/64")]), {})
+
+  def test_parse(self):
+    paths = [get_path("fcf0::/64"), get_path("fcf0::/64", "eth1"), get_path("fcf1::/64")]
+    self.assertEqual(parse_errors("fcf0::/64 dev eth1: File exists; fcf1::/64 dev eth0: "
+      "No such device", paths), {1:"File exists", 2:"No such device"})
+
+  def test_parse_duplicates(self):
+    # Each error goes to the next path with its route
+    paths = [get_path("fcf0::/64"), get_path("fcf0::/64")]
+    self.assertEqual(parse_errors("fcf0::/64 dev eth0: File exists; fcf0::/64 dev eth0: "
+      "No such process", paths), {0:"File exists", 1:"No such process"})
+    self.assertEqual(parse_errors("fcf0::/64 dev eth0: File exists", paths), {0:"File exists"})
+
+  def test_parse_destination(self):
+    # Servers reporting the destination only
+    paths = [get_path("fcf0::/64"), get_path("fcf1::/64")]
+    self.assertEqual(parse_errors("fcf1::/64: File exists", paths), {1:"File exists"})
+
+  def test_parse_request(self):
+    paths = [get_path("fcf0::/64"), get_path("fcf1::/64")]
+    self.assertEqual(parse_errors("Malformed paths", paths), {None:"Malformed paths"})
+    self.assertEqual(parse_errors("fcf1::/64 dev eth0: File exists; 2 removals failed", paths),
+      {1:"File exists", None:"2 removals failed"})
+    # Unknown routes are not given to any path
+    self.assertEqual(parse_errors("fcf9::/64 dev eth0: File exists; fcf0::/64 dev eth0: "
+      "No such device", paths), {None:"fcf9::/64 dev eth0: File exists", 0:"No such device"})
+
+class FakeConnection(object):
+  """Connection failing the paths with a destination in errors, the requests
+  are logged as (event, operation, destinations)"""
+
+  def __init__(self, errors, log, delay=0):
+    self.errors = errors
+    self.log = log
+    self.delay = delay
+    self.closed = False
+
+  def execute(self, operation, paths):
+    destinations = [path['destination'] for path in paths]
+    self.log.append(("start", operation, destinations))
+    time.sleep(self.delay)
+    self.log.append(("end", operation, destinations))
+    if None in self.errors:
+      return {None:self.errors[None]}, {}
+    return dict((i, self.errors[path['destination']]) for i, path in enumerate(paths)
+      if path['destination'] in self.errors), {}
+
+  def close(self):
+    self.closed = True
+
+@unittest.skipIf(RouterBatcher is None, "concurrent.futures is not available")
+class RouterBatcherTest(unittest.TestCase):
+
+  def setUp(self):
+    self.log = []
+    self.errors = {}
+    self.delay = 0
+    self.batcher = None
+
+  def tearDown(self):
+    if self.batcher is not None:
+      self.batcher.close()
+
+  def get_batcher(self, batch_size=1000, batch_delay=0.1):
+    connect = lambda: FakeConnection(self.errors, self.log, self.delay)
+    self.batcher = RouterBatcher(connect, 2, batch_size, batch_delay)
+    return self.batcher
+
+  def test_merge(self):
+    self.errors["fcf2::/64"] = "File exists"
+    batcher = self.get_batcher()
+    first = batcher.submit("create", [get_path("fcf0::/64"), get_path("fcf1::/64")])
+    second = batcher.submit("create", [get_path("fcf2::/64")])
+    self.assertEqual(first.result(5), {})
+    error = second.exception(5)
+    self.assertTrue(isinstance(error, SouthboundError))
+    self.assertEqual(error.errors, {("fcf2::/64", "eth0"):"File exists"})
+    # A single request for both the calls
+    self.assertEqual(self.log, [("start", "create", ["fcf0::/64", "fcf1::/64", "fcf2::/64"]),
+      ("end", "create", ["fcf0::/64", "fcf1::/64", "fcf2::/64"])])
+
+  def test_request_error(self):
+    self.errors[None] = "Malformed paths"
+    batcher = self.get_batcher()
+    calls = [batcher.submit("create", [get_path("fcf%x::/64" %i)]) for i in range(2)]
+    for call in calls:
+      self.assertEqual(call.exception(5).errors, {None:"Malformed paths"})
+
+  def test_operation_order(self):
+    # A different operation waits for the batches in flight
+    self.delay = 0.1
+    batcher = self.get_batcher(batch_delay=0)
+    calls = [batcher.submit("create", [get_path("fcf0::/64")]),
+      batcher.submit("remove", [get_path("fcf1::/64")])]
+    for call in calls:
+      call.result(5)
+    self.assertEqual([entry[:2] for entry in self.log], [("start", "create"),
+      ("end", "create"), ("start", "remove"), ("end", "remove")])
+
+  def test_route_order(self):
+    # A batch waits for the ones in flight with the same routes only
+    self.delay = 0.1
+    batcher = self.get_batcher(batch_size=1, batch_delay=0)
+    calls = [batcher.submit("create", [get_path("fcf0::/64")]),
+      batcher.submit("create", [get_path("fcf1::/64")]),
+      batcher.submit("create", [get_path("fcf0::/64")])]
+    for call in calls:
+      call.result(5)
+    self.assertEqual(self.log.index(("start", "create", ["fcf1::/64"])), 1)
+    starts = [i for i, entry in enumerate(self.log) if entry == ("start", "create", ["fcf0::/64"])]
+    self.assertTrue(starts[1] > self.log.index(("end", "create", ["fcf0::/64"])))
+
+  def test_connect_error(self):
+    def connect():
+      raise SouthboundError({None:"Connection refused"})
+    self.batcher = RouterBatcher(connect, 2, 1000, 0)
+    error = self.batcher.submit("create", [get_path("fcf0::/64")]).exception(5)
+    self.assertEqual(error.errors, {None:"Connection refused"})
+    # The slot of the failed connection is free
+    self.assertEqual(self.batcher.pool.opened, 0)
+
+@unittest.skipIf(RouterBatcher is None, "concurrent.futures is not available")
+class ConnectionPoolTest(unittest.TestCase):
+
+  def test_pool(self):
+    pool = ConnectionPool(lambda: FakeConnection({}, []), 1)
+    connection = pool.acquire()
+    pool.release(connection)
+    self.assertTrue(pool.acquire() is connection)
+    # A broken connection is replaced
+    pool.discard(connection)
+    self.assertTrue(connection.closed)
+    self.assertFalse(pool.acquire() is connection)
+    self.assertEqual(pool.opened, 1)
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,83 @@
+#!/usr/bin/python
+
+import re
+
+# Values of the lines of the route database, keyed on the line prefix
+ROUTE_LINES = {
+	# Network prefix
+	"Destination": re.compile(r"(\S+)"),
+	# Link-state id and the router advertising the network
+	"LS Origin": re.compile(r"Intra-Prefix Id: (\d*.\d*.\d*.\d*) Adv: (\d*.\d*.\d*.\d*)")
+}
+# Values of the lines of the network database, keyed on the line prefix
+NETWORK_LINES = {
+	"Link State ID": re.compile(r"(\d*.\d*.\d*.\d*)"),
+	"Advertising Router": re.compile(r"(\d*.\d*.\d*.\d*)"),
+	# Routers directly connected to the network
+	"Attached Router": re.compile(r"(\d*.\d*.\d*.\d*)")
+}
+
+# Lines of interest of a dump: the prefix and the value. The pattern looks
+# for the prefixes only, the rest of the dump is skipped by the regex engine
+def compile_lines(lines):
+	return re.compile(r"(%s): ([^\r\n]*)" %"|".join(re.escape(key) for key in lines))
+
+ROUTE_PATTERN = compile_lines(ROUTE_LINES)
+NETWORK_PATTERN = compile_lines(NETWORK_LINES)
+
+# Iterate over the (prefix, match) of the lines of interest of a dump, the
+# other lines are skipped by the pattern
+def parse_lines(details, pattern, lines):
+	for line in pattern.finditer(details):
+		key, value = line.groups()
+		m = lines[key].match(value)
+		if m:
+			yield key, m
+
+class LSDB(object):
+	"""Networks and routers learnt from the databases of the routers, each
+	output is parsed in memory in a single pass"""
+
+	def __init__(self):
+		# Stub networks dictionary: keys are networks and values are sets  of routers advertising the networks
+		self.stub_networks = dict()
+		# Mapping network id to network ipv6 prefix
+		self.net_id_to_net_prefix = dict()
+		# nodes set
+		self.nodes = set()
+
+	def parse_route_details(self, route_details):
+		"""Process the route database and get the active routers"""
+		net = None
+		for key, m in parse_lines(route_details, ROUTE_PATTERN, ROUTE_LINES):
+			if key == "Destination":
+				net = m.group(1)
+			elif net is not None:
+				link_state_id, adv_router = m.groups()
+				# A network is uniquely identified by a pair (link state_id, advertising router)
+				network_id = (link_state_id, adv_router)
+				# Map network id to net ipv6 prefix
+				self.net_id_to_net_prefix[network_id] = net
+				# Each network starts as a stub network,
+				# then it is processed and (eventually) marked as transit network
+				self.stub_networks.setdefault(net, set()).add(adv_router)	# Adv router can reach this net
+				self.nodes.add(adv_router)  # Add router to nodes set
+
+	def parse_network_details(self, network_details):
+		"""Process the network database and add the routers attached to the networks"""
+		link_state_id = adv_router = None
+		for key, m in parse_lines(network_details, NETWORK_PATTERN, NETWORK_LINES):
+			if key == "Link State ID":
+				link_state_id = m.group(1)
+			elif key == "Advertising Router":
+				adv_router = m.group(1)
+			else:
+				# Get net ipv6 prefix associated to this network
+				net = self.net_id_to_net_prefix.get((link_state_id, adv_router))
+				if net == None:
+					# This network does not belong to route database
+					# This means that the network is no longer reachable
+					# (a router has been disconnected or an interface has been turned off)
+					continue
+				# Router can reach this net
+				self.stub_networks[net].add(m.group(1))
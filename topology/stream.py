@@ -0,0 +1,144 @@
+#!/usr/bin/python
+
+import json
+import os
+import socket
+import threading
+
+try:
+	import Queue as queue
+except ImportError:
+	import queue
+
+# Max number of messages waiting for a subscriber, a slower one is disconnected
+MAX_PENDING = 1000
+# Max number of connections waiting to be accepted
+BACKLOG = 16
+
+# Nodes and edges of a graph: node -> attributes, (node, node) -> attributes
+def graph_state(G):
+	nodes = dict((str(n), attrs) for n, attrs in G.nodes(data=True))
+	edges = dict((tuple(sorted((str(u), str(v)))), attrs) for u, v, attrs in G.edges(data=True))
+	return nodes, edges
+
+# Node and edge in the format of the json export
+def node_data(node, attrs):
+	data = dict(attrs)
+	data['id'] = node
+	return data
+
+def edge_data(edge, attrs):
+	data = dict(attrs)
+	data['source'], data['target'] = edge
+	return data
+
+# Nodes and edges added and removed between two states. A node or an edge
+# whose attributes changed is both removed and added: the removals come first
+def graph_delta(old, new):
+	old_nodes, old_edges = old
+	new_nodes, new_edges = new
+	return {
+		'removed_nodes': [node_data(n, old_nodes[n]) for n in sorted(old_nodes)
+			if new_nodes.get(n) != old_nodes[n]],
+		'added_nodes': [node_data(n, new_nodes[n]) for n in sorted(new_nodes)
+			if old_nodes.get(n) != new_nodes[n]],
+		'removed_edges': [edge_data(e, old_edges[e]) for e in sorted(old_edges)
+			if new_edges.get(e) != old_edges[e]],
+		'added_edges': [edge_data(e, new_edges[e]) for e in sorted(new_edges)
+			if old_edges.get(e) != new_edges[e]]
+	}
+
+# A message is a json object on a line
+def encode_message(message):
+	return (json.dumps(message, sort_keys=True) + "\n").encode()
+
+class Subscriber(object):
+	"""Connection of a subscriber, the messages are sent by its own thread so
+	that a slow subscriber does not stall the extraction"""
+
+	def __init__(self, conn):
+		self.conn = conn
+		self.messages = queue.Queue(MAX_PENDING)
+		self.closed = False
+		self.thread = threading.Thread(target=self.run)
+		self.thread.daemon = True
+		self.thread.start()
+
+	def send(self, message):
+		"""Enqueue a message, False if the subscriber is gone or too slow"""
+		if self.closed:
+			return False
+		try:
+			self.messages.put_nowait(message)
+			return True
+		except queue.Full:
+			# It can subscribe again and get a new snapshot
+			self.closed = True
+			try:
+				self.conn.shutdown(socket.SHUT_RDWR)
+			except socket.error:
+				# Already closed by its thread
+				pass
+			return False
+
+	def run(self):
+		try:
+			while True:
+				self.conn.sendall(self.messages.get())
+		except socket.error:
+			pass
+		finally:
+			self.closed = True
+			self.conn.close()
+
+class TopologyPublisher(object):
+	"""Streams the topology on a Unix socket as json lines: a snapshot to every
+	new subscriber, then a delta every time the topology changes. The messages
+	carry the version of the topology they lead to"""
+
+	def __init__(self, path):
+		self.path = path
+		# Last published state
+		self.state = ({}, {})
+		self.version = 0
+		self.subscribers = []
+		# New subscribers and deltas are serialized, no delta is lost or repeated
+		self.lock = threading.Lock()
+		# Remove the socket of a previous run
+		if os.path.exists(path):
+			os.remove(path)
+		self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+		self.server.bind(path)
+		self.server.listen(BACKLOG)
+		self.thread = threading.Thread(target=self.run)
+		self.thread.daemon = True
+		self.thread.start()
+
+	def snapshot(self):
+		nodes, edges = self.state
+		return {'type': 'snapshot', 'version': self.version,
+			'nodes': [node_data(n, nodes[n]) for n in sorted(nodes)],
+			'edges': [edge_data(e, edges[e]) for e in sorted(edges)]}
+
+	def run(self):
+		while True:
+			conn, _ = self.server.accept()
+			subscriber = Subscriber(conn)
+			with self.lock:
+				subscriber.send(encode_message(self.snapshot()))
+				self.subscribers.append(subscriber)
+
+	def publish(self, G):
+		"""Send the changes of the topology to the subscribers"""
+		state = graph_state(G)
+		with self.lock:
+			delta = graph_delta(self.state, state)
+			if not any(delta.values()):
+				return
+			self.state = state
+			self.version += 1
+			delta['type'] = 'delta'
+			delta['version'] = self.version
+			message = encode_message(delta)
+			self.subscribers = [subscriber for subscriber in self.subscribers
+				if subscriber.send(message)]
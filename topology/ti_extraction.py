@@ -22,6 +22,7 @@
 # @author Stefano Salsano <stefano.salsano@uniroma2.it>
 #
 
+import hashlib
 import json
 import os
 import time, threading
@@ -31,18 +32,153 @@ import networkx as nx
 from networkx.drawing.nx_agraph import write_dot
 from networkx.readwrite import json_graph
 import socket
+import subprocess
 import sys
+from concurrent import futures
 from optparse import OptionParser
 
+from lsdb import LSDB
+from stream import TopologyPublisher
+
 # Folder of the dump
 TOPO_FOLDER = "topo_extraction"
 # In our experiment we use srv6 as default password
 PASSWD = "srv6"
+# Seconds a router has to answer a poll
+TIMEOUT = 3
+# Max number of routers polled in parallel
+WORKERS = 64
+
+# Prompt of the vty, e.g. "ospf6d> ", printed when the daemon waits for a command
+PROMPT = re.compile(r"\n([^\s>#]+[>#] )$")
+
+# Seconds left before the deadline
+def remaining(deadline):
+	return max(deadline - time.time(), 0)
+
+class VTYSession(object):
+	"""Authenticated vty session of a daemon, kept open across the cycles"""
+
+	def __init__(self, router, port):
+		self.router = router
+		self.port = port
+		self.tn = None
+		self.prompt = None
+
+	def connect(self, deadline):
+		self.tn = telnetlib.Telnet(self.router, self.port, remaining(deadline)) # Init telnet
+		password = PASSWD
+		if password:
+			self.tn.read_until("Password: ", remaining(deadline))
+			self.tn.write(password + "\r\n")
+		# The outputs are delimited by the prompt following the login
+		index, match, _ = self.tn.expect([PROMPT], remaining(deadline))
+		if index < 0:
+			raise socket.timeout("timed out")
+		self.prompt = match.group(1)
+		# terminal length set to 0 to not have interruptions
+		self.run("terminal length 0", deadline)
+
+	def run(self, command, deadline):
+		"""Run a command and return its output, up to the next prompt"""
+		self.tn.write(command + "\r\n")
+		output = self.tn.read_until(self.prompt, remaining(deadline))
+		if not output.endswith(self.prompt):
+			raise socket.timeout("timed out")
+		return output[:-len(self.prompt)]
+
+	def close(self):
+		if self.tn is not None:
+			self.tn.close() # Close telnet
+			self.tn = None
+
+	def query(self, commands, deadline):
+		"""Run the commands, connecting first if needed. A reused session
+		dropped by the router meanwhile is opened again"""
+		while True:
+			reused = self.tn is not None
+			try:
+				if not reused:
+					self.connect(deadline)
+				return [self.run(command, deadline) for command in commands]
+			except (socket.error, EOFError) as e:
+				# An interrupted session holds the rest of an output
+				self.close()
+				# Only a stale session is worth a second attempt
+				if not reused or isinstance(e, socket.timeout):
+					raise
+
+# Get the databases of a router, return the time spent, the error if any and the outputs
+def poll_router(session, timeout):
+	start = time.time()
+	try:
+		# Get routing info from ospf6 database
+		details = session.query([
+			"show ipv6 ospf6 route intra-area detail",
+			"show ipv6 ospf6 database network detail"], start + timeout)
+	except (socket.error, EOFError) as e:
+		return time.time() - start, e, None
+	return time.time() - start, None, details
+
+# Write the raw databases of a router
+def dump_details(router, port, route_details, network_details):
+	with open("%s/route-detail-%s-%s.txt" %(TOPO_FOLDER , router, port), "w") as route_file:
+		route_file.write(route_details)    # Write route database to a file
+
+	with open("%s/network-detail-%s-%s.txt" %(TOPO_FOLDER , router, port), "w") as network_file:
+		network_file.write(network_details)    # Write network database to a file
+
+# Canonical fingerprint of the nodes, the edges and their labels
+def graph_fingerprint(G):
+	nodes = sorted((str(n), sorted(attrs.items())) for n, attrs in G.nodes(data=True))
+	edges = sorted((sorted((str(u), str(v))), sorted(attrs.items()))
+		for u, v, attrs in G.edges(data=True))
+	return hashlib.sha1(json.dumps([nodes, edges]).encode()).hexdigest()
+
+class GraphRenderer(object):
+	"""Draws the graph on a image file in background. The graphs submitted
+	while drawing are coalesced, only the last one is drawn"""
+
+	def __init__(self, folder):
+		self.folder = folder
+		# Last graph submitted and not drawn yet
+		self.graph = None
+		self.condition = threading.Condition()
+		self.thread = threading.Thread(target=self.run)
+		self.thread.daemon = True
+		self.thread.start()
+
+	def submit(self, G):
+		with self.condition:
+			self.graph = G
+			self.condition.notify()
+
+	def run(self):
+		while True:
+			with self.condition:
+				while self.graph is None:
+					self.condition.wait()
+				G, self.graph = self.graph, None
+			# A failed drawing is reported, the next graph is drawn anyway
+			try:
+				self.render(G)
+			except Exception as e:
+				print "Error: cannot draw the graph: %s" %(e)
+
+	def render(self, G):
+		write_dot(G, '%s/topo-graph.dot' %(self.folder))
+		# The image is replaced only once complete
+		status = subprocess.call(['dot', '-Tsvg', '%s/topo-graph.dot' %(self.folder),
+			'-o', '%s/topo-graph.svg.tmp' %(self.folder)])
+		if status != 0:
+			raise OSError(status, "dot exited with status %s" %(status))
+		os.rename('%s/topo-graph.svg.tmp' %(self.folder), '%s/topo-graph.svg' %(self.folder))
 
 def topology_information_extraction(opts):
 	
 	# Let's parse the input
 	period = float(opts.period)
+	timeout = float(opts.timeout)
 	routers = []
 	ports = []
 	# First create the chunk
@@ -57,128 +193,60 @@ def topology_information_extraction(opts):
 	if not os.path.exists(TOPO_FOLDER):
 		os.makedirs(TOPO_FOLDER)
 
+	# The routers are polled in parallel, a slow one does not stall the others
+	executor = futures.ThreadPoolExecutor(max_workers=max(min(opts.workers, len(routers)), 1))
+	# A vty session per daemon, reused by all the cycles
+	sessions = [VTYSession(router, port) for router, port in zip(routers, ports)]
+	# The raw databases are written in background, only if requested
+	dumper = futures.ThreadPoolExecutor(max_workers=1) if opts.dump else None
+	# The exports are regenerated only when the graph changes
+	renderer = GraphRenderer(TOPO_FOLDER)
+	last_fingerprint = None
+	# The changes are streamed to the subscribers, if requested
+	publisher = TopologyPublisher(opts.stream) if opts.stream else None
+
 	while (True):
-		# Stub networks dictionary: keys are networks and values are sets  of routers advertising the networks
-		stub_networks = dict()
+		cycle_start = time.time()
+		# Networks and routers of the databases
+		lsdb = LSDB()
 		# Transit networks dictionary: keys are networks and values are sets of routers advertising the networks
 		transit_networks = dict()
-		# Mapping network id to network ipv6 prefix
-		net_id_to_net_prefix = dict()
 		# Mapping graph edges to network prefixes
 		edge_to_net = dict()
 
 		# edges set
 		edges = set()
-		# nodes set
-		nodes = set()
 		# Topology graph
 		G = nx.Graph()
 
-		for router, port in zip(routers, ports):
-			print "\n********* Connecting to %s-%s *********" %(router, port)
-			password = PASSWD
-			try:
-				tn = telnetlib.Telnet(router, port) # Init telnet
-			except socket.error:
-				print "Error: cannot establish a connection to " + str(router) + " on port " + str(port) + "\n"
-				break
-
-			if password:
-				tn.read_until("Password: ")
-				tn.write(password + "\r\n")
-			# terminal length set to 0 to not have interruptions
-			tn.write("terminal length 0" + "\r\n")
-			# Get routing info from ospf6 database
-			tn.write("show ipv6 ospf6 route intra-area detail"+ "\r\n")
-			# Close
-			tn.write("q" + "\r\n")
-			# Get results
-			route_details = tn.read_all()
-
-			password = PASSWD
-			try:
-				tn = telnetlib.Telnet(router, port) # Init telnet
-			except socket.error:
-				print "Error: cannot establish a connection to " + str(router) + " on port " + str(port) + "\n"
-				break
-
-			if password:
-				tn.read_until("Password: ")
-				tn.write(password + "\r\n")
-			# terminal length set to 0 to not have interruptions
-			tn.write("terminal length 0" + "\r\n")
-			# Get routing info from ospf6 database
-			tn.write("show ipv6 ospf6 database network detail"+ "\r\n")
-			# Close
-			tn.write("q" + "\r\n")
-			# Get results
-			network_details = tn.read_all()
-
-			tn.close() # Close telnet
-
-			with open("%s/route-detail-%s-%s.txt" %(TOPO_FOLDER , router, port), "w") as route_file:
-				route_file.write(route_details)    # Write route database to a file for post-processing
-
-			with open("%s/network-detail-%s-%s.txt" %(TOPO_FOLDER , router, port), "w") as network_file:
-				network_file.write(network_details)    # Write network database to a file for post-processing
+		polls = [executor.submit(poll_router, session, timeout) for session in sessions]
+		# The routers which did not answer are left out of this extraction
+		polled = []
+		slowest = (0, None, None)
+		for router, port, poll in zip(routers, ports, polls):
+			elapsed, error, details = poll.result()
+			if error is not None:
+				print "Error: cannot poll %s-%s: %s" %(router, port, error)
+				continue
+			polled.append(details)
+			if dumper is not None:
+				dumper.submit(dump_details, router, port, *details)
+			slowest = max(slowest, (elapsed, router, port))
+		poll_time = time.time() - cycle_start
 
-			# Process route database
-			with open("%s/route-detail-%s-%s.txt" %(TOPO_FOLDER , router, port), "r") as route_file:
-				# Process infos and get active routers
-				for line in route_file:
-					# Get a network prefix
-					m = re.search('Destination: (\S+)', line)
-					if(m):
-						net = m.group(1)
-						continue
-					# Get link-state id and the router advertising the network
-					m = re.search('Intra-Prefix Id: (\d*.\d*.\d*.\d*) Adv: (\d*.\d*.\d*.\d*)', line)
-					if(m):
-						link_state_id = m.group(1)
-						adv_router = m.group(2)
-						# Get the network id
-						# A network is uniquely identified by a pair (link state_id, advertising router)
-						network_id = (link_state_id, adv_router)
-						# Map network id to net ipv6 prefix
-						net_id_to_net_prefix[network_id] = net
-						if stub_networks.get(net) == None:
-							# Network is unknown, mark as a stub network
-							# Each network starts as a stub network, 
-							# then it is processed and (eventually) marked as transit network
-							stub_networks[net] = set()
-						stub_networks[net].add(adv_router)	# Adv router can reach this net
-						nodes.add(adv_router)  # Add router to nodes set
+		if not polled:
+			print "Error: no router answered, the topology is not updated"
+			time.sleep(max(period - poll_time, 0))
+			continue
 
+		for route_details, network_details in polled:
+			# Process route database
+			lsdb.parse_route_details(route_details)
 			# Process network database
-			transit_networks = dict()
-			with open("%s/network-detail-%s-%s.txt" %(TOPO_FOLDER , router, port), "r") as network_file:
-				# Process infos and get active routers
-				for line in network_file:
-					# Get a link state id
-					m = re.search('Link State ID: (\d*.\d*.\d*.\d*)', line)
-					if(m):
-						link_state_id = m.group(1)
-						continue
-					# Get the router advertising the network
-					m = re.search('Advertising Router: (\d*.\d*.\d*.\d*)', line)
-					if(m):
-						adv_router = m.group(1)
-						continue
-					# Get routers directly connected to the network
-					m = re.search('Attached Router: (\d*.\d*.\d*.\d*)', line)
-					if(m):
-						router_id = m.group(1)
-						# Get the network id: a network is uniquely identified by a pair (link state_id, advertising router)
-						network_id = (link_state_id, adv_router)
-						# Get net ipv6 prefix associated to this network
-						net = net_id_to_net_prefix.get(network_id)
-						if net == None:
-							# This network does not belong to route database
-							# This means that the network is no longer reachable 
-							# (a router has been disconnected or an interface has been turned off)
-							continue
-						# Router can reach this net
-						stub_networks[net].add(router_id)
+			lsdb.parse_network_details(network_details)
+		stub_networks = lsdb.stub_networks
+		nodes = lsdb.nodes
+		parse_time = time.time() - cycle_start - poll_time
 
 		# Make separation between stub networks and transit networks
 		for net in stub_networks.keys():
@@ -207,14 +275,6 @@ def topology_information_extraction(opts):
 				edge=(r, net)
 				edges.add(edge)
 
-
-		# Print results
-		print "Stub Networks:", stub_networks.keys()
-		print "Transit Networks:", transit_networks.keys()
-		print "Nodes:", nodes
-		print "Edges:", edges
-		print "***************************************"
-
 		# Build NetworkX Topology
 		for r in nodes:
 			G.add_node(r, fillcolor="red", style="filled")
@@ -228,19 +288,39 @@ def topology_information_extraction(opts):
 				# This is a transit network, put a label on the edge
 				G.add_edge(*e, label=edge_to_net[e])
 
+		fingerprint = graph_fingerprint(G)
+		changed = fingerprint != last_fingerprint
+		if changed:
+			last_fingerprint = fingerprint
+
+			# Stream the changes first, the subscribers are waiting for them
+			if publisher is not None:
+				publisher.publish(G)
+
+			# Print results
+			print "Stub Networks:", stub_networks.keys()
+			print "Transit Networks:", transit_networks.keys()
+			print "Nodes:", nodes
+			print "Edges:", edges
+			print "***************************************"
+
+			# Export NetworkX object into a json file
+			graph = json_graph.node_link_data(G)
 
-		# Export NetworkX object into a json file
-		graph = json_graph.node_link_data(G)
+			with open("%s/topo-graph.json" %(TOPO_FOLDER), 'wb') as outfile:
+				json.dump(graph, outfile, sort_keys = True, indent = 2)
 
-		with open("%s/topo-graph.json" %(TOPO_FOLDER), 'wb') as outfile:
-			json.dump(graph, outfile, sort_keys = True, indent = 2)
+			# Draw graph on a image file
+			renderer.submit(G)
 
-		# Draw graph on a image file
-		write_dot(G, '%s/topo-graph.dot' %(TOPO_FOLDER))
-		os.system('dot -Tsvg %s/topo-graph.dot -o %s/topo-graph.svg' %(TOPO_FOLDER, TOPO_FOLDER))
+		# Cycle time metrics
+		cycle_time = time.time() - cycle_start
+		print "Polled %s/%s routers in %.3f s (slowest %s-%s in %.3f s), parsed in %.3f s, cycle %.3f s, %s" %(
+			len(polled), len(routers), poll_time, slowest[1], slowest[2], slowest[0], parse_time,
+			cycle_time, "topology changed" if changed else "topology unchanged")
 
-		# Wait 'period' seconds between two extractions
-		time.sleep(period)
+		# Extractions start every 'period' seconds
+		time.sleep(max(period - cycle_time, 0))
 
 # Parse command line options and dump results
 def parseOptions():
@@ -251,6 +331,18 @@ def parseOptions():
 	# Topology information extraction period
 	parser.add_option('--period', dest='period', type='string', default="10",
 					  help='topology information extraction period')
+	# Timeout of the poll of a router
+	parser.add_option('--timeout', dest='timeout', type='string', default=str(TIMEOUT),
+					  help='seconds a router has to answer')
+	# Routers polled in parallel
+	parser.add_option('--workers', dest='workers', type='int', default=WORKERS,
+					  help='max number of routers polled in parallel')
+	# Write the raw databases
+	parser.add_option('--dump', dest='dump', action='store_true', default=False,
+					  help='write the databases of the routers in the topology folder')
+	# Stream the topology
+	parser.add_option('--stream', dest='stream', type='string', default=None,
+					  help='unix socket streaming the snapshot and the deltas of the topology')
 	# Parse input parameters
 	(options, args) = parser.parse_args()
 	# Done, return